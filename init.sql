@@ -1,15 +1,260 @@
 -- init.sql
+-- transactions секционирована по времени: секции за день или месяц создает и архивирует
+-- DatabaseManager (src/partitions.py), строки вне созданных секций попадают в transactions_default
 CREATE TABLE IF NOT EXISTS transactions (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id VARCHAR(100) NOT NULL,
     amount DECIMAL(15,2) NOT NULL,
-    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    merchant VARCHAR(100),
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     is_fraud BOOLEAN DEFAULT FALSE,
     fraud_score DECIMAL(5,4),
-    risk_level VARCHAR(10)
+    risk_level VARCHAR(10),
+    PRIMARY KEY (id, timestamp)
+) PARTITION BY RANGE (timestamp);
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS merchant VARCHAR(100);
+
+-- Секция по умолчанию только у секционированной таблицы: на старой несекционированной
+-- transactions (до перехода) PARTITION OF упал бы и прервал весь скрипт
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('transactions')) = 'p' THEN
+        CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT;
+    END IF;
+END;
+$$;
+
+-- Операции пользователя за интервал читаются диапазоном индекса, без обращения к таблице
+CREATE INDEX IF NOT EXISTS idx_transactions_user_timestamp
+    ON transactions (user_id, timestamp) INCLUDE (amount, is_fraud);
+
+CREATE TABLE IF NOT EXISTS api_logs (
+    id SERIAL PRIMARY KEY,
+    endpoint VARCHAR(100),
+    method VARCHAR(10),
+    user_id VARCHAR(100),
+    amount DECIMAL(15,2),
+    response_time DOUBLE PRECISION,
+    status_code INTEGER,
+    is_suspicious BOOLEAN,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Счетчики по пользователю и минуте: проверка скорости читает не больше 61 строки
+CREATE TABLE IF NOT EXISTS user_minute_counters (
+    user_id VARCHAR(100) NOT NULL,
+    minute TIMESTAMP NOT NULL,
+    tx_count INTEGER NOT NULL,
+    amount_sum DECIMAL(20,2) NOT NULL,
+    fraud_count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, minute)
+);
+
+-- Итоги по пользователю за все время: статистика пользователя - одна строка
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id VARCHAR(100) PRIMARY KEY,
+    tx_count BIGINT NOT NULL,
+    amount_sum DECIMAL(24,2) NOT NULL,
+    amount_max DECIMAL(15,2) NOT NULL,
+    fraud_count BIGINT NOT NULL,
+    -- Минимум и сумма квадратов: признаки user_min и user_std модели
+    amount_min DECIMAL(15,2),
+    amount_sq_sum NUMERIC
+);
+ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS amount_min DECIMAL(15,2);
+ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS amount_sq_sum NUMERIC;
+
+-- Счетчики обновляются одним upsert на оператор INSERT (в том числе пачку write-behind).
+-- Строки сортируются, чтобы параллельные пачки блокировали ключи в одном порядке.
+CREATE OR REPLACE FUNCTION update_user_counters() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO user_minute_counters AS c (user_id, minute, tx_count, amount_sum, fraud_count)
+    SELECT user_id, date_trunc('minute', timestamp), COUNT(*), SUM(amount),
+           COUNT(*) FILTER (WHERE is_fraud)
+    FROM new_rows
+    WHERE timestamp IS NOT NULL
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (user_id, minute) DO UPDATE SET
+        tx_count = c.tx_count + EXCLUDED.tx_count,
+        amount_sum = c.amount_sum + EXCLUDED.amount_sum,
+        fraud_count = c.fraud_count + EXCLUDED.fraud_count;
+
+    INSERT INTO user_stats AS s (user_id, tx_count, amount_sum, amount_max, fraud_count, amount_min, amount_sq_sum)
+    SELECT user_id, COUNT(*), SUM(amount), MAX(amount), COUNT(*) FILTER (WHERE is_fraud),
+           MIN(amount), SUM(amount * amount)
+    FROM new_rows
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (user_id) DO UPDATE SET
+        tx_count = s.tx_count + EXCLUDED.tx_count,
+        amount_sum = s.amount_sum + EXCLUDED.amount_sum,
+        amount_max = GREATEST(s.amount_max, EXCLUDED.amount_max),
+        fraud_count = s.fraud_count + EXCLUDED.fraud_count,
+        amount_min = LEAST(s.amount_min, EXCLUDED.amount_min),
+        amount_sq_sum = s.amount_sq_sum + EXCLUDED.amount_sq_sum;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_user_counters ON transactions;
+CREATE TRIGGER transactions_user_counters
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_user_counters();
+
+-- Сводки для дашборда и /stats: по часу, уровню риска и мерчанту.
+-- Обновляются тем же способом, что счетчики пользователя, поэтому чтение
+-- не зависит от размера transactions. Пустые risk_level и merchant - 'UNKNOWN'.
+CREATE TABLE IF NOT EXISTS rollup_hourly (
+    hour TIMESTAMP PRIMARY KEY,
+    tx_count BIGINT NOT NULL,
+    fraud_count BIGINT NOT NULL,
+    amount_sum DECIMAL(24,2) NOT NULL,
+    amount_max DECIMAL(15,2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rollup_risk_level (
+    risk_level VARCHAR(10) PRIMARY KEY,
+    tx_count BIGINT NOT NULL,
+    fraud_count BIGINT NOT NULL,
+    amount_sum DECIMAL(24,2) NOT NULL,
+    amount_max DECIMAL(15,2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS rollup_merchant (
+    merchant VARCHAR(100) PRIMARY KEY,
+    tx_count BIGINT NOT NULL,
+    fraud_count BIGINT NOT NULL,
+    amount_sum DECIMAL(24,2) NOT NULL,
+    amount_max DECIMAL(15,2) NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION update_transaction_rollups() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO rollup_hourly AS r (hour, tx_count, fraud_count, amount_sum, amount_max)
+    SELECT date_trunc('hour', timestamp), COUNT(*), COUNT(*) FILTER (WHERE is_fraud), SUM(amount), MAX(amount)
+    FROM new_rows
+    WHERE timestamp IS NOT NULL
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (hour) DO UPDATE SET
+        tx_count = r.tx_count + EXCLUDED.tx_count,
+        fraud_count = r.fraud_count + EXCLUDED.fraud_count,
+        amount_sum = r.amount_sum + EXCLUDED.amount_sum,
+        amount_max = GREATEST(r.amount_max, EXCLUDED.amount_max);
+
+    INSERT INTO rollup_risk_level AS r (risk_level, tx_count, fraud_count, amount_sum, amount_max)
+    SELECT COALESCE(risk_level, 'UNKNOWN'), COUNT(*), COUNT(*) FILTER (WHERE is_fraud), SUM(amount), MAX(amount)
+    FROM new_rows
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (risk_level) DO UPDATE SET
+        tx_count = r.tx_count + EXCLUDED.tx_count,
+        fraud_count = r.fraud_count + EXCLUDED.fraud_count,
+        amount_sum = r.amount_sum + EXCLUDED.amount_sum,
+        amount_max = GREATEST(r.amount_max, EXCLUDED.amount_max);
+
+    INSERT INTO rollup_merchant AS r (merchant, tx_count, fraud_count, amount_sum, amount_max)
+    SELECT COALESCE(merchant, 'UNKNOWN'), COUNT(*), COUNT(*) FILTER (WHERE is_fraud), SUM(amount), MAX(amount)
+    FROM new_rows
+    GROUP BY 1
+    ORDER BY 1
+    ON CONFLICT (merchant) DO UPDATE SET
+        tx_count = r.tx_count + EXCLUDED.tx_count,
+        fraud_count = r.fraud_count + EXCLUDED.fraud_count,
+        amount_sum = r.amount_sum + EXCLUDED.amount_sum,
+        amount_max = GREATEST(r.amount_max, EXCLUDED.amount_max);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_rollups ON transactions;
+CREATE TRIGGER transactions_rollups
+    AFTER INSERT ON transactions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_transaction_rollups();
+
+-- Пересчет счетчиков и сводок по всей таблице (DatabaseManager.backfill_aggregates).
+-- Вставки в transactions ждут окончания пересчета, чтение не блокируется.
+CREATE OR REPLACE FUNCTION backfill_transaction_aggregates() RETURNS void AS $$
+BEGIN
+    LOCK TABLE transactions IN SHARE MODE;
+    TRUNCATE user_minute_counters, user_stats, rollup_hourly, rollup_risk_level, rollup_merchant;
+
+    INSERT INTO user_minute_counters (user_id, minute, tx_count, amount_sum, fraud_count)
+    SELECT user_id, date_trunc('minute', timestamp), COUNT(*), SUM(amount), COUNT(*) FILTER (WHERE is_fraud)
+    FROM transactions
+    WHERE timestamp IS NOT NULL
+    GROUP BY 1, 2;
+
+    INSERT INTO user_stats (user_id, tx_count, amount_sum, amount_max, fraud_count, amount_min, amount_sq_sum)
+    SELECT user_id, COUNT(*), SUM(amount), MAX(amount), COUNT(*) FILTER (WHERE is_fraud),
+           MIN(amount), SUM(amount * amount)
+    FROM transactions
+    GROUP BY 1;
+
+    INSERT INTO rollup_hourly (hour, tx_count, fraud_count, amount_sum, amount_max)
+    SELECT date_trunc('hour', timestamp), COUNT(*), COUNT(*) FILTER (WHERE is_fraud), SUM(amount), MAX(amount)
+    FROM transactions
+    WHERE timestamp IS NOT NULL
+    GROUP BY 1;
+
+    INSERT INTO rollup_risk_level (risk_level, tx_count, fraud_count, amount_sum, amount_max)
+    SELECT COALESCE(risk_level, 'UNKNOWN'), COUNT(*), COUNT(*) FILTER (WHERE is_fraud), SUM(amount), MAX(amount)
+    FROM transactions
+    GROUP BY 1;
+
+    INSERT INTO rollup_merchant (merchant, tx_count, fraud_count, amount_sum, amount_max)
+    SELECT COALESCE(merchant, 'UNKNOWN'), COUNT(*), COUNT(*) FILTER (WHERE is_fraud), SUM(amount), MAX(amount)
+    FROM transactions
+    GROUP BY 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Существующая база без сводок (или без новых колонок user_stats) пересчитывается при повторном применении init.sql
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM transactions) AND (
+        NOT EXISTS (SELECT 1 FROM rollup_risk_level)
+        OR EXISTS (SELECT 1 FROM user_stats WHERE amount_sq_sum IS NULL)
+    ) THEN
+        PERFORM backfill_transaction_aggregates();
+    END IF;
+END;
+$$;
+
+INSERT INTO transactions (user_id, amount, is_fraud, fraud_score, risk_level)
+SELECT * FROM (VALUES
+    ('user_001', 50000.00, false, 0.1, 'LOW'),
+    ('user_002', 15000000.00, true, 0.8, 'HIGH'),
+    ('user_003', 500.00, true, 0.6, 'MEDIUM')
+) AS seed (user_id, amount, is_fraud, fraud_score, risk_level)
+WHERE NOT EXISTS (SELECT 1 FROM transactions);
+
+CREATE TABLE IF NOT EXISTS fraud_patterns (
+    id SERIAL PRIMARY KEY,
+    pattern_name VARCHAR(100) NOT NULL UNIQUE,
+    sql_condition TEXT,
+    is_active BOOLEAN DEFAULT TRUE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-INSERT INTO transactions (user_id, amount, is_fraud, fraud_score, risk_level) VALUES
-('user_001', 50000.00, false, 0.1, 'LOW'),
-('user_002', 15000000.00, true, 0.8, 'HIGH'),
-('user_003', 500.00, true, 0.6, 'MEDIUM');
\ No newline at end of file
+INSERT INTO fraud_patterns (pattern_name, sql_condition) VALUES
+('large_amount', 'amount > 10000000'),
+('small_amount', 'amount < 1000'),
+('multiple_transactions', 'count_1h > 5')
+ON CONFLICT (pattern_name) DO NOTHING;
+
+-- Кэш паттернов в API сбрасывается по этому уведомлению
+CREATE OR REPLACE FUNCTION notify_fraud_patterns_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('fraud_patterns_changed', '');
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fraud_patterns_changed ON fraud_patterns;
+CREATE TRIGGER fraud_patterns_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON fraud_patterns
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_fraud_patterns_changed();
@@ -0,0 +1,23 @@
+"""
+Пересчет счетчиков пользователей и сводок дашборда по всей таблице transactions
+Запуск: DATABASE_URL=postgresql://... python scripts/backfill_aggregates.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.database import DatabaseManager
+
+
+def main():
+    manager = DatabaseManager()
+    start = time.perf_counter()
+    manager.backfill_aggregates()
+    print(f"✅ Сводки пересчитаны за {time.perf_counter() - start:.1f} с")
+    print(manager.get_dashboard_data()['overall'])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Бенчмарк /batch-check: построчный predict_ensemble против пакетного predict_records
+Запуск: python scripts/bench_batch_check.py [--sizes 1 100 10000]
+"""
+import argparse
+import contextlib
+import io
+import json
+
+import pandas as pd
+
+from bench_utils import Timer, demo_transactions, make_demo_ai_system
+
+
+def run_legacy(ai_system, transactions):
+    """Старый путь: DataFrame из одной строки и полный ансамбль на каждую транзакцию"""
+    for tx in transactions:
+        ai_system.predict_ensemble(pd.DataFrame([tx]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--legacy-limit", type=int, default=500,
+                        help="сколько транзакций прогонять старым путем (остальное экстраполируется)")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ai_system = make_demo_ai_system()
+
+    report = []
+    for size in args.sizes:
+        transactions = demo_transactions(size, seed=size)
+        legacy_sample = transactions[:args.legacy_limit]
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            with Timer() as legacy:
+                run_legacy(ai_system, legacy_sample)
+            with Timer() as batch:
+                ai_system.predict_records(transactions)
+
+        legacy_tps = len(legacy_sample) / legacy.elapsed
+        batch_tps = size / batch.elapsed
+        report.append({
+            "batch_size": size,
+            "legacy_tx_per_sec": round(legacy_tps, 1),
+            "batch_tx_per_sec": round(batch_tps, 1),
+            "batch_latency_ms": round(batch.elapsed * 1000, 2),
+            "speedup": round(batch_tps / legacy_tps, 1)
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Бенчмарк хранения prepared_transactions: CSV против типизированного Parquet (src/datasets.py)
+Для каждого формата - размер файла, время загрузки и память DataFrame (memory_usage(deep=True)):
+целиком и с проекцией на колонки, которые читает мониторинг (is_fraud, amount),
+и обучение fraud_module (user_id, amount, total_1h, count_1h, timestamp).
+Запуск: python scripts/bench_datasets.py [--rows 100000 1000000 --users 10000]
+"""
+import argparse
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import Timer
+from src.dataset_features import build_features
+from src.datasets import read_dataset, write_dataset
+
+PROJECTIONS = {
+    "monitoring": ["is_fraud", "amount"],
+    "training": ["user_id", "amount", "total_1h", "count_1h", "timestamp"],
+}
+
+
+def make_prepared(rows, users, seed=0):
+    """prepared_transactions по синтетическим транзакциям в духе dummy_data_gen.py"""
+    rng = np.random.default_rng(seed)
+    transactions = pd.DataFrame({
+        "user_id": np.char.add("user_", rng.integers(0, users, rows).astype(str)).astype(object),
+        "amount": rng.integers(100, 50_000_000, rows).astype(np.float64),
+        "merchant": rng.choice(["Korzinka.uz", "Makro", "Rossiya", "Small", "DOK", "Artel", "Uzmobile"], rows),
+        "city": rng.choice(["Ташкент", "Самарканд", "Бухара", "Андижан", "Наманган", "Фергана"], rows),
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 30 * 24 * 3600, rows), unit="s"),
+    })
+    transactions = transactions.sort_values(["user_id", "timestamp"]).reset_index(drop=True)
+    return build_features(transactions)
+
+
+def measure(path, columns=None):
+    with Timer() as timer:
+        frame = read_dataset(path, columns)
+    return {"load_sec": round(timer.elapsed, 3), "memory_mb": round(frame.memory_usage(deep=True).sum() / 2**20, 1)}
+
+
+def bench(rows, users):
+    prepared = make_prepared(rows, min(users, rows))
+    result = {"rows": rows, "columns": len(prepared.columns)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt in ("csv", "parquet"):
+            # Отдельный каталог: read_dataset берет более свежий из двух форматов
+            path = Path(tmp) / fmt / "prepared_transactions.csv"
+            with Timer() as timer:
+                saved = write_dataset(prepared, path, fmt=fmt)
+            stats = {"write_sec": round(timer.elapsed, 3), "file_mb": round(saved.stat().st_size / 2**20, 1)}
+            stats["full"] = measure(path)
+            for name, columns in PROJECTIONS.items():
+                stats[name] = measure(path, columns)
+            result[fmt] = stats
+    for key in ["full", *PROJECTIONS]:
+        result[f"{key}_load_speedup"] = round(result["csv"][key]["load_sec"] / result["parquet"][key]["load_sec"], 1)
+        result[f"{key}_memory_ratio"] = round(result["csv"][key]["memory_mb"] / result["parquet"][key]["memory_mb"], 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=10_000)
+    args = parser.parse_args()
+    print(json.dumps([bench(rows, args.users) for rows in args.rows], indent=2))
+
+
+if __name__ == "__main__":
+    main()
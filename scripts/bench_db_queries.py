@@ -0,0 +1,137 @@
+"""
+Бенчмарк запросов по пользователю: скорость операций за час и статистика пользователя
+Сравнивает исходные запросы (без индекса и с индексом (user_id, timestamp))
+с запросами DatabaseManager по user_minute_counters и user_stats - отдельно
+для обычных пользователей и для активных, у которых тысячи операций в час.
+Таблицы создаются по init.sql в отдельной схеме bench_<rows> и удаляются после замера.
+Запуск: DATABASE_URL=postgresql://... python scripts/bench_db_queries.py [--rows 1000000 10000000]
+"""
+import argparse
+import json
+import random
+
+from bench_utils import PROJECT_ROOT, Timer, percentile
+from src.database import USER_STATS_QUERY, VELOCITY_QUERY
+from src.db_pool import get_pool
+
+LEGACY_VELOCITY_QUERY = """
+SELECT COUNT(*) as recent_count
+FROM transactions
+WHERE user_id = %(user_id)s AND timestamp > NOW() - INTERVAL '1 hour'
+"""
+
+LEGACY_USER_STATS_QUERY = """
+SELECT
+    COUNT(*) as total_transactions,
+    AVG(amount) as avg_amount,
+    MAX(amount) as max_amount,
+    SUM(CASE WHEN is_fraud THEN 1 ELSE 0 END) as fraud_count
+FROM transactions
+WHERE user_id = %(user_id)s
+"""
+
+# ~100 операций на пользователя за 30 дней, последние - в пределах часа
+LOAD_ROWS = """
+INSERT INTO transactions (user_id, amount, is_fraud, fraud_score, risk_level, timestamp)
+SELECT 'user_' || (i %% %(users)s),
+       (random() * 5000000)::numeric(15, 2),
+       random() < 0.01,
+       random()::numeric(5, 4),
+       'LOW',
+       NOW() - random() * INTERVAL '30 days'
+FROM generate_series(1, %(rows)s) AS i
+"""
+
+# Активные пользователи: hot_rate операций за последний час у каждого
+LOAD_HOT_ROWS = """
+INSERT INTO transactions (user_id, amount, is_fraud, fraud_score, risk_level, timestamp)
+SELECT 'hot_' || (i %% %(hot_users)s),
+       (random() * 5000000)::numeric(15, 2),
+       false,
+       random()::numeric(5, 4),
+       'LOW',
+       NOW() - random() * INTERVAL '1 hour'
+FROM generate_series(1, %(hot_rows)s) AS i
+"""
+
+
+def measure(cur, query, users, samples):
+    """p50/p99 запроса в миллисекундах по случайным пользователям"""
+    latencies = []
+    for user_id in random.Random(0).choices(users, k=samples):
+        with Timer() as timer:
+            cur.execute(query, {"user_id": user_id})
+            cur.fetchall()
+        latencies.append(timer.elapsed)
+    return {"p50_ms": round(percentile(latencies, 50), 3), "p99_ms": round(percentile(latencies, 99), 3)}
+
+
+def measure_queries(cur, velocity_query, stats_query, users, samples):
+    return {
+        "velocity": measure(cur, velocity_query, users, samples),
+        "user_stats": measure(cur, stats_query, users, samples)
+    }
+
+
+def bench(conn, rows, samples, seqscan_samples, hot_users, hot_rate):
+    schema = f"bench_{rows}"
+    users = max(rows // 100, 1)
+    user_ids = [f"user_{i}" for i in range(users)]
+    hot_ids = [f"hot_{i}" for i in range(hot_users)]
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}")
+        cur.execute((PROJECT_ROOT / "init.sql").read_text(encoding="utf-8"))
+        with Timer() as load_timer:
+            cur.execute(LOAD_ROWS, {"users": users, "rows": rows})
+            cur.execute(LOAD_HOT_ROWS, {"hot_users": hot_users, "hot_rows": hot_users * hot_rate})
+        # Карта видимости нужна для index-only scan
+        cur.execute("VACUUM ANALYZE")
+        try:
+            results = {
+                "rows": rows, "users": users, "hot_users": hot_users, "hot_rate_per_hour": hot_rate,
+                "load_sec": round(load_timer.elapsed, 1)
+            }
+
+            cur.execute("DROP INDEX idx_transactions_user_timestamp")
+            results["legacy_seqscan"] = measure_queries(
+                cur, LEGACY_VELOCITY_QUERY, LEGACY_USER_STATS_QUERY, user_ids, seqscan_samples
+            )
+            cur.execute("""
+                CREATE INDEX idx_transactions_user_timestamp
+                ON transactions (user_id, timestamp) INCLUDE (amount, is_fraud)
+            """)
+            for group, ids in (("regular", user_ids), ("hot", hot_ids)):
+                results[group] = {
+                    "legacy_indexed": measure_queries(
+                        cur, LEGACY_VELOCITY_QUERY, LEGACY_USER_STATS_QUERY, ids, samples
+                    ),
+                    "counters": measure_queries(cur, VELOCITY_QUERY, USER_STATS_QUERY, ids, samples)
+                }
+        finally:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--seqscan-samples", type=int, default=10)
+    parser.add_argument("--hot-users", type=int, default=20)
+    parser.add_argument("--hot-rate", type=int, default=2000, help="операций в час у активного пользователя")
+    args = parser.parse_args()
+
+    conn = get_pool().dedicated_connection()
+    # VACUUM нельзя выполнять внутри транзакции
+    conn.autocommit = True
+    try:
+        results = [bench(conn, rows, args.samples, args.seqscan_samples, args.hot_users, args.hot_rate) for rows in args.rows]
+    finally:
+        conn.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
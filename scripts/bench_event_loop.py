@@ -0,0 +1,74 @@
+"""
+Бенчмарк смешанной нагрузки /health + /check для разных executor инференса
+Сервер запускается отдельным процессом (uvicorn), клиент меряет задержки снаружи,
+поэтому блокировка event loop сервера видна в задержке /health.
+Запуск: python scripts/bench_event_loop.py [--requests 2000 --concurrency 32]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from bench_utils import demo_transactions, percentile, serve_fraud_api
+
+
+async def run_mixed_load(base_url, transactions, total, concurrency, health_share):
+    """Отправляет total запросов из concurrency корутин, собирает задержки"""
+    latencies = {"health": [], "check": []}
+    rnd = random.Random(1)
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait("health" if rnd.random() < health_share else "check")
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            while not queue.empty():
+                kind = queue.get_nowait()
+                start = time.perf_counter()
+                if kind == "health":
+                    response = await client.get("/health")
+                else:
+                    response = await client.post("/check", json=rnd.choice(transactions))
+                response.raise_for_status()
+                latencies[kind].append(time.perf_counter() - start)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--health-share", type=float, default=0.3)
+    parser.add_argument("--kinds", nargs="+", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+
+    transactions = demo_transactions(200)
+    report = []
+    for kind in args.kinds:
+        with serve_fraud_api(env={"FRAUD_API_EXECUTOR": kind}) as base_url:
+            start = time.perf_counter()
+            latencies = asyncio.run(run_mixed_load(
+                base_url, transactions, args.requests, args.concurrency, args.health_share
+            ))
+            elapsed = time.perf_counter() - start
+
+        report.append({
+            "executor": kind,
+            "requests_per_sec": round(args.requests / elapsed, 1),
+            "health_p50_ms": round(percentile(latencies["health"], 50), 2),
+            "health_p99_ms": round(percentile(latencies["health"], 99), 2),
+            "check_p50_ms": round(percentile(latencies["check"], 50), 2),
+            "check_p99_ms": round(percentile(latencies["check"], 99), 2)
+        })
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
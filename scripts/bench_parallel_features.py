@@ -0,0 +1,60 @@
+"""
+Бенчмарк признаков prepare_dataset: build_features() в одном процессе против
+build_features_parallel() с шардами по user_id (src/parallel_features.py)
+Ускорение ограничено числом ядер (cpu_count в выводе): прогоны, где процессов
+больше, чем ядер (workers_N_oversubscribed), ускорение не измеряют.
+Запуск: python scripts/bench_parallel_features.py [--rows 1000000 --users 100000 --workers 2 4 8]
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import Timer
+from src.dataset_features import build_features
+from src.parallel_features import build_features_parallel
+
+
+def make_transactions(rows, users, seed=0):
+    """Отсортированные по (user_id, timestamp) транзакции за 30 дней"""
+    rng = np.random.default_rng(seed)
+    transactions = pd.DataFrame({
+        "user_id": np.char.add("user_", rng.integers(0, users, rows).astype(str)).astype(object),
+        "amount": rng.integers(1000, 50_000_000, rows).astype(np.float64),
+        "merchant": rng.choice(["Korzinka.uz", "Makro", "Artel"], rows),
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 30 * 24 * 3600, rows), unit="s"),
+    })
+    return transactions.sort_values(["user_id", "timestamp"]).reset_index(drop=True)
+
+
+def bench(rows, users, workers_list):
+    transactions = make_transactions(rows, min(users, rows))
+    with Timer() as timer:
+        expected = build_features(transactions.copy())
+    result = {"rows": rows, "cpu_count": os.cpu_count(), "serial_sec": round(timer.elapsed, 3)}
+    for workers in workers_list:
+        with Timer() as timer:
+            features = build_features_parallel(transactions.copy(), workers=workers)
+        result[f"workers_{workers}_sec"] = round(timer.elapsed, 3)
+        result[f"workers_{workers}_speedup"] = round(result["serial_sec"] / timer.elapsed, 2)
+        result[f"workers_{workers}_oversubscribed"] = workers > (os.cpu_count() or 1)
+        result[f"workers_{workers}_matches"] = bool(
+            features.columns.equals(expected.columns)
+            and np.allclose(features.select_dtypes("number"), expected.select_dtypes("number"), rtol=1e-9, equal_nan=True)
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+    print(json.dumps([bench(rows, args.users, args.workers) for rows in args.rows], indent=2))
+
+
+if __name__ == "__main__":
+    main()
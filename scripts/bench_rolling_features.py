@@ -0,0 +1,68 @@
+"""
+Бенчмарк скользящих окон prepare_dataset: groupby().apply(rolling) против src/rolling_features.py
+Прежний расчет (только 1h, sum и count) замеряется до --legacy-max-rows строк, дальше он слишком долгий;
+новый считает sum/count/mean сразу для 5m, 1h, 24h и 7d и сверяется с прежним для 1h.
+Запуск: python scripts/bench_rolling_features.py [--rows 100000 1000000 10000000 --users 100000]
+"""
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import Timer
+from src.rolling_features import add_rolling_features
+
+
+def make_transactions(rows, users, seed=0):
+    """Отсортированные по (user_id, timestamp) транзакции за 30 дней с точностью до секунды"""
+    rng = np.random.default_rng(seed)
+    transactions = pd.DataFrame({
+        "user_id": np.char.add("user_", rng.integers(0, users, rows).astype(str)).astype(object),
+        "amount": rng.integers(1000, 5_000_000, rows).astype(np.float64),
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 30 * 24 * 3600, rows), unit="s"),
+    })
+    return transactions.sort_values(["user_id", "timestamp"]).reset_index(drop=True)
+
+
+def legacy(transactions):
+    total = (
+        transactions.groupby("user_id", group_keys=False)
+        .apply(lambda g: g.rolling("1h", on="timestamp")["amount"].sum())
+    ).fillna(0)
+    count = (
+        transactions.groupby("user_id", group_keys=False)
+        .apply(lambda g: g.rolling("1h", on="timestamp")["amount"].count())
+    ).fillna(0)
+    return total, count
+
+
+def bench(rows, users, legacy_max_rows):
+    transactions = make_transactions(rows, min(users, rows))
+    result = {"rows": rows, "users": transactions["user_id"].nunique()}
+    with Timer() as timer:
+        features = add_rolling_features(transactions.copy())
+    result["vectorized_4_windows_sec"] = round(timer.elapsed, 3)
+    if rows <= legacy_max_rows:
+        with Timer() as timer:
+            total, count = legacy(transactions)
+        result["legacy_1h_sec"] = round(timer.elapsed, 3)
+        result["speedup"] = round(result["legacy_1h_sec"] / result["vectorized_4_windows_sec"], 1)
+        result["matches_1h"] = bool(
+            np.array_equal(features["total_1h"].to_numpy(), total.to_numpy())
+            and np.array_equal(features["count_1h"].to_numpy(), count.to_numpy())
+        )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--legacy-max-rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+    print(json.dumps([bench(rows, args.users, args.legacy_max_rows) for rows in args.rows], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Бенчмарк снимков состояния: сохранение и восстановление хранилища признаков
+Запуск: python scripts/bench_snapshot.py [--users 1000000 --history 32]
+"""
+import argparse
+import json
+import tempfile
+
+import numpy as np
+
+from bench_utils import Timer
+from src.feature_store import OnlineFeatureStore
+from src.serving_snapshot import load_snapshot, save_snapshot
+
+
+def make_store(users, history):
+    """Хранилище, заполненное напрямую через export/from_state (без update по одному событию)"""
+    rng = np.random.default_rng(0)
+    state = {
+        "times": np.sort(rng.uniform(1.7e9, 1.7e9 + 3600, (users, history)), axis=1),
+        "amounts": rng.integers(1000, 5_000_000, (users, history)).astype(np.float64),
+        "start": np.zeros(users, dtype=np.int32),
+        "size": np.full(users, history, dtype=np.int32),
+        "window_size": np.full(users, history, dtype=np.int32),
+        "window_sum": np.zeros(users, dtype=np.float64),
+        "last_seen": np.full(users, 1.7e9 + 3600),
+    }
+    state["window_sum"] = state["amounts"].sum(axis=1)
+    user_ids = [f"user_{i:08d}" for i in range(users)]
+    return OnlineFeatureStore.from_state(user_ids, state, 1.7e9 + 3600, history=history, max_users=users)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--history", type=int, default=32)
+    args = parser.parse_args()
+
+    store = make_store(args.users, args.history)
+    with tempfile.TemporaryDirectory() as root:
+        with Timer() as save_timer:
+            path = save_snapshot(root, store, {"total_checks": 1})
+        size_mb = sum(p.stat().st_size for p in path.iterdir()) / 2**20
+        with Timer() as load_timer:
+            restored, _ = load_snapshot(root, max_users=args.users)
+
+    print(json.dumps({
+        "users": args.users,
+        "history": args.history,
+        "snapshot_mb": round(size_mb, 1),
+        "save_sec": round(save_timer.elapsed, 3),
+        "restore_sec": round(load_timer.elapsed, 3),
+        "restored_users": len(restored)
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
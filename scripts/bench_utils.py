@@ -0,0 +1,113 @@
+"""
+Общие помощники для бенчмарков: демо-модель и генератор транзакций
+"""
+import contextlib
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+
+def demo_transactions(n, seed=42):
+    """Транзакции в формате запроса /check"""
+    rnd = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    transactions = []
+    for _ in range(n):
+        if rnd.random() < 0.9:
+            amount = rnd.randint(50000, 2000000)
+        else:
+            amount = rnd.choice([rnd.randint(100, 1000), rnd.randint(15000000, 50000000)])
+        transactions.append({
+            "user_id": f"user_{rnd.randint(1, 100):03d}",
+            "amount": float(amount),
+            "merchant": rnd.choice(["Korzinka.uz", "Makro", "Artel"]),
+            "timestamp": (start + timedelta(minutes=rnd.randint(0, 30 * 24 * 60))).isoformat()
+        })
+    return transactions
+
+
+def make_demo_ai_system(n_rows=2000, seed=42):
+    """Обучает AdvancedFraudAI на синтетических данных (без файлов на диске)"""
+    from src.advanced_ai import AdvancedFraudAI
+
+    data = pd.DataFrame(demo_transactions(n_rows, seed))
+    data["timestamp"] = pd.to_datetime(data["timestamp"])
+    data["total_1h"] = data["amount"]
+    data["count_1h"] = 1
+    data["time_diff_sec"] = 3600
+    data["is_fraud"] = ((data["amount"] > 10_000_000) | (data["amount"] < 1000)).astype(int)
+
+    ai_system = AdvancedFraudAI()
+    ai_system.train_models(data)
+    return ai_system
+
+
+def percentile(values, q):
+    """Перцентиль в миллисекундах по списку секунд"""
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values) * 1000, q))
+
+
+class Timer:
+    """Простой контекстный таймер"""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+# Сервер для бенчмарков: fraud_api с демо-моделью в отдельном процессе
+SERVER_CODE = """
+import contextlib, io, sys
+sys.path.insert(0, {scripts!r})
+with contextlib.redirect_stdout(io.StringIO()):
+    from bench_utils import make_demo_ai_system
+    from src import fraud_api
+    fraud_api.active_model = fraud_api.make_model_state(make_demo_ai_system(), "demo", "bench")
+    fraud_api.load_ai_system = lambda: True
+import uvicorn
+sys.stdout = io.StringIO()
+uvicorn.run(fraud_api.app, host="127.0.0.1", port={port}, log_level="error")
+"""
+
+
+@contextlib.contextmanager
+def serve_fraud_api(port=8765, env=None, timeout=60):
+    """Запускает fraud_api с демо-моделью через uvicorn и ждет /health"""
+    import httpx
+
+    process = subprocess.Popen(
+        [sys.executable, "-c", SERVER_CODE.format(scripts=str(Path(__file__).parent), port=port)],
+        cwd=str(PROJECT_ROOT),
+        env={**os.environ, **(env or {})}
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                if httpx.get(f"{base_url}/health").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.time() > deadline or process.poll() is not None:
+                raise RuntimeError("fraud_api не запустился")
+            time.sleep(0.2)
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
@@ -0,0 +1,106 @@
+"""
+Бенчмарк многопроцессного обслуживания: загрузка .pkl в каждом воркере
+против общей mmap-модели. Печатает время старта и память на воркер
+(RSS и PSS - PSS делит общие страницы между процессами).
+Запуск: python scripts/bench_workers.py [--workers 4 --rows 50000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+import joblib
+
+from bench_utils import PROJECT_ROOT, make_demo_ai_system
+
+
+def read_memory_kb():
+    """RSS и PSS текущего процесса в КБ (Linux)"""
+    memory = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            if key in ("Rss", "Pss"):
+                memory[key.lower()] = int(value.split()[0])
+    return memory
+
+
+def worker(mode, path, ready, done):
+    """Импортирует API-зависимости, загружает модель и держит ее до конца замера"""
+    import sys
+    sys.path.append(str(PROJECT_ROOT))
+    with contextlib.redirect_stdout(io.StringIO()):
+        from src.model_artifact import MappedFraudAI
+        start = time.perf_counter()
+        if mode == "pickle":
+            ai_system = joblib.load(path)
+        else:
+            ai_system = MappedFraudAI(path)
+        ai_system.predict_one({"amount": 100000.0, "timestamp": "2024-01-01T12:00:00"})
+        load_seconds = time.perf_counter() - start
+    ready.put({"load_ms": load_seconds * 1000})
+    done.wait()
+    ready.put(read_memory_kb())
+
+
+def measure(mode, path, workers):
+    context = multiprocessing.get_context("spawn")
+    ready, done_load = context.Queue(), context.Event()
+    processes = []
+    for _ in range(workers):
+        process = context.Process(target=worker, args=(mode, path, ready, done_load))
+        process.start()
+        processes.append(process)
+
+    loads = [ready.get()["load_ms"] for _ in range(workers)]
+    # Память меряем, когда модель загружена во всех воркерах сразу
+    done_load.set()
+    memory = [ready.get() for _ in range(workers)]
+    for process in processes:
+        process.join()
+
+    return {
+        "mode": mode,
+        "workers": workers,
+        "load_ms_avg": round(sum(loads) / workers, 1),
+        "rss_mb_per_worker": round(sum(m["rss"] for m in memory) / workers / 1024, 1),
+        "pss_mb_per_worker": round(sum(m["pss"] for m in memory) / workers / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=50000, help="размер обучающей выборки демо-модели")
+    args = parser.parse_args()
+
+    import sys
+    sys.path.append(str(PROJECT_ROOT))
+    with contextlib.redirect_stdout(io.StringIO()):
+        from src.model_artifact import export_mapped_model
+        ai_system = make_demo_ai_system(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pickle_path = Path(tmp) / "advanced_ai_system.pkl"
+        joblib.dump(ai_system, pickle_path)
+        mmap_dir = export_mapped_model(ai_system, Path(tmp) / "advanced_ai_system.mmap")
+
+        artifact_mb = sum(f.stat().st_size for f in mmap_dir.iterdir()) / 1024 / 1024
+        report = {
+            "pickle_mb": round(pickle_path.stat().st_size / 1024 / 1024, 2),
+            "mmap_artifact_mb": round(artifact_mb, 2),
+            "runs": [
+                measure("pickle", pickle_path, args.workers),
+                measure("mmap", mmap_dir, args.workers)
+            ]
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Выгрузка новых транзакций из БД для обучения (перед ночным переобучением)
+Дочитывает строки новее водяного знака, настройки - TRAINING_EXPORT_CONFIG в src/config.py
+Запуск: DATABASE_URL=postgresql://... python scripts/export_training_data.py [--chunk-size 50000]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.db_export import make_training_export
+from src.db_router import get_router
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunk-size", type=int, help="строк в порции (по умолчанию из конфига)")
+    args = parser.parse_args()
+
+    export = make_training_export(get_router().route("export", replica=True))
+    if args.chunk_size:
+        export.chunk_size = args.chunk_size
+    paths = export.export()
+    watermark = export.watermark()
+    print(f"✅ Новых порций: {len(paths)}")
+    if watermark:
+        print(f"   Водяной знак: {watermark['timestamp']} (id {watermark['id']}), всего строк: {watermark['rows']}")
+
+
+if __name__ == "__main__":
+    main()
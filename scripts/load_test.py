@@ -0,0 +1,177 @@
+"""
+Open-loop нагрузочный тест fraud_api / secure_api / simple_api
+Запросы отправляются по расписанию (--rate в секунду) независимо от того, ответил
+ли сервер на предыдущие. Задержка считается от запланированного момента отправки,
+поэтому медленные ответы не прячут очередь (coordinated omission).
+Запуск:
+  python scripts/load_test.py --target fraud_api --rate 200 --duration 10
+  python scripts/load_test.py --url http://127.0.0.1:8000 --corpus requests.jsonl
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import time
+from collections import Counter
+from importlib import import_module
+
+import httpx
+
+from bench_utils import demo_transactions, make_demo_ai_system, percentile
+
+TARGETS = {
+    "fraud_api": "src.fraud_api",
+    "secure_api": "src.secure_api",
+    "simple_api": "src.simple_api"
+}
+PERCENTILES = (50, 95, 99, 99.9)
+
+
+def load_corpus(path):
+    """
+    Запросы из JSONL файла: либо транзакция целиком,
+    либо записанный запрос вида {"path": "/check", "body": {...}}
+    """
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "body" in item:
+                corpus.append((item.get("path", "/check"), item["body"]))
+            else:
+                corpus.append(("/check", item))
+    if not corpus:
+        raise ValueError(f"Пустой корпус: {path}")
+    return corpus
+
+
+def generated_corpus(n, seed=42):
+    """Синтетические транзакции для /check"""
+    return [("/check", tx) for tx in demo_transactions(n, seed)]
+
+
+def load_app(target):
+    """Импортирует приложение для запуска внутри процесса через ASGI"""
+    module = import_module(TARGETS[target])
+    if target == "fraud_api":
+        # lifespan через ASGI транспорт не запускается: ставим демо-модель сами
+        module.active_model = module.make_model_state(make_demo_ai_system(), "demo", "load-test")
+    return module.app
+
+
+def latency_summary(values):
+    """Перцентили и максимум в миллисекундах"""
+    summary = {f"p{q:g}": round(percentile(values, q), 3) for q in PERCENTILES}
+    summary["max"] = round(max(values) * 1000, 3) if values else 0.0
+    return summary
+
+
+async def run_open_loop(client, corpus, rate, duration, timeout=10.0):
+    """
+    Отправляет rate * duration запросов по фиксированному расписанию.
+    Каждый запрос — отдельная задача, так что медленный ответ не задерживает следующие.
+    """
+    loop = asyncio.get_running_loop()
+    total = int(rate * duration)
+    latencies, service_times, schedule_lag = [], [], []
+    errors = Counter()
+
+    async def fire(intended, path, body):
+        sent = loop.time()
+        schedule_lag.append(sent - intended)
+        try:
+            response = await client.post(path, json=body, timeout=timeout)
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] += 1
+            return
+        done = loop.time()
+        if response.status_code >= 400:
+            errors[str(response.status_code)] += 1
+            return
+        latencies.append(done - intended)
+        service_times.append(done - sent)
+
+    start = loop.time()
+    tasks = []
+    for i in range(total):
+        intended = start + i / rate
+        delay = intended - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        path, body = corpus[i % len(corpus)]
+        tasks.append(asyncio.create_task(fire(intended, path, body)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - start
+
+    error_count = sum(errors.values())
+    return {
+        "requests": total,
+        "completed": len(latencies),
+        "errors": dict(errors),
+        "error_rate": round(error_count / total, 6) if total else 0.0,
+        "elapsed_sec": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        # От запланированного момента: то, что видит клиент при открытой нагрузке
+        "latency_ms": latency_summary(latencies),
+        # От фактической отправки: без учета очереди (для сравнения)
+        "service_time_ms": latency_summary(service_times),
+        "max_schedule_lag_ms": round(max(schedule_lag) * 1000, 3) if schedule_lag else 0.0
+    }
+
+
+async def run(args, corpus):
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits)
+    else:
+        client = httpx.AsyncClient(app=load_app(args.target), base_url="http://load-test", limits=limits)
+
+    async with client:
+        if args.warmup:
+            await run_open_loop(client, corpus, args.rate, args.warmup, args.timeout)
+        return await run_open_loop(client, corpus, args.rate, args.duration, args.timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=sorted(TARGETS), default="fraud_api",
+                        help="приложение для запуска внутри процесса (ASGI)")
+    parser.add_argument("--url", help="адрес запущенного сервера вместо ASGI, например http://127.0.0.1:8000")
+    parser.add_argument("--rate", type=float, default=100, help="запросов в секунду")
+    parser.add_argument("--duration", type=float, default=10, help="секунд измерения")
+    parser.add_argument("--warmup", type=float, default=1, help="секунд прогрева (не входит в отчет)")
+    parser.add_argument("--corpus", help="JSONL с транзакциями; по умолчанию генерируются")
+    parser.add_argument("--corpus-size", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--output", help="файл для JSON отчета (иначе stdout)")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus) if args.corpus else generated_corpus(args.corpus_size)
+
+    # API печатают каждую проверку: в ASGI режиме их вывод не должен смешиваться с отчетом
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+        result = asyncio.run(run(args, corpus))
+
+    report = {
+        "target": args.url or args.target,
+        "mode": "http" if args.url else "asgi",
+        "started_at": started_at,
+        "rate": args.rate,
+        "duration_sec": args.duration,
+        "corpus": args.corpus or f"generated:{len(corpus)}",
+        **result
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Обслуживание секций transactions: создание будущих секций и архивация старых
+Запускать по расписанию (cron), настройки - PARTITION_CONFIG в src/config.py
+Запуск: DATABASE_URL=postgresql://... python scripts/maintain_partitions.py [--list]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.database import DatabaseManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--list", action="store_true", help="только показать секции")
+    args = parser.parse_args()
+
+    manager = DatabaseManager()
+    if not manager.partitions.is_partitioned():
+        print("❌ Таблица transactions не секционирована (см. init.sql)")
+        sys.exit(1)
+    if not args.list:
+        print(json.dumps(manager.maintain_partitions(), indent=2, ensure_ascii=False))
+    for partition in manager.partitions.list_partitions():
+        print(f"{partition['name']}: {partition['start']} - {partition['end']}, ~{partition['rows']} строк")
+
+
+if __name__ == "__main__":
+    main()
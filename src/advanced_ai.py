@@ -5,8 +5,17 @@ from sklearn.ensemble import IsolationForest, RandomForestClassifier
 from sklearn.neural_network import MLPClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report, roc_auc_score
+from datetime import datetime
+import threading
 import warnings
 warnings.filterwarnings('ignore')
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import read_dataset
 
 try:
     import tensorflow as tf
@@ -21,12 +30,21 @@ except ImportError:
 print(" ЗАПУСК ИИ...")
 
 class AdvancedFraudAI:
+    # Порядок полей, если транзакция передана кортежем
+    TRANSACTION_FIELDS = ('user_id', 'amount', 'timestamp', 'merchant', 'city')
+    
     def __init__(self):
         self.models = {}
         self.scaler = StandardScaler()
         self.feature_names = []
         self.required_columns = ['amount']  # Мин колонки
+        self._fast_path = None
         
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_fast_path'] = None  # буферы быстрого пути не сохраняем
+        return state
+
     def validate_data(self, data):
 
         print(" ПРОВЕРЯЕМ...")
@@ -46,7 +64,7 @@ class AdvancedFraudAI:
         if 'user_id' in data.columns:
             print("    Добавляем статистики по пользователям...")
             try:
-                user_stats = data.groupby('user_id')['amount'].agg([
+                user_stats = data.groupby('user_id', observed=True)['amount'].agg([
                     'mean', 'std', 'min', 'max', 'count'
                 ]).add_prefix('user_').fillna(0)
                 
@@ -68,7 +86,7 @@ class AdvancedFraudAI:
         if 'user_id' in data.columns and 'timestamp' in data.columns:
             print("    Добавляем поведенческие паттерны...")
             try:
-                data['prev_amount'] = data.groupby('user_id')['amount'].shift(1)
+                data['prev_amount'] = data.groupby('user_id', observed=True)['amount'].shift(1)
                 features['amount_ratio'] = data['amount'] / data['prev_amount']
                 features['amount_ratio'] = features['amount_ratio'].replace([np.inf, -np.inf], 1).fillna(1)
             except Exception as e:
@@ -88,8 +106,7 @@ class AdvancedFraudAI:
         
         features = features.fillna(0)
         
-        self.feature_names = features.columns.tolist()
-        print(f" Создано {len(features.columns)} признаков: {self.feature_names}")
+        print(f" Создано {len(features.columns)} признаков: {features.columns.tolist()}")
         
         return features
     
@@ -102,6 +119,8 @@ class AdvancedFraudAI:
             return None
         
         X = self.create_features(data)
+        self.feature_names = X.columns.tolist()
+        self._fast_path = None
         X_scaled = self.scaler.fit_transform(X)
         
         y = data['is_fraud'] if 'is_fraud' in data.columns else None
@@ -193,8 +212,24 @@ class AdvancedFraudAI:
             return data
         
         X = self.create_features(data)
+        # Порядок колонок как при обучении, недостающие признаки = 0
+        X = X.reindex(columns=self.feature_names, fill_value=0)
         X_scaled = self.scaler.transform(X)
         
+        ensemble_pred = self._ensemble_scores(X_scaled)
+        
+        if ensemble_pred is not None:
+            data['ai_fraud_score'] = ensemble_pred
+            data['ai_fraud_prediction'] = (ensemble_pred > 0.3).astype(int)
+        else:
+            print("Не удалось получить предсказания от моделей")
+            data['ai_fraud_score'] = 0
+            data['ai_fraud_prediction'] = 0
+        
+        return data
+    
+    def _ensemble_scores(self, X_scaled):
+        """Голосование ансамбля по уже масштабированной матрице признаков"""
         predictions = {}
         
         if 'isolation_forest' in self.models:
@@ -218,17 +253,131 @@ class AdvancedFraudAI:
             except Exception as e:
                 print(f" Ошибка в Random Forest: {e}")
         
-        if predictions:
-            ensemble_pred = np.mean(list(predictions.values()), axis=0)
-            data['ai_fraud_score'] = ensemble_pred
-            data['ai_fraud_prediction'] = (ensemble_pred > 0.3).astype(int)
-            print(f" Ансамбль предсказаний создан ({len(predictions)} моделей)")
-        else:
-            print("Не удалось получить предсказания от моделей")
-            data['ai_fraud_score'] = 0
-            data['ai_fraud_prediction'] = 0
+        if not predictions:
+            return None
         
-        return data
+        print(f" Ансамбль предсказаний создан ({len(predictions)} моделей)")
+        return np.mean(list(predictions.values()), axis=0)
+    
+    def fill_feature_row(self, record, out):
+        """
+        Записывает в out (1-D буфер длины n_features) немасштабированные признаки
+        одной транзакции в порядке feature_names. Правила те же, что у
+        create_features для DataFrame из одной транзакции: amount_ratio = 1
+        (если запись не несет его из хранилища признаков), amount_zscore = 0,
+        время из timestamp, остальное из записи или 0.
+        """
+        time_parts = parse_time_parts(record.get('timestamp'))
+        for j, name in enumerate(self.feature_names):
+            if name in ('hour', 'day_of_week', 'is_weekend'):
+                out[j] = time_parts[name] if time_parts is not None else 0
+            elif name == 'amount_ratio':
+                ratio = record.get('amount_ratio')
+                out[j] = 1.0 if ratio is None else ratio
+            elif name == 'amount_zscore':
+                out[j] = 0.0
+            else:
+                out[j] = record.get(name) or 0
+        return out
+    
+    def records_to_matrix(self, records):
+        """Матрица немасштабированных признаков для списка транзакций (dict) без pandas"""
+        X = np.zeros((len(records), len(self.feature_names)), dtype=np.float64)
+        for i, record in enumerate(records):
+            self.fill_feature_row(record, X[i])
+        return X
+    
+    def predict_records(self, records):
+        """
+        Пакетное предсказание: одна матрица признаков, один вызов каждой модели.
+        Возвращает (scores, predictions) в порядке входных записей.
+        """
+        if not self.models:
+            raise ValueError("Нет обученных моделей")
+        
+        X = self.records_to_matrix(records)
+        X -= self.scaler.mean_
+        X /= self.scaler.scale_
+        
+        scores = self._ensemble_scores(X)
+        if scores is None:
+            raise ValueError("Не удалось получить предсказания от моделей")
+        
+        scores = np.asarray(scores, dtype=np.float64)
+        return scores, (scores > 0.3).astype(int)
+
+    def _prepare_fast_path(self):
+        """Готовит параметры scaler и буферы потоков для быстрого пути"""
+        if getattr(self, '_fast_path', None) is None:
+            self._fast_path = {
+                'mean': np.asarray(self.scaler.mean_, dtype=np.float64),
+                'scale': np.asarray(self.scaler.scale_, dtype=np.float64),
+                'buffers': threading.local()
+            }
+        return self._fast_path
+    
+    def transaction_to_row(self, transaction):
+        """
+        Заполняет предвыделенную строку float32 (1, n_features) масштабированными
+        признаками одной транзакции в порядке feature_names.
+        Масштабирование выполняется в float64 (как StandardScaler.transform),
+        поэтому результат моделей совпадает с путем через DataFrame.
+        Возвращается общий буфер текущего потока: следующий вызов в этом же
+        потоке его перезапишет.
+        """
+        if isinstance(transaction, tuple):
+            transaction = dict(zip(self.TRANSACTION_FIELDS, transaction))
+        
+        plan = self._prepare_fast_path()
+        buffers = plan['buffers']
+        if not hasattr(buffers, 'row'):
+            buffers.raw = np.zeros(len(self.feature_names), dtype=np.float64)
+            buffers.row = np.zeros((1, len(self.feature_names)), dtype=np.float32)
+        raw, row = buffers.raw, buffers.row
+        
+        self.fill_feature_row(transaction, raw)
+        raw -= plan['mean']
+        raw /= plan['scale']
+        row[0] = raw
+        return row
+    
+    def predict_one(self, transaction):
+        """
+        Быстрое предсказание для одной транзакции (dict или кортеж) без pandas.
+        Признаки пишутся в строку transaction_to_row - это общий буфер потока,
+        поэтому в одном потоке вызовы не должны перекрываться.
+        Возвращает (score, prediction).
+        """
+        if not self.models:
+            raise ValueError("Нет обученных моделей")
+        
+        scores = self._ensemble_scores(self.transaction_to_row(transaction))
+        if scores is None:
+            raise ValueError("Не удалось получить предсказания от моделей")
+        
+        score = float(scores[0])
+        return score, int(score > 0.3)
+
+def parse_time_parts(timestamp):
+    """Час, день недели и флаг выходного для одной метки времени (или None)"""
+    if timestamp is None:
+        return None
+    try:
+        if isinstance(timestamp, datetime):
+            ts = timestamp
+        else:
+            try:
+                ts = datetime.fromisoformat(str(timestamp))
+            except ValueError:
+                ts = pd.Timestamp(timestamp)
+        day_of_week = ts.weekday()
+        return {
+            'hour': ts.hour,
+            'day_of_week': day_of_week,
+            'is_weekend': int(day_of_week in (5, 6))
+        }
+    except Exception:
+        return None
 
 def main():
     """Основная функция"""
@@ -237,7 +386,7 @@ def main():
     print("=" * 60)
     
     try:
-        data = pd.read_csv("data/prepared_transactions.csv")
+        data = read_dataset("data/prepared_transactions.csv")
         print(f"Загружено {len(data):,} транзакций")
         
         ai_system = AdvancedFraudAI()
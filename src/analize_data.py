@@ -2,16 +2,22 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import mplcursors
 from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import dataset_exists, read_dataset
 
 print(" ЗАПУСК АНАЛИЗА БЕЗОПАСНОСТИ ТРАНЗАКЦИЙ...")
 
-if not Path("prepared_transactions.csv").exists():
+if not dataset_exists("prepared_transactions.csv"):
     print(" Файл с транзакциями не найден!")
     print(" Сначала запустите: python prepare_dataset.py")
     exit()
 
 print(" ЗАГРУЗКА ДАННЫХ...")
-df = pd.read_csv("prepared_transactions.csv")
+df = read_dataset("prepared_transactions.csv")
 print(f" Загружено {len(df):,} транзакций")
 
 if "is_fraud" not in df.columns:
@@ -0,0 +1,220 @@
+"""
+АСИНХРОННАЯ РАБОТА С POSTGRESQL
+Те же методы, что у DatabaseManager, на psycopg 3 и AsyncConnectionPool:
+асинхронные обработчики ждут БД, не блокируя event loop, и могут выполнять
+несколько запросов одновременно (каждый на своем соединении из пула).
+"""
+
+import asyncio
+import logging
+import os
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from src.config import DATABASE_CONFIG, DB_POOL_CONFIG, PATTERN_CACHE_CONFIG
+from src.database import (
+    API_LOG_COLUMNS, DASHBOARD_TOP_MERCHANTS, HOURLY_STATS_QUERY, MAX_TRANSACTIONS_PER_HOUR,
+    MERCHANT_STATS_QUERY, OVERALL_STATS_QUERY, RISK_LEVEL_STATS_QUERY, TRANSACTION_COLUMNS,
+    USER_STATS_QUERY, USERS_STATS_QUERY, VELOCITY_QUERY, match_fraud_patterns
+)
+from src.pattern_cache import NOTIFY_CHANNEL, FraudPatternCache
+
+logger = logging.getLogger(__name__)
+
+def make_async_pool():
+    """AsyncConnectionPool с настройками DB_POOL_CONFIG: DATABASE_URL, если задан, иначе DATABASE_CONFIG"""
+    conninfo = os.getenv('DATABASE_URL') or make_conninfo(
+        dbname=DATABASE_CONFIG['database'],
+        user=DATABASE_CONFIG['user'],
+        password=DATABASE_CONFIG['password'],
+        host=DATABASE_CONFIG['host'],
+        port=DATABASE_CONFIG['port']
+    )
+    return AsyncConnectionPool(
+        conninfo,
+        name='async',
+        min_size=DB_POOL_CONFIG['min_size'],
+        max_size=DB_POOL_CONFIG['max_size'],
+        timeout=DB_POOL_CONFIG['checkout_timeout'],
+        max_idle=DB_POOL_CONFIG['max_idle'],
+        reconnect_timeout=DB_POOL_CONFIG['checkout_timeout'],
+        kwargs={'connect_timeout': DB_POOL_CONFIG['connect_timeout']},
+        open=False
+    )
+
+class AsyncDatabaseManager:
+    """
+    Асинхронный DatabaseManager. Пул привязан к event loop, поэтому
+    менеджер создается и открывается внутри работающего приложения:
+    await db.open() при старте, await db.close() при остановке.
+    """
+
+    def __init__(self, pool=None):
+        self._pool = pool
+        self._opened = False
+        self._listener = None
+        self.patterns = FraudPatternCache(None, PATTERN_CACHE_CONFIG['ttl'])
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = make_async_pool()
+        return self._pool
+
+    async def open(self):
+        """Открывает пул; недоступная БД не мешает старту - соединения создаются в фоне"""
+        if not self._opened:
+            await self.pool.open()
+            self._opened = True
+        if PATTERN_CACHE_CONFIG['listen'] and self._listener is None:
+            self._listener = asyncio.create_task(self._listen_patterns())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._opened:
+            await self.pool.close()
+            self._opened = False
+
+    async def _fetch(self, query, params=None, one=False):
+        if not self._opened:
+            await self.open()
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, params)
+                return await (cur.fetchone() if one else cur.fetchall())
+
+    async def _execute(self, query, params):
+        if not self._opened:
+            await self.open()
+        # Блок connection() фиксирует транзакцию при выходе без ошибки
+        async with self.pool.connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(query, params)
+                return await cur.fetchone() if cur.description else None
+
+    async def log_transaction(self, user_id, amount, is_fraud, fraud_score, risk_level, merchant=None):
+        """Безопасное логирование транзакции в БД"""
+        try:
+            row = await self._execute(
+                f"INSERT INTO transactions ({', '.join(TRANSACTION_COLUMNS)}) "
+                "VALUES (%s, %s, %s, %s, %s, %s) RETURNING id",
+                (user_id, amount, merchant, is_fraud, fraud_score, risk_level)
+            )
+            return row['id']
+        except (psycopg.Error, PoolTimeout) as e:
+            logger.error(f"Error logging transaction: {e}")
+            return None
+
+    async def log_api_request(self, endpoint, method, user_id, amount, response_time, status_code, is_suspicious):
+        """Логирование API запросов"""
+        try:
+            await self._execute(
+                f"INSERT INTO api_logs ({', '.join(API_LOG_COLUMNS)}) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                (endpoint, method, user_id, amount, response_time, status_code, is_suspicious)
+            )
+        except (psycopg.Error, PoolTimeout) as e:
+            logger.error(f"Error logging API request: {e}")
+
+    async def _load_fraud_patterns(self):
+        return await self._fetch("SELECT pattern_name, sql_condition FROM fraud_patterns WHERE is_active = true")
+
+    async def get_fraud_patterns(self):
+        """Паттерны мошенничества из кэша; БД читается по TTL или после NOTIFY"""
+        return await self.patterns.get_async(self._load_fraud_patterns)
+
+    async def _listen_patterns(self, reconnect_delay=5.0):
+        """Сбрасывает кэш паттернов по NOTIFY (триггер в init.sql)"""
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(
+                    self.pool.conninfo, autocommit=True, **self.pool.kwargs
+                )
+                async with conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    # Пока соединения не было, уведомления могли потеряться
+                    self.patterns.invalidate()
+                    async for _ in conn.notifies():
+                        self.patterns.invalidate()
+            except psycopg.Error as e:
+                logger.warning(f"fraud patterns listener: {e}")
+                await asyncio.sleep(reconnect_delay)
+
+    async def get_user_transaction_stats(self, user_id):
+        """Получение статистики по пользователю (безопасно): одна строка user_stats"""
+        try:
+            return await self._fetch(USER_STATS_QUERY, {'user_id': user_id}, one=True)
+        except (psycopg.Error, PoolTimeout) as e:
+            logger.error(f"Error getting user stats: {e}")
+            return None
+
+    async def get_users_transaction_stats(self, user_ids):
+        """
+        Статистика сразу для многих пользователей за один запрос.
+        Возвращает {user_id: статистика}; пользователей без операций в ответе нет.
+        None - статистика недоступна (ошибка БД): не путать с новыми пользователями.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        try:
+            rows = await self._fetch(USERS_STATS_QUERY, {'user_ids': user_ids})
+        except (psycopg.Error, PoolTimeout) as e:
+            logger.error(f"Error getting users stats: {e}")
+            return None
+        return {row['user_id']: row for row in rows}
+
+    async def detect_sql_pattern_fraud(self, user_id, amount, count_1h=None):
+        """
+        Обнаружение мошенничества через SQL паттерны.
+        count_1h из хранилища признаков заменяет COUNT(*) за последний час.
+        """
+        try:
+            fraud_reasons, needs_count = match_fraud_patterns(await self.get_fraud_patterns(), amount, count_1h)
+            if needs_count:
+                result = await self._fetch(VELOCITY_QUERY, {'user_id': user_id}, one=True)
+                if result and result['recent_count'] > MAX_TRANSACTIONS_PER_HOUR:
+                    fraud_reasons.append("multiple_transactions")
+            return fraud_reasons
+        except (psycopg.Error, PoolTimeout) as e:
+            logger.error(f"Error in SQL pattern detection: {e}")
+            return []
+
+    async def get_user_context(self, user_id, amount, count_1h=None):
+        """Статистика пользователя и сработавшие паттерны - оба запроса одновременно"""
+        user_stats, fraud_reasons = await asyncio.gather(
+            self.get_user_transaction_stats(user_id),
+            self.detect_sql_pattern_fraud(user_id, amount, count_1h)
+        )
+        return {'user_stats': user_stats, 'fraud_reasons': fraud_reasons}
+
+    async def get_dashboard_data(self):
+        """Данные для дашборда из сводок rollup_*; четыре запроса выполняются одновременно"""
+        try:
+            overall, hourly, risk_levels, merchants = await asyncio.gather(
+                self._fetch(OVERALL_STATS_QUERY, one=True),
+                self._fetch(HOURLY_STATS_QUERY),
+                self._fetch(RISK_LEVEL_STATS_QUERY),
+                self._fetch(MERCHANT_STATS_QUERY, (DASHBOARD_TOP_MERCHANTS,))
+            )
+        except (psycopg.Error, PoolTimeout) as e:
+            logger.error(f"Error getting dashboard data: {e}")
+            return None
+        return {
+            'overall': overall,
+            'hourly': hourly,
+            'risk_levels': risk_levels,
+            'merchants': merchants
+        }
+
+    def stats(self):
+        """Состояние пула (psycopg_pool)"""
+        return self.pool.get_stats() if self._opened else {}
@@ -6,8 +6,10 @@ import time
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).parent.parent))
 
 from config import setup_directories, get_data_path, PATHS
+from src.datasets import dataset_exists, read_dataset
 
 class BankAISystem:
     def __init__(self):
@@ -98,12 +100,12 @@ class BankAISystem:
         
         try:
             data_path = get_data_path('prepared_data')
-            if not data_path.exists():
+            if not dataset_exists(data_path):
                 print(" Файл с данными не найден!")
                 print(" Сначала запустите 'Полный цикл'")
                 return
             
-            data = pd.read_csv(data_path)
+            data = read_dataset(data_path, columns=['is_fraud', 'amount'])
             total = len(data)
             
             if 'is_fraud' in data.columns:
@@ -69,4 +69,124 @@ DATABASE_CONFIG = {
     "database": os.getenv("DB_NAME", "fraud_db"),
     "user": os.getenv("DB_USER", "admin"),
     "password": os.getenv("DB_PASSWORD", "password")
-}
\ No newline at end of file
+}
+
+# Настройки обслуживания fraud_api
+SERVING_CONFIG = {
+    # Микробатчинг запросов /check: ждем до max_wait_ms или max_batch запросов
+    "coalesce": os.getenv("FRAUD_API_COALESCE", "False").lower() == "true",
+    "coalesce_max_wait_ms": float(os.getenv("FRAUD_API_COALESCE_MAX_WAIT_MS", "2")),
+    "coalesce_max_batch": int(os.getenv("FRAUD_API_COALESCE_MAX_BATCH", "64")),
+    # Где выполнять инференс: inline (в event loop), thread или process
+    "executor": os.getenv("FRAUD_API_EXECUTOR", "thread"),
+    "executor_workers": int(os.getenv("FRAUD_API_EXECUTOR_WORKERS", "0")) or None,
+    "executor_max_in_flight": int(os.getenv("FRAUD_API_EXECUTOR_MAX_IN_FLIGHT", "0")) or None,
+    # Несколько процессов uvicorn с общей mmap-копией модели
+    "workers": int(os.getenv("FRAUD_API_WORKERS", "1")),
+    "model_mmap": os.getenv("FRAUD_API_MODEL_MMAP", "False").lower() == "true",
+    # Сколько транзакций NDJSON-потока оценивать за один вызов ансамбля
+    "stream_chunk_size": int(os.getenv("FRAUD_API_STREAM_CHUNK_SIZE", "1000")),
+    # Максимальная длина одной NDJSON-строки; длиннее - ошибка для этой строки
+    "stream_max_line_bytes": int(os.getenv("FRAUD_API_STREAM_MAX_LINE_BYTES", str(64 * 1024))),
+    # Признаки user_mean/user_std/... из таблицы user_stats: один запрос к БД на пакет
+    # Выключено по умолчанию: запрос к БД на каждую проверку, и при недоступной БД
+    # каждая проверка ждет до DB_POOL_CHECKOUT_TIMEOUT перед оценкой без этих признаков
+    "user_stats_features": os.getenv("FRAUD_API_USER_STATS_FEATURES", "False").lower() == "true"
+}
+
+# Пул соединений PostgreSQL (src/db_pool.py)
+DB_POOL_CONFIG = {
+    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    # Сколько ждать свободное соединение, прежде чем вернуть ошибку
+    "checkout_timeout": float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "5")),
+    # Соединение, простоявшее дольше, проверяется SELECT 1 перед выдачей
+    "validate_after": float(os.getenv("DB_POOL_VALIDATE_AFTER", "30")),
+    # Простаивающие соединения сверх min_size закрываются через max_idle секунд
+    "max_idle": float(os.getenv("DB_POOL_MAX_IDLE", "300")),
+    # После ошибки подключения столько секунд не пытаемся подключиться снова
+    "connect_backoff": float(os.getenv("DB_POOL_CONNECT_BACKOFF", "1")),
+    "connect_timeout": int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+}
+
+# Реплика для чтения (src/db_router.py): дашборды, статистика и выгрузки для обучения.
+# Без url и host реплики все запросы идут на основную БД
+DB_REPLICA_CONFIG = {
+    "url": os.getenv("DATABASE_REPLICA_URL", ""),
+    "host": os.getenv("DB_REPLICA_HOST", ""),
+    "port": os.getenv("DB_REPLICA_PORT", os.getenv("DB_PORT", "5432")),
+    # При большем отставании реплики запросы читают основную БД
+    "max_lag_sec": float(os.getenv("DB_REPLICA_MAX_LAG_SEC", "5")),
+    # Как часто перепроверять отставание (и доступность) реплики
+    "lag_check_interval": float(os.getenv("DB_REPLICA_LAG_CHECK_INTERVAL", "1"))
+}
+
+# Отложенная пакетная запись транзакций и логов (src/write_behind.py)
+WRITE_BEHIND_CONFIG = {
+    "enabled": os.getenv("WRITE_BEHIND_ENABLED", "True").lower() == "true",
+    "max_queue": int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000")),
+    "batch_size": int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500")),
+    "flush_interval": float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1")),
+    # Куда складывать строки, пока БД недоступна; пустое значение - не сохранять
+    "spill_dir": os.getenv("WRITE_BEHIND_SPILL_DIR", str(DATA_DIR / "spill"))
+}
+
+# Кэш таблицы fraud_patterns (src/pattern_cache.py)
+PATTERN_CACHE_CONFIG = {
+    # Страховочный срок жизни кэша, если NOTIFY не дошел
+    "ttl": float(os.getenv("FRAUD_PATTERNS_TTL", "300")),
+    # Сбрасывать кэш по NOTIFY fraud_patterns_changed (триггер в init.sql)
+    "listen": os.getenv("FRAUD_PATTERNS_LISTEN", "True").lower() == "true"
+}
+
+# Онлайн-хранилище поведенческих признаков (src/feature_store.py)
+FEATURE_STORE_CONFIG = {
+    "enabled": os.getenv("FEATURE_STORE_ENABLED", "True").lower() == "true",
+    "window_sec": float(os.getenv("FEATURE_STORE_WINDOW_SEC", "3600")),
+    # Сколько последних транзакций пользователя хранится (верхняя граница count_1h)
+    "history": int(os.getenv("FEATURE_STORE_HISTORY", "32")),
+    "max_users": int(os.getenv("FEATURE_STORE_MAX_USERS", "1000000")),
+    "idle_ttl_sec": float(os.getenv("FEATURE_STORE_IDLE_TTL_SEC", str(24 * 3600)))
+}
+
+# Снимки состояния fraud_api: хранилище признаков и счетчики (src/serving_snapshot.py)
+SNAPSHOT_CONFIG = {
+    # Пустое значение отключает снимки
+    "dir": os.getenv("FRAUD_API_SNAPSHOT_DIR", str(DATA_DIR / "snapshots")),
+    "interval_sec": float(os.getenv("FRAUD_API_SNAPSHOT_INTERVAL_SEC", "60")),
+    "keep": int(os.getenv("FRAUD_API_SNAPSHOT_KEEP", "2")),
+    # Дочитывать из БД транзакции, записанные после снимка
+    "replay_from_db": os.getenv("FRAUD_API_SNAPSHOT_REPLAY", "True").lower() == "true"
+}
+
+# Секции таблицы transactions и архив старых секций (src/partitions.py)
+PARTITION_CONFIG = {
+    # Размер секции: day или month
+    "interval": os.getenv("TRANSACTIONS_PARTITION_INTERVAL", "month"),
+    # Сколько будущих секций создавать заранее
+    "premake": int(os.getenv("TRANSACTIONS_PARTITION_PREMAKE", "2")),
+    # Секции, которые целиком старше retention_days, выгружаются в архив и удаляются; 0 - хранить все
+    "retention_days": int(os.getenv("TRANSACTIONS_RETENTION_DAYS", "0")),
+    "archive_dir": os.getenv("TRANSACTIONS_ARCHIVE_DIR", str(DATA_DIR / "archive")),
+    # Минутные счетчики нужны только для окна в час; более старые удаляются при обслуживании
+    "counter_retention_days": int(os.getenv("USER_COUNTERS_RETENTION_DAYS", "2")),
+    # Сколько строк секции читать с сервера и держать в памяти при архивации
+    "archive_batch_rows": int(os.getenv("TRANSACTIONS_ARCHIVE_BATCH_ROWS", "50000"))
+}
+
+# Выгрузка транзакций из БД для обучения моделей (src/db_export.py)
+TRAINING_EXPORT_CONFIG = {
+    # Каталог порций Parquet и водяного знака watermark.json
+    "dir": os.getenv("TRAINING_EXPORT_DIR", str(DATA_DIR / "export")),
+    # Сколько строк читать с сервера за раз: столько же строк в одной порции
+    "chunk_size": int(os.getenv("TRAINING_EXPORT_CHUNK_SIZE", "50000")),
+    # Строки моложе settle_sec не выгружаются: транзакции, еще не зафиксированные
+    # в БД (например, в очереди записи), не должны оказаться позади водяного знака
+    "settle_sec": float(os.getenv("TRAINING_EXPORT_SETTLE_SEC", "300"))
+}
+
+# Хранение наборов данных dummy_transactions, dummy_users, prepared_transactions (src/datasets.py)
+DATASET_CONFIG = {
+    # parquet - типизированный Parquet со словарями; csv - как раньше
+    "format": os.getenv("DATASET_FORMAT", "parquet")
+}
@@ -2,13 +2,20 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from datetime import datetime
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import read_dataset
 
 def create_executive_dashboard():
     """Создает дашборд для руководства"""
     print(" СОЗДАЕМ ДАШБОРД ДЛЯ РУКОВОДСТВА...")
     
     try:
-        data = pd.read_csv("prepared_transactions.csv")
+        data = read_dataset("prepared_transactions.csv", columns=['user_id', 'amount', 'is_fraud', 'timestamp'])
     except:
         print(" Нет данных для дашборда")
         return
@@ -30,7 +37,7 @@ def create_executive_dashboard():
     axes[0,0].set_title('РАСПРЕДЕЛЕНИЕ ТРАНЗАКЦИЙ')
     
     if 'user_id' in data.columns:
-        user_risk = data.groupby('user_id').agg({
+        user_risk = data.groupby('user_id', observed=True).agg({
             'amount': ['count', 'sum'],
             'is_fraud': 'sum'
         }).round(2)
@@ -0,0 +1,301 @@
+"""
+ПРИЗНАКИ ОБУЧАЮЩЕГО НАБОРА
+Конвейер prepare_dataset.py по шагам: статистики пользователя, время,
+скользящие окна и лаги, z-оценки и целевая переменная. build_features() считает
+все в памяти; build_features_chunked() - порциями по входу, упорядоченному
+по времени: хвосты окон и лаги пользователей переносятся между порциями,
+а статистики по всей истории собираются отдельным первым проходом.
+Это же состояние (FeatureState) сохраняется между запусками, чтобы дописывать
+признаки только для новых транзакций.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.rolling_features import WINDOWS, add_rolling_features
+
+USER_STAT_COLUMNS = ['user_mean', 'user_std', 'user_min', 'user_max', 'user_count']
+LAGS = 3
+# Строки, которые нужны следующей порции: окна и лаги считаются по user_id, timestamp, amount
+SEQUENCE_COLUMNS = ['user_id', 'timestamp', 'amount']
+
+class RunningStats:
+    """
+    Число, сумма, M2 (сумма квадратов отклонений), минимум и максимум amount
+    по ключу, с объединением порций по формуле Чана. Среднее - сумма / число,
+    как у pandas, поэтому для целых сумм оно совпадает с расчетом в памяти точно.
+    """
+
+    COLUMNS = ['count', 'sum', 'm2', 'min', 'max']
+
+    def __init__(self, frame=None):
+        self.frame = frame if frame is not None else pd.DataFrame(columns=self.COLUMNS)
+
+    @staticmethod
+    def _aggregate(amounts, keys):
+        grouped = amounts.groupby(keys, observed=True)
+        part = grouped.agg(['count', 'sum', 'var', 'min', 'max'])
+        part['m2'] = (part.pop('var') * (part['count'] - 1)).fillna(0)
+        return part[RunningStats.COLUMNS]
+
+    def update(self, amounts, keys):
+        """Добавляет суммы amounts, сгруппированные по keys (Series той же длины)"""
+        return self.merge(self._aggregate(amounts, keys))
+
+    def merge(self, part):
+        """Добавляет уже посчитанные суммы: frame другого RunningStats"""
+        if part.empty:
+            return self
+        if self.frame.empty:
+            self.frame = part
+            return self
+        parts = pd.concat([self.frame, part])
+        grouped = parts.groupby(level=0, sort=False, observed=True)
+        merged = grouped[['count', 'sum']].sum()
+        merged['min'] = grouped['min'].min()
+        merged['max'] = grouped['max'].max()
+        mean = (merged['sum'] / merged['count']).reindex(parts.index)
+        # У ключа без сумм (все NaN) среднее не определено, его вклад - 0
+        spread = parts['m2'] + (parts['count'] * (parts['sum'] / parts['count'] - mean) ** 2).fillna(0)
+        merged['m2'] = spread.groupby(level=0, sort=False, observed=True).sum()
+        self.frame = merged[self.COLUMNS]
+        return self
+
+    def mean(self):
+        return self.frame['sum'] / self.frame['count']
+
+    def std(self):
+        """Выборочное стандартное отклонение (ddof=1), NaN при одной сумме"""
+        return np.sqrt(self.frame['m2'] / (self.frame['count'] - 1).where(self.frame['count'] > 1))
+
+def user_aggregates(transactions):
+    """mean/std/min/max/count суммы по пользователю (без округления), индекс - user_id"""
+    stats = transactions.groupby('user_id', observed=True)['amount'].agg(['mean', 'std', 'min', 'max', 'count'])
+    stats.columns = USER_STAT_COLUMNS
+    stats.index.name = 'user_id'
+    return stats
+
+def running_user_aggregates(running):
+    """То же по RunningStats"""
+    stats = pd.DataFrame({
+        'user_mean': running.mean(),
+        'user_std': running.std(),
+        'user_min': running.frame['min'],
+        'user_max': running.frame['max'],
+        'user_count': running.frame['count'].astype(np.int64)
+    })
+    stats.index.name = 'user_id'
+    return stats
+
+def add_user_stats(transactions, stats):
+    """Колонки user_* (округленные до копеек, как раньше) по статистикам пользователей"""
+    return transactions.merge(stats.round(2), on='user_id', how='left')
+
+def add_time_features(transactions):
+    transactions["hour"] = transactions["timestamp"].dt.hour
+    transactions["day_of_week"] = transactions["timestamp"].dt.dayofweek
+    transactions["is_weekend"] = transactions["day_of_week"].isin([5, 6]).astype(int)
+    transactions["month"] = transactions["timestamp"].dt.month
+    return transactions
+
+def add_sequence_features(transactions):
+    """
+    Окна, лаги, отношение к прошлой сумме и пауза. Строки пользователя должны идти
+    по времени; подряд им идти не обязательно (подходит и вход, упорядоченный по времени).
+    """
+    # total_/count_/mean_ за 5m, 1h, 24h и 7d за один проход (src/rolling_features.py)
+    transactions = add_rolling_features(transactions)
+    by_user = transactions.groupby("user_id", observed=True)
+    for lag in range(1, LAGS + 1):
+        transactions[f"prev_amount_{lag}"] = by_user["amount"].shift(lag).fillna(0)
+
+    transactions["amount_ratio"] = (
+        transactions["amount"] / by_user["amount"].shift(1)
+    ).replace([np.inf, -np.inf], 1).fillna(1)
+
+    transactions["time_diff_sec"] = by_user["timestamp"].diff().dt.total_seconds().fillna(0)
+    return transactions
+
+def add_zscores(transactions, amount_mean, amount_std, stats):
+    """Отклонение суммы от среднего по всем операциям и от среднего пользователя"""
+    transactions = add_amount_zscore(transactions, amount_mean, amount_std)
+    return add_user_amount_zscore(transactions, stats)
+
+def add_amount_zscore(transactions, amount_mean, amount_std):
+    transactions["amount_zscore"] = np.abs(
+        (transactions["amount"] - amount_mean) / amount_std
+    ).fillna(0)
+    return transactions
+
+def add_user_amount_zscore(transactions, stats):
+    # Через индекс статистик: map по category-ключу вернул бы category
+    rows = stats.index.get_indexer(transactions["user_id"])
+    user_mean = pd.Series(stats["user_mean"].to_numpy()[rows], index=transactions.index).where(rows >= 0)
+    user_std = pd.Series(stats["user_std"].to_numpy()[rows], index=transactions.index).where(rows >= 0)
+    transactions["user_amount_zscore"] = np.abs(
+        (transactions["amount"] - user_mean) / user_std.where(user_std > 0)
+    ).fillna(0)
+    return transactions
+
+def add_fraud_target(transactions):
+    transactions["is_fraud"] = (
+        (transactions["amount"] > 10_000_000) |                           # Очень крупные суммы
+        (transactions["amount"] < 1000) |                                # Очень мелкие суммы
+        (transactions["count_1h"] > 8) |                                 # Слишком много операций в час
+        (transactions["total_1h"] > 15_000_000) |                        # Большие суммы за час
+        (transactions["time_diff_sec"] < 60) |                           # Операции менее чем за минуту
+        (transactions["amount_zscore"] > 3)                              # Статистические аномалии
+    ).astype(int)
+    return transactions
+
+def build_features(transactions):
+    """Все признаки в памяти; transactions отсортированы по (user_id, timestamp)"""
+    stats = user_aggregates(transactions)
+    transactions = add_user_stats(transactions, stats)
+    transactions = add_time_features(transactions)
+    transactions = add_sequence_features(transactions)
+    transactions = add_zscores(transactions, transactions["amount"].mean(), transactions["amount"].std(), stats)
+    return add_fraud_target(transactions)
+
+def _parse_chunk(chunk):
+    chunk = chunk.reset_index(drop=True)
+    chunk["timestamp"] = pd.to_datetime(chunk["timestamp"])
+    return chunk
+
+class FeatureState:
+    """
+    Все, что нужно для признаков следующих строк без пересчета прошлых:
+    RunningStats суммы по пользователю и по всем операциям (число, сумма, M2, min/max),
+    перенесенные строки (события последних 7 дней и три последние операции
+    пользователя) и время последней строки. add_history() добавляет суммы в статистики,
+    featurize() считает признаки следующей по времени порции. Состояние
+    сохраняется в каталог (save/load) для инкрементального prepare_dataset.
+    """
+
+    FILES = ('per_user.parquet', 'overall.parquet', 'carry.parquet', 'state.json')
+
+    def __init__(self, per_user=None, overall=None, carry=None, last_time=None):
+        self.per_user = per_user or RunningStats()
+        self.overall = overall or RunningStats()
+        self.carry = carry
+        self.last_time = last_time
+        self._stats = None
+
+    def add_history(self, chunk):
+        """Учитывает суммы порции в статистиках пользователей и всех операций"""
+        self.per_user.update(chunk["amount"], chunk["user_id"])
+        self.overall.update(chunk["amount"], pd.Series(0, index=chunk.index))
+        self._stats = None
+
+    def stats(self):
+        """(статистики пользователей, среднее и std суммы по всем операциям)"""
+        if self._stats is None:
+            self._stats = (
+                running_user_aggregates(self.per_user),
+                self.overall.mean().get(0, np.nan),
+                self.overall.std().get(0, np.nan)
+            )
+        return self._stats
+
+    def featurize(self, chunk):
+        """
+        Признаки порции, которая по времени идет после всех прошлых. Статистики
+        берутся как есть: суммы порции должны быть уже учтены add_history().
+        """
+        chunk = _parse_chunk(chunk)
+        times = chunk["timestamp"]
+        if not times.is_monotonic_increasing or (self.last_time is not None and times.iloc[0] < self.last_time):
+            raise ValueError("Порционный режим требует входа, упорядоченного по времени")
+        self.last_time = times.iloc[-1]
+        stats, amount_mean, amount_std = self.stats()
+
+        combined = chunk[SEQUENCE_COLUMNS]
+        if self.carry is not None:
+            combined = pd.concat([self.carry, combined], ignore_index=True)
+        carried = len(combined) - len(chunk)
+        sequence = add_sequence_features(combined.copy()).iloc[carried:].reset_index(drop=True)
+
+        features = add_user_stats(chunk, stats)
+        features = add_time_features(features)
+        for column in sequence.columns.difference(SEQUENCE_COLUMNS, sort=False):
+            features[column] = sequence[column].to_numpy()
+        features = add_zscores(features, amount_mean, amount_std, stats)
+
+        keep = combined["timestamp"] > self.last_time - max(WINDOWS.values())
+        keep.loc[combined.groupby("user_id", observed=True).tail(LAGS).index] = True
+        self.carry = combined[keep].reset_index(drop=True)
+        return add_fraud_target(features)
+
+    def save(self, directory, meta=None):
+        """
+        Пишет состояние в каталог directory, заменяя прежнее целиком;
+        meta - словарь JSON, который вернет load()
+        """
+        directory = Path(directory)
+        tmp = Path(tempfile.mkdtemp(prefix=f'.{directory.name}-', dir=directory.parent))
+        try:
+            self.per_user.frame.rename_axis('key').reset_index().to_parquet(tmp / 'per_user.parquet', index=False)
+            self.overall.frame.rename_axis('key').reset_index().to_parquet(tmp / 'overall.parquet', index=False)
+            carry = self.carry if self.carry is not None else pd.DataFrame(columns=SEQUENCE_COLUMNS)
+            carry.to_parquet(tmp / 'carry.parquet', index=False)
+            state = {
+                'last_time': self.last_time.isoformat() if self.last_time is not None else None,
+                'meta': meta or {}
+            }
+            (tmp / 'state.json').write_text(json.dumps(state, indent=2), encoding='utf-8')
+            os.chmod(tmp, 0o755)
+            old = directory.with_name(f'.{directory.name}.old')
+            if directory.exists():
+                os.replace(directory, old)
+            os.replace(tmp, directory)
+            shutil.rmtree(old, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory):
+        """(FeatureState, meta) из каталога save() или (None, None), если его нет"""
+        directory = Path(directory)
+        if not (directory / 'state.json').exists():
+            return None, None
+        state = json.loads((directory / 'state.json').read_text(encoding='utf-8'))
+        per_user, overall = (
+            RunningStats(pd.read_parquet(directory / name).set_index('key').rename_axis(None))
+            for name in ('per_user.parquet', 'overall.parquet')
+        )
+        carry = pd.read_parquet(directory / 'carry.parquet')
+        last_time = pd.Timestamp(state['last_time']) if state['last_time'] else None
+        return cls(per_user, overall, carry if not carry.empty else None, last_time), state['meta']
+
+def build_features_chunked(read_chunks, write_chunk, state=None):
+    """
+    Признаки для входа больше памяти. read_chunks() каждый раз заново отдает
+    порции DataFrame, упорядоченные по времени (вход читается дважды);
+    write_chunk(features) получает готовые порции в том же порядке строк.
+    В памяти - одна порция, статистики пользователей и строки, нужные
+    следующей порции: события последних 7 дней и три последние операции пользователя.
+    Значения совпадают с build_features(), но строки идут по времени,
+    а не по (user_id, timestamp). state - FeatureState прошлых запусков:
+    тогда вход - только новые строки, а их признаки такие же, как при пересчете
+    всей истории. Возвращает число строк.
+    """
+    state = state if state is not None else FeatureState()
+    # Проход 1: статистики по всей истории пользователя и по всем операциям
+    for chunk in read_chunks():
+        state.add_history(chunk)
+
+    # Проход 2: признаки порции вместе с перенесенными строками предыдущих
+    rows = 0
+    for chunk in read_chunks():
+        if chunk.empty:
+            continue
+        features = state.featurize(chunk)
+        write_chunk(features)
+        rows += len(features)
+    return rows
@@ -0,0 +1,320 @@
+"""
+ТИПИЗИРОВАННЫЕ НАБОРЫ ДАННЫХ
+dummy_transactions, dummy_users и prepared_transactions хранятся в Parquet:
+user_id/merchant/city - со словарным кодированием, timestamp - родным типом времени,
+числа ужаты до наименьшего типа без потери значений. Читатели берут только
+нужные колонки. Имена остаются прежними (prepared_transactions.csv): если рядом
+лежат оба формата, читается более свежий файл, поэтому старые CSV продолжают работать.
+Дозапись (инкрементальный prepare_dataset) не переписывает набор, а добавляет
+файл в каталог частей prepared_transactions/part-NNNNNN.parquet; части читаются
+как один набор с общими для всех частей типами.
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from src.config import DATASET_CONFIG
+
+FORMATS = {'parquet': '.parquet', 'csv': '.csv'}
+# Колонки с повторяющимися строками: в памяти - category, в файле - словарь
+CATEGORY_COLUMNS = ('user_id', 'merchant', 'city', 'bank', 'risk_level')
+TIME_COLUMNS = ('timestamp',)
+
+def dataset_path(path, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат набора данных: {fmt}")
+    return Path(path).with_suffix(FORMATS[fmt])
+
+def dataset_dir(path):
+    """Каталог частей набора: prepared_transactions.csv -> prepared_transactions/"""
+    return Path(path).with_suffix('')
+
+def _parts(directory):
+    return sorted(Path(directory).glob('part-*.parquet'))
+
+def _existing(path):
+    """Файлы и каталог частей набора в любом формате, самый свежий первым"""
+    files = [p for p in (dataset_path(path, fmt) for fmt in FORMATS) if p.exists()]
+    if _parts(dataset_dir(path)):
+        files.append(dataset_dir(path))
+    return sorted(files, key=lambda p: p.stat().st_mtime, reverse=True)
+
+def find_dataset(path):
+    """Файл или каталог частей набора, который прочитает read_dataset(), или None"""
+    files = _existing(path)
+    return files[0] if files else None
+
+def dataset_exists(path):
+    return find_dataset(path) is not None
+
+def _source(path):
+    source = find_dataset(path)
+    if source is None:
+        raise FileNotFoundError(f"Набор данных не найден: {Path(path).with_suffix('')}.(parquet|csv)")
+    return source
+
+def _parquet_files(source):
+    return _parts(source) if source.is_dir() else [source]
+
+def _unified_schema(schemas):
+    """
+    Общая схема частей набора: числа - в самом широком из типов частей,
+    строки - словарь с int32-индексами (словари частей разного размера)
+    """
+    names = schemas[0].names
+    if any(schema.names != names for schema in schemas):
+        raise ValueError("У частей набора разные колонки")
+    fields = []
+    for name in names:
+        types = [schema.field(name).type for schema in schemas]
+        if any(pa.types.is_dictionary(type_) for type_ in types):
+            type_ = pa.dictionary(pa.int32(), pa.string())
+        elif all(type_ == types[0] for type_ in types):
+            type_ = types[0]
+        elif all(pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t) for t in types):
+            type_ = pa.from_numpy_dtype(np.result_type(*[t.to_pandas_dtype() for t in types]))
+        else:
+            raise ValueError(f"Несовместимые типы колонки {name} в частях набора: {types}")
+        fields.append(pa.field(name, type_))
+    return pa.schema(fields)
+
+def _downcast(values):
+    """Наименьший числовой тип, в котором значения не меняются"""
+    if pd.api.types.is_bool_dtype(values):
+        return values
+    if pd.api.types.is_integer_dtype(values):
+        return pd.to_numeric(values, downcast='integer')
+    if pd.api.types.is_float_dtype(values):
+        if not values.isna().any() and np.array_equal(values, np.round(values)):
+            return pd.to_numeric(values, downcast='integer')
+        as_float32 = values.astype(np.float32)
+        if np.array_equal(as_float32.astype(np.float64), values, equal_nan=True):
+            return as_float32
+    return values
+
+def to_typed(frame):
+    """Копия frame с category для строковых ключей, временем и ужатыми числами"""
+    typed = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in CATEGORY_COLUMNS and values.dtype == object:
+            values = values.astype('category')
+        elif column in TIME_COLUMNS and values.dtype == object:
+            values = pd.to_datetime(values)
+        elif pd.api.types.is_numeric_dtype(values):
+            values = _downcast(values)
+        typed[column] = values
+    return pd.DataFrame(typed, index=frame.index)
+
+def _write_parquet(table_or_frame, target):
+    target = Path(target)
+    fd, tmp = tempfile.mkstemp(prefix=f'.{target.stem}-', suffix='.parquet', dir=target.parent)
+    os.close(fd)
+    try:
+        if isinstance(table_or_frame, pd.DataFrame):
+            table_or_frame = pa.Table.from_pandas(table_or_frame, preserve_index=False)
+        pq.write_table(table_or_frame, tmp, compression='zstd')
+        # На диске раньше, чем под именем target: после сбоя не будет пустого файла
+        with open(tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return target
+
+def write_dataset(frame, path, fmt=None):
+    """Сохраняет набор в формате fmt (по умолчанию DATASET_CONFIG['format']); возвращает путь файла"""
+    target = dataset_path(path, fmt or DATASET_CONFIG['format'])
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if target.suffix == '.csv':
+        frame.to_csv(target, index=False)
+        return target
+    _write_parquet(to_typed(frame), target)
+    _drop_parts_dir(target)
+    return target
+
+def _drop_parts_dir(target):
+    """Набор переписан одним файлом: каталог частей прежних дозаписей к нему больше не относится"""
+    if _parts(dataset_dir(target)):
+        shutil.rmtree(dataset_dir(target))
+
+def read_dataset(path, columns=None):
+    """
+    Набор данных из Parquet или CSV (более свежий файл). columns - только эти
+    колонки; запрошенные, но отсутствующие колонки пропускаются.
+    """
+    source = _source(path)
+    if source.is_dir():
+        files = _parquet_files(source)
+        dataset = ds.dataset(files, format='parquet', schema=_unified_schema([pq.read_schema(f) for f in files]))
+        if columns is not None:
+            columns = [column for column in columns if column in dataset.schema.names]
+        return dataset.to_table(columns=columns).to_pandas()
+    if source.suffix == '.parquet':
+        if columns is not None:
+            names = pq.read_schema(source).names
+            columns = [column for column in columns if column in names]
+        return pd.read_parquet(source, columns=columns)
+    frame = pd.read_csv(source, usecols=None if columns is None else lambda column: column in columns)
+    for column in TIME_COLUMNS:
+        if column in frame.columns:
+            frame[column] = pd.to_datetime(frame[column])
+    return frame if columns is None else frame[[column for column in columns if column in frame.columns]]
+
+def iter_dataset(path, chunk_size, columns=None, start=0):
+    """
+    Набор данных порциями не больше chunk_size строк (порция Parquet не переходит
+    границу row group), в порядке файла; start - сколько первых строк пропустить
+    """
+    source = _source(path)
+    if source.is_dir() or source.suffix == '.parquet':
+        files = [pq.ParquetFile(f) for f in _parquet_files(source)]
+        schema = _unified_schema([parquet.schema_arrow for parquet in files])
+        if columns is not None:
+            columns = [column for column in columns if column in schema.names]
+            schema = pa.schema([schema.field(column) for column in columns])
+        skip = start
+        for parquet in files:
+            # Целые части и row group до start не читаются
+            first = 0
+            while first < parquet.num_row_groups and skip >= parquet.metadata.row_group(first).num_rows:
+                skip -= parquet.metadata.row_group(first).num_rows
+                first += 1
+            if first == parquet.num_row_groups:
+                continue
+            for batch in parquet.iter_batches(batch_size=chunk_size, row_groups=range(first, parquet.num_row_groups),
+                                              columns=columns):
+                if skip:
+                    batch, skip = batch.slice(min(skip, len(batch))), max(skip - len(batch), 0)
+                    if not len(batch):
+                        continue
+                if not batch.schema.equals(schema):
+                    batch = pa.Table.from_batches([batch]).cast(schema)
+                yield batch.to_pandas()
+        return
+    usecols = None if columns is None else (lambda column: column in columns)
+    yield from pd.read_csv(source, chunksize=chunk_size, usecols=usecols, skiprows=range(1, start + 1))
+
+def dataset_rows(path):
+    """Число строк набора: для Parquet - из метаданных"""
+    source = _source(path)
+    if source.is_dir() or source.suffix == '.parquet':
+        return sum(pq.ParquetFile(f).metadata.num_rows for f in _parquet_files(source))
+    with open(source, 'rb') as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+class DatasetWriter:
+    """
+    Запись набора порциями (порционный prepare_dataset). В Parquet каждая порция
+    сначала ложится во временную часть со своими ужатыми типами; close() приводит
+    части к общим типам и собирает один файл, по row group в памяти за раз.
+    Файл появляется под именем path только целиком. append=True - новые строки
+    дописываются после существующих: в Parquet - новой частью в каталоге частей
+    (dataset_dir), прежние части не переписываются; в CSV - в конец файла.
+    """
+
+    def __init__(self, path, fmt=None, append=False):
+        self.target = dataset_path(path, fmt or DATASET_CONFIG['format'])
+        self.target.parent.mkdir(parents=True, exist_ok=True)
+        self._parts_dir = Path(tempfile.mkdtemp(prefix=f'.{self.target.stem}-', dir=self.target.parent))
+        self._base = None
+        if append and self.target.suffix == '.parquet':
+            # Набор одним файлом (прежние запуски) становится первой частью каталога
+            self.target = dataset_dir(path)
+            self._base = next((p for p in _existing(path) if p.suffix != '.csv'), None)
+        elif append and self.target.exists():
+            self._base = self.target
+        self._parts = []
+        self.rows = 0
+
+    def write(self, frame):
+        if self.target.suffix == '.csv':
+            part = self._parts_dir / 'data.csv'
+            if not self._parts and self._base is not None:
+                shutil.copyfile(self._base, part)
+            header = not self._parts and self._base is None
+            frame.to_csv(part, mode='w' if header else 'a', header=header, index=False)
+            self._parts = [part]
+        else:
+            part = self._parts_dir / f'part-{len(self._parts):06d}.parquet'
+            to_typed(frame).to_parquet(part, index=False)
+            self._parts.append(part)
+        self.rows += len(frame)
+
+    def close(self):
+        """Публикует набор; возвращает путь файла или каталога частей"""
+        try:
+            if not self._parts:
+                if self._base is None:
+                    raise ValueError("Нет строк для записи")
+                return self._base
+            if self.target.suffix == '.csv':
+                os.replace(self._parts[0], self.target)
+                return self.target
+            if self.target.suffix == '.parquet':
+                _merge_parts(self._parts, self.target)
+                _drop_parts_dir(self.target)
+                return self.target
+            if self._base == self.target:
+                existing = _parts(self.target)
+                _merge_parts(self._parts, self.target / f'part-{int(existing[-1].stem[5:]) + 1:06d}.parquet')
+                return self.target
+            return self._publish_dir()
+        finally:
+            self.abort()
+
+    def _publish_dir(self):
+        """Новый каталог частей: прежний файл набора (жесткой ссылкой) и новые строки"""
+        directory = Path(tempfile.mkdtemp(prefix=f'.{self.target.name}-', dir=self.target.parent))
+        try:
+            first = 0
+            if self._base is not None:
+                os.link(self._base, directory / 'part-000000.parquet')
+                first = 1
+            _merge_parts(self._parts, directory / f'part-{first:06d}.parquet')
+            os.chmod(directory, 0o755)
+            # Устаревший каталог (набор с тех пор переписан одним файлом) уступает место новому
+            if self.target.exists():
+                if not _parts(self.target) and any(self.target.iterdir()):
+                    raise FileExistsError(f"{self.target} - не каталог частей набора")
+                stale = self.target.with_name(f'{directory.name}-stale')
+                os.rename(self.target, stale)
+                shutil.rmtree(stale)
+            os.rename(directory, self.target)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        if self._base is not None:
+            os.unlink(self._base)
+        return self.target
+
+    def abort(self):
+        shutil.rmtree(self._parts_dir, ignore_errors=True)
+
+def _merge_parts(parts, target):
+    """Собирает временные части в один Parquet с общими типами; файл появляется под именем target целиком"""
+    schema = _unified_schema([pq.read_schema(part) for part in parts])
+    fd, tmp = tempfile.mkstemp(prefix=f'.{target.stem}-', suffix='.parquet', dir=target.parent)
+    os.close(fd)
+    try:
+        with pq.ParquetWriter(tmp, schema, compression='zstd') as writer:
+            for part in parts:
+                for batch in pq.ParquetFile(part).iter_batches():
+                    writer.write_table(pa.Table.from_batches([batch]).cast(schema))
+        with open(tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return target
@@ -0,0 +1,132 @@
+"""
+ВЫГРУЗКА ТРАНЗАКЦИЙ ДЛЯ ОБУЧЕНИЯ
+Строки transactions читаются порциями через серверный курсор и сразу
+сохраняются типизированным Parquet (src/datasets.py): user_id - со словарем,
+timestamp - родным типом времени. Порции прежнего формата .npz читаются как раньше.
+Водяной знак (timestamp, id) последней выгруженной строки хранится в watermark.json,
+поэтому ночное переобучение дочитывает из БД только новые транзакции.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from src.config import TRAINING_EXPORT_CONFIG
+from src.datasets import to_typed, write_dataset
+from src.partitions import ARCHIVE_COLUMNS, TABLE, read_archive, rows_to_table
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_FILE = 'watermark.json'
+CHUNK_SUFFIXES = ('.parquet', '.npz')
+
+# Строго после водяного знака; условие на timestamp отдельно - для отсечения секций
+EXPORT_QUERY = f"""
+SELECT {', '.join(column for column, _ in ARCHIVE_COLUMNS)}
+FROM {TABLE}
+WHERE (%(since_ts)s::timestamp IS NULL
+       OR (timestamp >= %(since_ts)s AND (timestamp, id) > (%(since_ts)s, %(since_id)s)))
+  AND timestamp < LOCALTIMESTAMP - make_interval(secs => %(settle_sec)s)
+ORDER BY timestamp, id
+"""
+
+def stream_transactions(pool, since=None, chunk_size=50000, settle_sec=0):
+    """
+    Транзакции новее водяного знака since = (timestamp, id) порциями по chunk_size строк.
+    Каждая порция - DataFrame с типами архива секций; в памяти одна порция.
+    """
+    since_ts, since_id = since if since else (None, None)
+    with pool.connection() as conn:
+        with conn.cursor(name='training_export') as cur:
+            cur.itersize = chunk_size
+            cur.execute(EXPORT_QUERY, {'since_ts': since_ts, 'since_id': since_id, 'settle_sec': settle_sec})
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows_to_table(rows).to_pandas()
+
+def _categories_as_object(frame):
+    categories = [column for column in frame.columns if isinstance(frame[column].dtype, pd.CategoricalDtype)]
+    return frame.astype({column: object for column in categories})
+
+class TrainingExport:
+    """
+    Каталог выгрузки: порции chunk-000001.parquet, chunk-000002.parquet, ... и watermark.json.
+    Порция записывается раньше водяного знака: после сбоя последняя порция
+    может выгрузиться повторно, load() отбрасывает такие дубликаты по id.
+    """
+
+    def __init__(self, pool, directory, chunk_size=50000, settle_sec=300):
+        self.pool = pool
+        self.directory = Path(directory)
+        self.chunk_size = chunk_size
+        self.settle_sec = settle_sec
+
+    def watermark(self):
+        """Водяной знак {'timestamp', 'id', 'chunks', 'rows'} или None до первой выгрузки"""
+        path = self.directory / WATERMARK_FILE
+        if not path.exists():
+            return None
+        state = json.loads(path.read_text(encoding='utf-8'))
+        state['timestamp'] = datetime.fromisoformat(state['timestamp'])
+        return state
+
+    def _save_watermark(self, state):
+        path = self.directory / WATERMARK_FILE
+        tmp = path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({**state, 'timestamp': state['timestamp'].isoformat()}, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def export(self):
+        """Выгружает транзакции новее водяного знака; возвращает пути новых порций"""
+        state = self.watermark() or {'timestamp': None, 'id': None, 'chunks': 0, 'rows': 0}
+        since = (state['timestamp'], state['id']) if state['timestamp'] else None
+        paths = []
+        for frame in stream_transactions(self.pool, since, self.chunk_size, self.settle_sec):
+            state['chunks'] += 1
+            paths.append(write_dataset(frame, self.directory / f"chunk-{state['chunks']:06d}", fmt='parquet'))
+            state['rows'] += len(frame)
+            state['timestamp'] = frame['timestamp'].iloc[-1].to_pydatetime()
+            state['id'] = int(frame['id'].iloc[-1])
+            self._save_watermark(state)
+        if paths:
+            logger.info(f"Exported {state['rows']} transactions total, {len(paths)} new chunks to {self.directory}")
+        return paths
+
+    def chunk_paths(self):
+        """Порции по номеру; номера сквозные и для старых .npz, и для новых .parquet"""
+        return sorted(path for path in self.directory.glob('chunk-*') if path.suffix in CHUNK_SUFFIXES)
+
+    def iter_chunks(self, columns=None, paths=None):
+        """Порции выгрузки (по умолчанию всех) по одной, в порядке времени"""
+        for path in self.chunk_paths() if paths is None else paths:
+            yield read_archive(path, columns)
+
+    def load(self, paths=None, columns=None):
+        """DataFrame из порций (по умолчанию всех) в порядке времени; columns - только нужные колонки"""
+        paths = self.chunk_paths() if paths is None else paths
+        names = list(columns) if columns else [column for column, _ in ARCHIVE_COLUMNS]
+        if not paths:
+            return pd.DataFrame(columns=names)
+        read = names if 'id' in names else names + ['id']
+        # Словари порций разные: строки склеиваются как object и снова становятся category
+        frame = pd.concat([_categories_as_object(read_archive(path, read)) for path in paths], ignore_index=True)
+        frame = frame.drop_duplicates('id', keep='last').reset_index(drop=True)
+        return to_typed(frame[names])
+
+def make_training_export(pool):
+    """TrainingExport с настройками из TRAINING_EXPORT_CONFIG"""
+    return TrainingExport(
+        pool,
+        TRAINING_EXPORT_CONFIG['dir'],
+        chunk_size=TRAINING_EXPORT_CONFIG['chunk_size'],
+        settle_sec=TRAINING_EXPORT_CONFIG['settle_sec']
+    )
@@ -0,0 +1,289 @@
+"""
+ПУЛ СОЕДИНЕНИЙ POSTGRESQL
+Общий для DatabaseManager и secure_api: соединения переиспользуются между запросами,
+поэтому TCP и аутентификация не повторяются на каждый /check
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.config import DATABASE_CONFIG, DB_POOL_CONFIG, DB_REPLICA_CONFIG
+
+logger = logging.getLogger(__name__)
+
+POOL_CONNECTIONS = Gauge(
+    'db_pool_connections', 'Open pooled DB connections', ['pool', 'state']
+)
+POOL_MAX_SIZE = Gauge('db_pool_max_size', 'Maximum size of the DB pool', ['pool'])
+POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled DB connection', ['pool'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+POOL_CHECKOUT_TIMEOUTS = Counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts that timed out waiting for a connection', ['pool']
+)
+POOL_DISCARDED = Counter(
+    'db_pool_connections_discarded_total', 'Pooled connections closed as broken or stale', ['pool']
+)
+
+class PoolError(Exception):
+    """Соединение не получено: пул исчерпан или БД недоступна"""
+
+class PoolTimeout(PoolError):
+    """Свободное соединение не появилось за checkout_timeout"""
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений psycopg2.
+    min_size соединений открываются в open() и не закрываются по простою,
+    больше max_size соединений пул не открывает: остальные ждут до checkout_timeout.
+    Соединение, простоявшее дольше validate_after секунд, проверяется SELECT 1.
+    После ошибки подключения пул connect_backoff секунд отвечает ошибкой сразу.
+    """
+
+    def __init__(self, dsn=None, name='default', min_size=1, max_size=10,
+                 checkout_timeout=5.0, validate_after=30.0, max_idle=300.0,
+                 connect_backoff=1.0, **connect_kwargs):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("Нужно 0 <= min_size <= max_size и max_size >= 1")
+        self.dsn = dsn
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.validate_after = validate_after
+        self.max_idle = max_idle
+        self.connect_backoff = connect_backoff
+        self.connect_kwargs = connect_kwargs
+
+        self._idle = deque()  # (connection, время возврата)
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._failed_until = 0.0
+        self._cond = threading.Condition()
+        POOL_MAX_SIZE.labels(pool=name).set(max_size)
+        self._update_metrics()
+
+    def _connect(self):
+        if self.dsn:
+            return psycopg2.connect(self.dsn, **self.connect_kwargs)
+        return psycopg2.connect(**self.connect_kwargs)
+
+    def dedicated_connection(self):
+        """Новое соединение вне пула с теми же параметрами (для LISTEN и долгих сессий)"""
+        return self._connect()
+
+    def _update_metrics(self):
+        POOL_CONNECTIONS.labels(pool=self.name, state='idle').set(len(self._idle))
+        POOL_CONNECTIONS.labels(pool=self.name, state='in_use').set(self._in_use)
+
+    def open(self):
+        """Открывает min_size соединений заранее; недоступная БД не мешает старту"""
+        created = []
+        try:
+            for _ in range(self.min_size - self._size):
+                created.append(self._connect())
+        except psycopg2.Error as e:
+            logger.warning(f"DB pool {self.name}: не удалось открыть соединения: {e}")
+        with self._cond:
+            for conn in created:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+            self._update_metrics()
+            self._cond.notify_all()
+        return len(created)
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _discard(self, conn):
+        """Закрывает соединение и освобождает его место в пуле"""
+        self._close_quietly(conn)
+        POOL_DISCARDED.labels(pool=self.name).inc()
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_alive(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError(f"DB pool {self.name} закрыт")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        self._in_use += 1
+                        reserved = False
+                        break
+                    if self._size < self.max_size:
+                        if time.monotonic() < self._failed_until:
+                            raise PoolError(f"DB pool {self.name}: БД недоступна")
+                        self._size += 1
+                        self._in_use += 1
+                        conn, reserved = None, True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        POOL_CHECKOUT_TIMEOUTS.labels(pool=self.name).inc()
+                        raise PoolTimeout(
+                            f"DB pool {self.name}: нет свободного соединения за {self.checkout_timeout} с"
+                        )
+                    self._cond.wait(remaining)
+                self._update_metrics()
+
+            # Подключение и проверка идут без блокировки пула
+            if reserved:
+                try:
+                    conn = self._connect()
+                except psycopg2.Error as e:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._failed_until = time.monotonic() + self.connect_backoff
+                        self._update_metrics()
+                        self._cond.notify()
+                    raise PoolError(f"DB pool {self.name}: ошибка подключения: {e}") from e
+            elif not self._is_alive(conn, time.monotonic() - returned_at):
+                with self._cond:
+                    self._in_use -= 1
+                self._discard(conn)
+                continue
+
+            POOL_CHECKOUT_WAIT.labels(pool=self.name).observe(time.monotonic() - started)
+            return conn
+
+    def _checkin(self, conn, broken=False):
+        with self._cond:
+            self._in_use -= 1
+            self._update_metrics()
+        if broken or conn.closed or self._closed:
+            self._discard(conn)
+            return
+        try:
+            if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._trim_idle()
+            self._update_metrics()
+            self._cond.notify()
+
+    def _trim_idle(self):
+        """Закрывает самые старые простаивающие соединения сверх min_size"""
+        now = time.monotonic()
+        while self._size > self.min_size and self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._close_quietly(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Выдает соединение из пула и возвращает его после блока.
+        Незавершенная транзакция откатывается; соединение после
+        OperationalError/InterfaceError закрывается, а не возвращается в пул.
+        """
+        conn = self._checkout()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self._checkin(conn, broken)
+
+    def stats(self):
+        """Текущая загрузка пула"""
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size
+            }
+
+    def close(self):
+        """Закрывает простаивающие соединения; выданные закроются при возврате"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._update_metrics()
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_pool():
+    """Общий пул процесса: DATABASE_URL, если задан, иначе DATABASE_CONFIG"""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            database_url = os.getenv('DATABASE_URL')
+            connect_kwargs = {} if database_url else {
+                'dbname': DATABASE_CONFIG['database'],
+                'user': DATABASE_CONFIG['user'],
+                'password': DATABASE_CONFIG['password'],
+                'host': DATABASE_CONFIG['host'],
+                'port': DATABASE_CONFIG['port']
+            }
+            _shared_pool = ConnectionPool(database_url, name='main', **DB_POOL_CONFIG, **connect_kwargs)
+        return _shared_pool
+
+_replica_pool = None
+
+def get_replica_pool():
+    """
+    Общий пул реплики: DB_REPLICA_CONFIG['url'], иначе DATABASE_CONFIG с хостом реплики.
+    None, если реплика не настроена - тогда все запросы идут на основную БД.
+    """
+    global _replica_pool
+    with _shared_pool_lock:
+        if _replica_pool is None:
+            replica_url = DB_REPLICA_CONFIG['url']
+            if not replica_url and not DB_REPLICA_CONFIG['host']:
+                return None
+            connect_kwargs = {} if replica_url else {
+                'dbname': DATABASE_CONFIG['database'],
+                'user': DATABASE_CONFIG['user'],
+                'password': DATABASE_CONFIG['password'],
+                'host': DB_REPLICA_CONFIG['host'],
+                'port': DB_REPLICA_CONFIG['port']
+            }
+            _replica_pool = ConnectionPool(replica_url or None, name='replica', **DB_POOL_CONFIG, **connect_kwargs)
+        return _replica_pool
@@ -0,0 +1,167 @@
+"""
+МАРШРУТИЗАЦИЯ ЗАПРОСОВ: ОСНОВНАЯ БД И РЕПЛИКА
+Записи и чтения, которым нужны только что записанные строки (проверка /check),
+идут на основную БД; дашборды, статистика и выгрузки для обучения - на реплику,
+чтобы тяжелые запросы не тормозили запись. Отстающая или недоступная реплика
+подменяется основной БД. Время каждого маршрута пишется в метрики Prometheus.
+"""
+
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+import psycopg2
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.config import DB_REPLICA_CONFIG
+from src.db_pool import PoolError, get_pool, get_replica_pool
+
+logger = logging.getLogger(__name__)
+
+ROUTE_DURATION = Histogram(
+    'db_route_duration_seconds', 'DB work per route, including pool checkout', ['route', 'target'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+REPLICA_FALLBACKS = Counter(
+    'db_replica_fallbacks_total', 'Replica reads served by the primary', ['route', 'reason']
+)
+REPLICA_LAG = Gauge('db_replica_lag_seconds', 'Last measured replication lag of the read replica')
+
+# Реплика, проигравшая весь полученный WAL, не отстает, даже если основная БД
+# давно ничего не писала и pg_last_xact_replay_timestamp() старый
+REPLICA_LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END::float8
+"""
+
+class Route:
+    """Маршрут с интерфейсом пула (connection()) - для кода, который ждет пул"""
+
+    def __init__(self, router, name, replica):
+        self.router = router
+        self.name = name
+        self.replica = replica
+
+    def connection(self):
+        return self.router.connection(self.name, self.replica)
+
+class DatabaseRouter:
+    """
+    Выбирает пул для запроса. connection(route, replica=True) читает реплику,
+    если она настроена, доступна и отстает не больше max_lag_sec; иначе основную БД.
+    Отставание проверяется не чаще раза в lag_check_interval секунд.
+    """
+
+    def __init__(self, primary, replica=None, max_lag_sec=5.0, lag_check_interval=1.0):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag_sec = max_lag_sec
+        self.lag_check_interval = lag_check_interval
+        self._lag = None  # None - реплика недоступна
+        self._lag_checked_at = None
+        self._lag_lock = threading.Lock()
+
+    def replica_lag(self):
+        """Отставание реплики в секундах (из кэша) или None, если реплика недоступна"""
+        now = time.monotonic()
+        if self._lag_checked_at is not None and now - self._lag_checked_at < self.lag_check_interval:
+            return self._lag
+        # Проверяет один поток, остальные пока берут прошлое значение
+        if not self._lag_lock.acquire(blocking=self._lag_checked_at is None):
+            return self._lag
+        try:
+            try:
+                with self.replica.connection() as conn:
+                    with conn.cursor() as cur:
+                        cur.execute(REPLICA_LAG_QUERY)
+                        self._lag = cur.fetchone()[0]
+                REPLICA_LAG.set(self._lag)
+            except (PoolError, psycopg2.Error) as e:
+                logger.warning(f"Replica lag check failed: {e}")
+                self._lag = None
+            self._lag_checked_at = time.monotonic()
+            return self._lag
+        finally:
+            self._lag_lock.release()
+
+    def _replica_unusable(self):
+        """Причина читать основную БД вместо реплики или None"""
+        lag = self.replica_lag()
+        if lag is None:
+            return 'unavailable'
+        if lag > self.max_lag_sec:
+            return 'lag'
+        return None
+
+    @contextmanager
+    def connection(self, route, replica=False):
+        """Соединение для маршрута route; после блока возвращается в свой пул"""
+        started = time.monotonic()
+        target = 'primary'
+        with ExitStack() as stack:
+            conn = None
+            if replica and self.replica is not None:
+                reason = self._replica_unusable()
+                if reason is None:
+                    try:
+                        conn = stack.enter_context(self.replica.connection())
+                        target = 'replica'
+                    except PoolError:
+                        reason = 'unavailable'
+                if reason is not None:
+                    REPLICA_FALLBACKS.labels(route=route, reason=reason).inc()
+            if conn is None:
+                conn = stack.enter_context(self.primary.connection())
+            try:
+                yield conn
+            finally:
+                ROUTE_DURATION.labels(route=route, target=target).observe(time.monotonic() - started)
+
+    def route(self, name, replica=False):
+        """Маршрут как объект с connection(), например для TrainingExport"""
+        return Route(self, name, replica)
+
+    def stats(self):
+        """Состояние маршрутизации для /health"""
+        if self.replica is None:
+            return {'replica': 'not configured'}
+        return {
+            'replica': 'available' if self._lag is not None else 'unavailable',
+            'replica_lag_sec': self._lag,
+            'max_lag_sec': self.max_lag_sec,
+            'replica_pool': self.replica.stats()
+        }
+
+    def open(self):
+        self.primary.open()
+        if self.replica is not None:
+            self.replica.open()
+
+    def close(self):
+        self.primary.close()
+        if self.replica is not None:
+            self.replica.close()
+
+def make_router(primary, replica=None):
+    """DatabaseRouter с настройками из DB_REPLICA_CONFIG"""
+    return DatabaseRouter(
+        primary,
+        replica,
+        max_lag_sec=DB_REPLICA_CONFIG['max_lag_sec'],
+        lag_check_interval=DB_REPLICA_CONFIG['lag_check_interval']
+    )
+
+_shared_router = None
+_shared_router_lock = threading.Lock()
+
+def get_router():
+    """Общий маршрутизатор процесса поверх общих пулов get_pool() и get_replica_pool()"""
+    global _shared_router
+    with _shared_router_lock:
+        if _shared_router is None:
+            _shared_router = make_router(get_pool(), get_replica_pool())
+        return _shared_router
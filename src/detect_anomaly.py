@@ -7,14 +7,21 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.ensemble import IsolationForest
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import read_dataset
 
 print(" ЗАПУСК ИСКУССТВЕННОГО ИНТЕЛЛЕКТА ДЛЯ ПОИСКА АНОМАЛИЙ...")
 
 try:
-    df = pd.read_csv("dummy_transactions.csv")
+    df = read_dataset("dummy_transactions.csv")
     print(f" Загружено {len(df):,} транзакций для анализа")
 except:
-    print(" Файл dummy_transactions.csv не найден!")
+    print(" Набор dummy_transactions (.parquet или .csv) не найден!")
     print(" Сначала запустите: python dummy_data_gen.py")
     exit()
 
@@ -6,6 +6,12 @@
 import pandas as pd
 import random
 import datetime
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.datasets import write_dataset
 
 print(" СОЗДАЕМ ТЕСТОВЫЕ ДАННЫЕ ДЛЯ БАНКА...")
 
@@ -64,7 +70,8 @@ for user in users:
         transactions.append(generate_transaction(user['user_id']))
 
 users_df = pd.DataFrame(users)
-transactions_df = pd.DataFrame(transactions)
+# В порядке времени, как в БД: так файл подходит и для порционного prepare_dataset.py --chunk-size
+transactions_df = pd.DataFrame(transactions).sort_values("timestamp", kind="stable").reset_index(drop=True)
 
 print(f"\n ДАННЫЕ СОЗДАНЫ:")
 print(f"   • Клиентов: {len(users_df):,} чел.")
@@ -72,8 +79,9 @@ print(f"   • Транзакций: {len(transactions_df):,} шт.")
 print(f"   • Общая сумма: {transactions_df['amount'].sum():,.0f} UZS")
 
 print(f"\n СОХРАНЯЕМ ФАЙЛЫ...")
-users_df.to_csv("dummy_users.csv", index=False)
-transactions_df.to_csv("dummy_transactions.csv", index=False)
+# Parquet или CSV - по DATASET_FORMAT (src/datasets.py)
+print(f"   • {write_dataset(users_df, 'dummy_users.csv')}")
+print(f"   • {write_dataset(transactions_df, 'dummy_transactions.csv')}")
 
 print("\n СТАТИСТИКА ТРАНЗАКЦИЙ:")
 print(f"   • Средний чек: {transactions_df['amount'].mean():,.0f} UZS")
@@ -0,0 +1,270 @@
+"""
+ОНЛАЙН-ХРАНИЛИЩЕ ПОВЕДЕНЧЕСКИХ ПРИЗНАКОВ
+Считает при обслуживании те же признаки, что prepare_dataset.py считает офлайн:
+total_1h, count_1h, time_diff_sec, prev_amount_1..3, amount_ratio.
+Для каждого пользователя хранится кольцевой буфер последних history событий
+в общих массивах NumPy, обновление O(1) на событие.
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from src.config import FEATURE_STORE_CONFIG
+
+FEATURE_NAMES = (
+    'total_1h', 'count_1h', 'time_diff_sec',
+    'prev_amount_1', 'prev_amount_2', 'prev_amount_3', 'amount_ratio'
+)
+
+def to_epoch_seconds(timestamp):
+    """Секунды Unix для ISO строки, datetime или pd.Timestamp; наивное время считается UTC"""
+    if timestamp is None:
+        return time.time()
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    if isinstance(timestamp, str):
+        try:
+            timestamp = datetime.fromisoformat(timestamp)
+        except ValueError:
+            import pandas as pd
+            timestamp = pd.Timestamp(timestamp).to_pydatetime()
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+class OnlineFeatureStore:
+    """
+    Признаки скользящего окна window_sec по пользователям.
+    Окно, как rolling("1h") в prepare_dataset.py, включает текущую транзакцию
+    и события в (t - window_sec, t]. Хранятся только history последних событий
+    пользователя, поэтому count_1h не больше history, а память на пользователя ограничена.
+    Пользователи без событий дольше idle_ttl_sec вытесняются; при заполнении
+    max_users вытесняется пользователь, который дольше всех не проявлялся.
+    """
+
+    def __init__(self, window_sec=3600.0, history=32, max_users=1_000_000,
+                 idle_ttl_sec=24 * 3600.0, initial_users=1024):
+        if history < 4:
+            raise ValueError("history должна быть не меньше 4 (три prev_amount + текущая)")
+        self.window_sec = window_sec
+        self.history = history
+        self.max_users = max_users
+        self.idle_ttl_sec = idle_ttl_sec
+
+        self._slots = {}
+        self._free = []
+        # Самое позднее время события: вытеснение считается во времени событий, а не по часам сервера
+        self._clock = 0.0
+        self._lock = threading.Lock()
+        self._allocate(min(initial_users, max_users))
+
+    def _allocate(self, capacity):
+        """Создает или увеличивает массивы до capacity пользователей"""
+        old = getattr(self, '_capacity', 0)
+        arrays = {
+            '_times': (np.float64, (capacity, self.history)),
+            '_amounts': (np.float64, (capacity, self.history)),
+            '_start': (np.int32, (capacity,)),
+            '_size': (np.int32, (capacity,)),
+            '_window_size': (np.int32, (capacity,)),
+            '_window_sum': (np.float64, (capacity,)),
+            '_last_seen': (np.float64, (capacity,)),
+            '_users': (object, (capacity,)),
+        }
+        for name, (dtype, shape) in arrays.items():
+            grown = np.zeros(shape, dtype=dtype)
+            if old:
+                grown[:old] = getattr(self, name)
+            setattr(self, name, grown)
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self._capacity = capacity
+
+    def __len__(self):
+        return len(self._slots)
+
+    def memory_bytes(self):
+        """Размер массивов хранилища"""
+        return sum(
+            getattr(self, name).nbytes
+            for name in ('_times', '_amounts', '_start', '_size', '_window_size',
+                         '_window_sum', '_last_seen', '_users')
+        )
+
+    def _slot(self, user_id, now):
+        slot = self._slots.get(user_id)
+        if slot is not None:
+            return slot
+        if not self._free:
+            if self._capacity < self.max_users:
+                self._allocate(min(self._capacity * 2, self.max_users))
+            elif not self._evict_idle(now):
+                self._release(int(np.argmin(self._last_seen)))
+        slot = self._free.pop()
+        user_id = sys.intern(user_id) if isinstance(user_id, str) else user_id
+        self._slots[user_id] = slot
+        self._users[slot] = user_id
+        return slot
+
+    def _release(self, slot):
+        del self._slots[self._users[slot]]
+        self._users[slot] = None
+        self._start[slot] = self._size[slot] = self._window_size[slot] = 0
+        self._window_sum[slot] = 0.0
+        # Свободный слот не должен выглядеть самым старым для argmin
+        self._last_seen[slot] = np.inf
+        self._free.append(slot)
+
+    def _evict_idle(self, now):
+        occupied = np.fromiter(self._slots.values(), dtype=np.int64, count=len(self._slots))
+        idle = occupied[self._last_seen[occupied] < now - self.idle_ttl_sec]
+        for slot in idle:
+            self._release(int(slot))
+        return len(idle)
+
+    def evict_idle(self, now=None):
+        """
+        Удаляет пользователей без событий дольше idle_ttl_sec; возвращает их число.
+        По умолчанию now - время самого позднего записанного события.
+        """
+        with self._lock:
+            return self._evict_idle(self._clock if now is None else now)
+
+    def _features(self, slot, amount, event_time, window_size, window_sum):
+        """Признаки для события по текущему содержимому буфера (до его записи)"""
+        size = int(self._size[slot])
+        last = (int(self._start[slot]) + size - 1) % self.history
+        prev = [
+            float(self._amounts[slot, (last - lag) % self.history]) if lag < size else 0.0
+            for lag in range(3)
+        ]
+        # Как в prepare_dataset.py: без предыдущей суммы или при делении на 0 отношение = 1
+        amount_ratio = amount / prev[0] if size and prev[0] != 0 else 1.0
+        return {
+            'total_1h': window_sum + amount,
+            'count_1h': window_size + 1,
+            'time_diff_sec': event_time - float(self._times[slot, last]) if size else 0.0,
+            'prev_amount_1': prev[0],
+            'prev_amount_2': prev[1],
+            'prev_amount_3': prev[2],
+            'amount_ratio': amount_ratio
+        }
+
+    def _advance_window(self, slot, event_time):
+        """Убирает из окна события не позже event_time - window_sec"""
+        size = int(self._size[slot])
+        window_size = int(self._window_size[slot])
+        window_sum = float(self._window_sum[slot])
+        cutoff = event_time - self.window_sec
+        while window_size:
+            oldest = (int(self._start[slot]) + size - window_size) % self.history
+            if self._times[slot, oldest] > cutoff:
+                break
+            window_sum -= self._amounts[slot, oldest]
+            window_size -= 1
+        if window_size == self.history:
+            # В буфере нет места для текущей транзакции: самое старое событие выходит из окна
+            window_sum -= self._amounts[slot, self._start[slot]]
+            window_size -= 1
+        if window_size == 0:
+            window_sum = 0.0  # без накопленной ошибки округления
+        return window_size, window_sum
+
+    def update(self, user_id, amount, timestamp=None):
+        """
+        Записывает транзакцию и возвращает ее признаки (окно включает ее саму).
+        События пользователя должны приходить в порядке времени; более раннее
+        событие, чем последнее записанное, учитывается как одновременное с ним.
+        """
+        amount = float(amount)
+        event_time = to_epoch_seconds(timestamp)
+        with self._lock:
+            slot = self._slot(user_id, max(self._clock, event_time))
+            size = int(self._size[slot])
+            if size:
+                last = (int(self._start[slot]) + size - 1) % self.history
+                event_time = max(event_time, float(self._times[slot, last]))
+
+            window_size, window_sum = self._advance_window(slot, event_time)
+            features = self._features(slot, amount, event_time, window_size, window_sum)
+
+            if size == self.history:
+                # Буфер полон: самое старое событие (уже вне окна) перезаписывается
+                self._start[slot] = (self._start[slot] + 1) % self.history
+                size -= 1
+            position = (int(self._start[slot]) + size) % self.history
+            self._times[slot, position] = event_time
+            self._amounts[slot, position] = amount
+            self._size[slot] = size + 1
+            self._window_size[slot] = window_size + 1
+            self._window_sum[slot] = window_sum + amount
+            self._last_seen[slot] = event_time
+            self._clock = max(self._clock, event_time)
+            return features
+
+    STATE_ARRAYS = ('_times', '_amounts', '_start', '_size', '_window_size', '_window_sum', '_last_seen')
+
+    def export_state(self):
+        """
+        Копия занятых слотов (для снимка): массивы в порядке users и время последнего события.
+        Под блокировкой выполняется только копирование массивов.
+        """
+        with self._lock:
+            users = list(self._slots)
+            occupied = np.fromiter(self._slots.values(), dtype=np.int64, count=len(users))
+            state = {name.lstrip('_'): getattr(self, name)[occupied] for name in self.STATE_ARRAYS}
+            clock = self._clock
+        return users, state, clock
+
+    @classmethod
+    def from_state(cls, users, state, clock, **params):
+        """Хранилище из export_state(); params - как у конструктора"""
+        store = cls(**params)
+        n = len(users)
+        if n > store.max_users:
+            raise ValueError(f"В снимке {n} пользователей, max_users={store.max_users}")
+        if state['times'].shape[1:] != (store.history,):
+            raise ValueError("history снимка не совпадает с настройками хранилища")
+        store._free = []
+        store._capacity = 0
+        store._allocate(max(n, min(params.get('initial_users', 1024), store.max_users)))
+        for name in cls.STATE_ARRAYS:
+            getattr(store, name)[:n] = state[name.lstrip('_')]
+        store._users[:n] = users
+        store._slots = dict(zip(users, range(n)))
+        store._free = list(range(store._capacity - 1, n - 1, -1))
+        store._clock = float(clock)
+        return store
+
+    def peek(self, user_id, amount, timestamp=None):
+        """Признаки транзакции без ее записи"""
+        amount = float(amount)
+        event_time = to_epoch_seconds(timestamp)
+        with self._lock:
+            slot = self._slots.get(user_id)
+            if slot is None:
+                return {
+                    'total_1h': amount, 'count_1h': 1, 'time_diff_sec': 0.0,
+                    'prev_amount_1': 0.0, 'prev_amount_2': 0.0, 'prev_amount_3': 0.0,
+                    'amount_ratio': 1.0
+                }
+            window_size, window_sum = self._advance_window(slot, event_time)
+            return self._features(slot, amount, event_time, window_size, window_sum)
+
+def feature_store_params():
+    """Параметры конструктора из FEATURE_STORE_CONFIG"""
+    return {
+        'window_sec': FEATURE_STORE_CONFIG['window_sec'],
+        'history': FEATURE_STORE_CONFIG['history'],
+        'max_users': FEATURE_STORE_CONFIG['max_users'],
+        'idle_ttl_sec': FEATURE_STORE_CONFIG['idle_ttl_sec']
+    }
+
+def make_feature_store():
+    """Хранилище с настройками из FEATURE_STORE_CONFIG или None, если оно выключено"""
+    if not FEATURE_STORE_CONFIG['enabled']:
+        return None
+    return OnlineFeatureStore(**feature_store_params())
@@ -3,21 +3,37 @@
 Обновленная версия с исправлением путей
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
 import pandas as pd
 import joblib
 import numpy as np
 from datetime import datetime
 import uvicorn
 from pathlib import Path
+from typing import NamedTuple, Optional
+import asyncio
+import json
+import math
+import os
 import sys
+from prometheus_client import generate_latest, REGISTRY, CONTENT_TYPE_LATEST
 
 print(" ЗАПУСК REST API СЕРВЕРА...")
 
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
+from src.config import SERVING_CONFIG, SNAPSHOT_CONFIG
+from src.request_coalescer import RequestCoalescer
+from src.inference_executor import InferenceExecutor
+from src.model_artifact import MappedFraudAI, ensure_mapped_model
+from src.feature_store import feature_store_params, make_feature_store
+from src.serving_snapshot import fetch_transactions_since, load_snapshot, replay_transactions, save_snapshot
+from src.db_pool import get_pool
+from src.async_database import AsyncDatabaseManager
+
 app = FastAPI(
     title="Bank Fraud Detection API",
     description="API для обнаружения мошеннических транзакций в реальном времени",
@@ -26,8 +42,16 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-ai_system = None
-model_loaded = False
+class ModelState(NamedTuple):
+    """Неизменяемый снимок активной модели: меняется целиком одной ссылкой"""
+    system: object
+    version: str
+    source: str
+    loaded_at: str
+
+# Запрос берет ссылку один раз и дорабатывает на своей версии модели
+active_model = None
+reload_task = None
 
 class TransactionRequest(BaseModel):
     user_id: str
@@ -44,12 +68,14 @@ class FraudResponse(BaseModel):
     reasons: list
     timestamp: str
     model_used: str
+    model_version: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     total_checks: int = 0
     models_available: list = []
+    model_version: Optional[str] = None
 
 class BatchResponse(BaseModel):
     checked_count: int
@@ -58,32 +84,167 @@ class BatchResponse(BaseModel):
 
 total_checks = 0
 
+# Инференс выполняется вне event loop, чтобы /health не ждал модели
+inference = InferenceExecutor(
+    SERVING_CONFIG["executor"],
+    max_workers=SERVING_CONFIG["executor_workers"],
+    max_in_flight=SERVING_CONFIG["executor_max_in_flight"]
+)
+
+MODEL_PATHS = [
+    PROJECT_ROOT / "advanced_ai_system.pkl",
+    PROJECT_ROOT / "ai_fraud_model.pkl"
+]
+
+# Пробная транзакция для проверки модели перед активацией
+WARMUP_TRANSACTION = {
+    'user_id': 'warmup',
+    'amount': 100000.0,
+    'timestamp': '2024-01-01T12:00:00',
+    'merchant': 'unknown',
+    'city': 'unknown'
+}
+
+def model_version(model_path):
+    """Версия артефакта: имя файла и время его изменения"""
+    modified = datetime.fromtimestamp(model_path.stat().st_mtime)
+    return f"{model_path.stem}-{modified:%Y%m%d%H%M%S}"
+
+def make_model_state(system, version, source):
+    """Проверяет систему пробным предсказанием и оборачивает в ModelState"""
+    system.predict_one(WARMUP_TRANSACTION)
+    system.predict_records([WARMUP_TRANSACTION])
+    return ModelState(system, version, source, datetime.now().isoformat())
+
+def load_model_state():
+    """
+    Загружает и проверяет модель с диска, не трогая активную.
+    Возвращает ModelState или None, если ни один артефакт не прошел проверку.
+    """
+    for model_path in MODEL_PATHS:
+        if not model_path.exists():
+            continue
+        version = model_version(model_path)
+        
+        if SERVING_CONFIG["model_mmap"]:
+            try:
+                system = MappedFraudAI(ensure_mapped_model(model_path))
+                state = make_model_state(system, version, f"{model_path.name} (mmap)")
+                print(f" AI система загружена (mmap): {model_path.name}, версия {version}")
+                return state
+            except Exception as e:
+                print(f" mmap-артефакт недоступен для {model_path.name}: {e}")
+        try:
+            state = make_model_state(joblib.load(model_path), version, model_path.name)
+            print(f" AI система загружена: {model_path.name}, версия {version}")
+            return state
+        except Exception as e:
+            print(f" Ошибка загрузки {model_path}: {e}")
+    
+    return None
+
 def load_ai_system():
-    """Загружает AI систему"""
-    global ai_system, model_loaded
+    """Загружает AI систему (синхронно, при запуске)"""
+    global active_model
     
-    model_paths = [
-        PROJECT_ROOT / "advanced_ai_system.pkl",
-        PROJECT_ROOT / "ai_fraud_model.pkl"
-    ]
+    state = load_model_state()
+    if state is None:
+        print("  AI системы не найдены, используем базовые правила")
+        return False
     
-    for model_path in model_paths:
-        if model_path.exists():
-            try:
-                ai_system = joblib.load(model_path)
-                model_loaded = True
-                print(f" AI система загружена: {model_path.name}")
-                return True
-            except Exception as e:
-                print(f" Ошибка загрузки {model_path}: {e}")
+    active_model = state
+    return True
+
+async def reload_in_background():
+    """Загружает новую модель в пуле потоков и атомарно подменяет активную"""
+    global active_model
+    
+    loop = asyncio.get_running_loop()
+    state = await loop.run_in_executor(None, load_model_state)
+    if state is None:
+        print(" Новая модель не прошла проверку, остается текущая")
+        return False
     
-    print("  AI системы не найдены, используем базовые правила")
-    return False
+    previous, active_model = active_model, state
+    if previous is not None and previous.system is not state.system:
+        inference.retire(previous.system)
+    return True
+
+def restore_serving_state():
+    """
+    Восстанавливает хранилище признаков и total_checks из последнего снимка.
+    Возвращает index снимка или None, если восстанавливать нечего.
+    """
+    global feature_store, total_checks
+    if feature_store is None or not SNAPSHOT_CONFIG["dir"]:
+        return None
+    try:
+        loaded = load_snapshot(SNAPSHOT_CONFIG["dir"], **feature_store_params())
+    except (OSError, ValueError, KeyError) as e:
+        print(f" Снимок состояния не загружен, стартуем с пустым состоянием: {e}")
+        return None
+    if loaded is None:
+        return None
+    feature_store, index = loaded
+    total_checks = index["counters"].get("total_checks", total_checks)
+    print(f" Состояние восстановлено из снимка: {index['users']} пользователей, проверок {total_checks}")
+    return index
+
+def replay_after_snapshot(index):
+    """Дочитывает из БД транзакции, записанные после снимка"""
+    try:
+        rows = fetch_transactions_since(get_pool(), index["watermark"]["wall_time"])
+        replayed = replay_transactions(feature_store, rows)
+        print(f" Дочитано транзакций после снимка: {replayed}")
+    except Exception as e:
+        print(f" Транзакции после снимка не дочитаны: {e}")
+
+def save_serving_snapshot():
+    """Сохраняет снимок хранилища признаков и счетчиков"""
+    if feature_store is None or not SNAPSHOT_CONFIG["dir"]:
+        return None
+    try:
+        return save_snapshot(
+            SNAPSHOT_CONFIG["dir"], feature_store, {"total_checks": total_checks}, SNAPSHOT_CONFIG["keep"]
+        )
+    except (OSError, ValueError) as e:
+        print(f" Ошибка сохранения снимка состояния: {e}")
+        return None
+
+async def snapshot_loop():
+    """Сохраняет снимок каждые interval_sec секунд вне event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(SNAPSHOT_CONFIG["interval_sec"])
+        await loop.run_in_executor(None, save_serving_snapshot)
+
+snapshot_task = None
 
 @app.on_event("startup")
 async def startup_event():
-    """Загружает модель при запуске"""
+    """Загружает модель и восстанавливает состояние обслуживания"""
+    global snapshot_task
     load_ai_system()
+    if user_db is not None:
+        await user_db.open()
+    index = restore_serving_state()
+    if index is not None and SNAPSHOT_CONFIG["replay_from_db"]:
+        # Запросы начинают обслуживаться после догонки: признаки не пропускают транзакции
+        await asyncio.get_running_loop().run_in_executor(None, replay_after_snapshot, index)
+    if feature_store is not None and SNAPSHOT_CONFIG["dir"]:
+        snapshot_task = asyncio.create_task(snapshot_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Дорабатывает очередь микробатчинга, останавливает пул инференса и сохраняет снимок"""
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+    if coalescer is not None:
+        await coalescer.close()
+    inference.shutdown()
+    if user_db is not None:
+        await user_db.close()
+    await asyncio.get_running_loop().run_in_executor(None, save_serving_snapshot)
 
 @app.get("/")
 async def root():
@@ -91,27 +252,118 @@ async def root():
     return {
         "message": "Bank Fraud Detection API v2.0",
         "version": "2.0.0",
-        "model_loaded": model_loaded,
+        "model_loaded": active_model is not None,
         "endpoints": {
             "health": "/health",
             "check_transaction": "/check",
             "batch_check": "/batch-check",
-            "reload_model": "/reload-model"
+            "batch_check_stream": "/batch-check/stream",
+            "reload_model": "/reload-model",
+            "metrics": "/metrics"
         }
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Метрики Prometheus"""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Проверка здоровья API"""
+    model = active_model
     models = []
-    if model_loaded:
-        models = list(ai_system.models.keys()) if hasattr(ai_system, 'models') else ['advanced_ai']
+    if model is not None:
+        models = list(model.system.models.keys()) if hasattr(model.system, 'models') else ['advanced_ai']
     
     return HealthResponse(
-        status="healthy" if model_loaded else "degraded",
-        model_loaded=model_loaded,
+        status="healthy" if model is not None else "degraded",
+        model_loaded=model is not None,
         total_checks=total_checks,
-        models_available=models
+        models_available=models,
+        model_version=model.version if model is not None else None
+    )
+
+# Скользящие признаки пользователя (total_1h, count_1h, ...) по уже проверенным транзакциям
+feature_store = make_feature_store()
+
+def transaction_record(transaction):
+    """Приводит запрос к словарю признаков транзакции и записывает ее в хранилище признаков"""
+    record = {
+        'user_id': transaction.user_id,
+        'amount': transaction.amount,
+        'timestamp': transaction.timestamp or datetime.now().isoformat(),
+        'merchant': transaction.merchant or 'unknown',
+        'city': transaction.location or 'unknown'
+    }
+    if feature_store is not None:
+        try:
+            record.update(feature_store.update(record['user_id'], record['amount'], record['timestamp']))
+        except (TypeError, ValueError) as e:
+            print(f" Признаки пользователя недоступны: {e}")
+    return record
+
+# Статистика пользователей из БД для признаков user_* (FRAUD_API_USER_STATS_FEATURES=true)
+user_db = AsyncDatabaseManager() if SERVING_CONFIG["user_stats_features"] else None
+
+def user_stats_features(stats, amount):
+    """
+    Признаки user_* как в create_features при обучении: статистика всех операций
+    пользователя вместе с текущей. stats - строка user_stats или None для нового пользователя.
+    """
+    count = (stats['total_transactions'] if stats else 0) + 1
+    total = (float(stats['amount_sum']) if stats else 0.0) + amount
+    squares = (float(stats['amount_sq_sum'] or 0) if stats else 0.0) + amount * amount
+    mean = total / count
+    return {
+        'user_mean': mean,
+        # Выборочное стандартное отклонение, как pandas std; для одной операции 0
+        'user_std': math.sqrt(max(squares - total * mean, 0.0) / (count - 1)) if count > 1 else 0.0,
+        'user_min': min(float(stats['min_amount']), amount) if stats and stats['min_amount'] is not None else amount,
+        'user_max': max(float(stats['max_amount']), amount) if stats else amount,
+        'user_count': count
+    }
+
+async def add_user_stats(records):
+    """
+    Дополняет записи признаками user_* одним запросом на все записи (user_id = ANY).
+    Ошибка БД не мешает оценке: записи возвращаются без изменений.
+    """
+    if user_db is None or not records:
+        return records
+    try:
+        stats = await user_db.get_users_transaction_stats(record['user_id'] for record in records)
+    except Exception as e:
+        stats = None
+        print(f" Статистика пользователей недоступна: {e}")
+    if stats is None:
+        # БД недоступна: оцениваем с признаками из хранилища/по умолчанию, а не правилами
+        return records
+    for record in records:
+        record.update(user_stats_features(stats.get(record['user_id']), record['amount']))
+    return records
+
+def get_risk_level(risk_score):
+    """Уровень риска по итоговой оценке"""
+    if risk_score > 0.7:
+        return "HIGH"
+    elif risk_score > 0.3:
+        return "MEDIUM"
+    return "LOW"
+
+def build_response(transaction, check_number, risk_score, is_suspicious, model_used, model_version=None):
+    """Собирает FraudResponse для одной проверенной транзакции"""
+    risk_level = get_risk_level(risk_score)
+    
+    return FraudResponse(
+        transaction_id=f"tx_{check_number:06d}",
+        is_suspicious=is_suspicious,
+        risk_score=risk_score,
+        risk_level=risk_level,
+        reasons=generate_reasons(transaction, risk_score, risk_level),
+        timestamp=datetime.now().isoformat(),
+        model_used=model_used,
+        model_version=model_version
     )
 
 @app.post("/check", response_model=FraudResponse)
@@ -122,24 +374,22 @@ async def check_transaction(transaction: TransactionRequest):
     
     print(f" Проверяем транзакцию: {transaction.user_id} - {transaction.amount:,.0f} UZS")
     
-    transaction_data = pd.DataFrame([{
-        'user_id': transaction.user_id,
-        'amount': transaction.amount,
-        'timestamp': transaction.timestamp or datetime.now().isoformat(),
-        'merchant': transaction.merchant or 'unknown',
-        'city': transaction.location or 'unknown'
-    }])
-    
+    check_number = total_checks
+    model = active_model
     risk_score = 0.0
     is_suspicious = False
     model_used = "basic_rules"
+    model_version = None
     
-    if model_loaded and ai_system is not None:
+    if coalescer is not None:
+        risk_score, is_suspicious, model_used, model_version = await coalescer.submit(transaction)
+    elif model is not None:
         try:
-            result = ai_system.predict_ensemble(transaction_data)
-            risk_score = float(result.iloc[0]['ai_fraud_score'])
-            is_suspicious = bool(result.iloc[0]['ai_fraud_prediction'])
+            [record] = await add_user_stats([transaction_record(transaction)])
+            risk_score, prediction = await inference.call(model.system, 'predict_one', record)
+            is_suspicious = bool(prediction)
             model_used = "advanced_ai"
+            model_version = model.version
             print(f"    Использована AI модель, риск: {risk_score:.3f}")
         except Exception as e:
             print(f"     Ошибка AI модели: {e}, используем базовые правила")
@@ -147,56 +397,189 @@ async def check_transaction(transaction: TransactionRequest):
     else:
         risk_score, is_suspicious = simple_rules_check(transaction)
     
-    if risk_score > 0.7:
-        risk_level = "HIGH"
-    elif risk_score > 0.3:
-        risk_level = "MEDIUM"
-    else:
-        risk_level = "LOW"
-    
-    reasons = generate_reasons(transaction, risk_score, risk_level)
-    
-    response = FraudResponse(
-        transaction_id=f"tx_{total_checks:06d}",
-        is_suspicious=is_suspicious,
-        risk_score=risk_score,
-        risk_level=risk_level,
-        reasons=reasons,
-        timestamp=datetime.now().isoformat(),
-        model_used=model_used
+    response = build_response(
+        transaction, check_number, risk_score, is_suspicious, model_used, model_version
     )
     
-    print(f" Результат: {risk_level} риск (score: {risk_score:.3f}, модель: {model_used})")
+    print(f" Результат: {response.risk_level} риск (score: {risk_score:.3f}, модель: {model_used})")
     
     return response
 
+async def score_batch(transactions):
+    """
+    Оценивает пакет транзакций одним вызовом каждой модели ансамбля.
+    Возвращает список (risk_score, is_suspicious, model_used, model_version)
+    в исходном порядке.
+    """
+    model = active_model
+    if model is not None:
+        try:
+            records = await add_user_stats([transaction_record(tx) for tx in transactions])
+            scores, predictions = await inference.call(model.system, 'predict_records', records)
+            return [
+                (float(score), bool(prediction), "advanced_ai", model.version)
+                for score, prediction in zip(scores, predictions)
+            ]
+        except Exception as e:
+            print(f"     Ошибка AI модели: {e}, используем базовые правила")
+    
+    return [simple_rules_check(tx) + ("basic_rules", None) for tx in transactions]
+
+# Опциональный микробатчинг /check (FRAUD_API_COALESCE=true)
+coalescer = RequestCoalescer(
+    score_batch,
+    max_batch=SERVING_CONFIG["coalesce_max_batch"],
+    max_wait_ms=SERVING_CONFIG["coalesce_max_wait_ms"]
+) if SERVING_CONFIG["coalesce"] else None
+
 @app.post("/batch-check", response_model=BatchResponse)
 async def batch_check_transactions(transactions: list[TransactionRequest]):
     """Проверяет несколько транзакций одновременно"""
-    results = []
+    global total_checks
+    first_check = total_checks + 1
+    total_checks += len(transactions)
+    
+    print(f" Проверяем пакет из {len(transactions):,} транзакций")
+    
+    scored = await score_batch(transactions) if transactions else []
     
-    for transaction in transactions:
-        result = await check_transaction(transaction)
-        results.append(result.dict())
+    results = [
+        build_response(tx, first_check + i, *scored_item).model_dump()
+        for i, (tx, scored_item) in enumerate(zip(transactions, scored))
+    ]
     
     suspicious_count = sum(1 for r in results if r['is_suspicious'])
     
+    print(f" Пакет проверен: {suspicious_count} подозрительных из {len(results)}")
+    
     return BatchResponse(
         checked_count=len(results),
         suspicious_count=suspicious_count,
         results=results
     )
 
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse для генераторов, которые сами читают тело запроса.
+    Обычный StreamingResponse параллельно слушает receive() в ожидании
+    отключения клиента и забирает себе куски тела, поэтому здесь receive
+    читает только генератор (отключение он замечает через request.stream()).
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def iter_ndjson_lines(request, max_line_bytes):
+    """
+    Читает тело запроса кусками и отдает его построчно: (номер, строка).
+    Строка длиннее max_line_bytes не накапливается в памяти и отдается как None.
+    """
+    buffer = bytearray()
+    line_number = 0
+    too_long = False
+    
+    async for chunk in request.stream():
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(b"\n", start)
+            if end == -1:
+                break
+            line_number += 1
+            if too_long or end - start > max_line_bytes:
+                yield line_number, None
+            else:
+                yield line_number, bytes(buffer[start:end])
+            too_long = False
+            start = end + 1
+        del buffer[:start]
+        
+        # Незавершенная строка уже слишком длинная: дальше только ищем ее конец
+        if len(buffer) > max_line_bytes:
+            too_long = True
+            buffer.clear()
+    
+    if too_long or len(buffer) > max_line_bytes:
+        yield line_number + 1, None
+    elif buffer:
+        yield line_number + 1, bytes(buffer)
+
+async def score_stream_chunk(items):
+    """
+    Оценивает кусок потока одним вызовом ансамбля.
+    items - TransactionRequest или dict с ошибкой разбора строки, порядок сохраняется.
+    """
+    global total_checks
+    transactions = [item for item in items if isinstance(item, TransactionRequest)]
+    check_number = total_checks
+    total_checks += len(transactions)
+    
+    scored = iter(await score_batch(transactions)) if transactions else iter(())
+    
+    lines = []
+    for item in items:
+        if isinstance(item, dict):
+            lines.append(json.dumps(item, ensure_ascii=False))
+        else:
+            check_number += 1
+            lines.append(build_response(item, check_number, *next(scored)).model_dump_json())
+    return "\n".join(lines) + "\n"
+
+@app.post("/batch-check/stream")
+async def batch_check_stream(request: Request, chunk_size: Optional[int] = None):
+    """
+    Потоковая проверка: тело - NDJSON (одна транзакция на строку),
+    ответ - NDJSON с результатами в том же порядке. Транзакции оцениваются
+    кусками по chunk_size, поэтому память не зависит от размера тела.
+    Строки с ошибками (и длиннее stream_max_line_bytes) возвращаются
+    как {"line": N, "error": "..."}.
+    """
+    size = max(1, chunk_size or SERVING_CONFIG["stream_chunk_size"])
+    max_line_bytes = SERVING_CONFIG["stream_max_line_bytes"]
+    
+    async def results():
+        pending = []
+        async for line_number, line in iter_ndjson_lines(request, max_line_bytes):
+            if line is None:
+                pending.append({"line": line_number, "error": f"line exceeds {max_line_bytes} bytes"})
+            elif not line.strip():
+                continue
+            else:
+                try:
+                    pending.append(TransactionRequest.model_validate_json(line))
+                except ValidationError as e:
+                    pending.append({"line": line_number, "error": str(e.errors(include_url=False))})
+            
+            if len(pending) >= size:
+                yield await score_stream_chunk(pending)
+                pending = []
+        
+        if pending:
+            yield await score_stream_chunk(pending)
+    
+    return BodyStreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.post("/reload-model")
 async def reload_model():
-    """Перезагружает AI модель"""
-    global ai_system, model_loaded
-    success = load_ai_system()
+    """
+    Перезагружает AI модель в фоне: загрузка и проверка идут вне event loop,
+    текущие запросы дорабатывают на старой версии. Параллельные вызовы
+    ждут одну и ту же загрузку.
+    """
+    global reload_task
+    if reload_task is None or reload_task.done():
+        reload_task = asyncio.ensure_future(reload_in_background())
+    
+    success = await asyncio.shield(reload_task)
+    model = active_model
     
     return {
         "success": success,
         "message": "Model reloaded successfully" if success else "Failed to reload model",
-        "model_loaded": model_loaded
+        "model_loaded": model is not None,
+        "model_version": model.version if model is not None else None
     }
 
 def simple_rules_check(transaction):
@@ -249,9 +632,32 @@ def main():
     print(" Health check: http://localhost:8000/health")
     print(" Reload model: POST http://localhost:8000/reload-model")
     print("  Остановка: Ctrl+C")
+    print(f" Инференс: {inference.kind} (воркеров: {inference.max_workers})")
+    if coalescer is not None:
+        print(f" Микробатчинг /check: до {coalescer.max_batch} запросов или {coalescer.max_wait * 1000:g} мс")
     print("=" * 50)
     
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = SERVING_CONFIG["workers"]
+    if workers > 1:
+        prepare_shared_model()
+        print(f" Воркеров uvicorn: {workers} (общая mmap-модель)")
+        uvicorn.run("src.fraud_api:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
+
+def prepare_shared_model():
+    """
+    Один раз экспортирует модель в mmap-артефакт до запуска воркеров,
+    чтобы каждый воркер только открывал файлы, а не загружал свою копию .pkl
+    """
+    for model_path in MODEL_PATHS:
+        if model_path.exists():
+            try:
+                ensure_mapped_model(model_path)
+                break
+            except Exception as e:
+                print(f" Не удалось экспортировать {model_path.name}: {e}")
+    os.environ["FRAUD_API_MODEL_MMAP"] = "true"
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,6 +7,13 @@ import pandas as pd
 import joblib
 from sklearn.ensemble import IsolationForest
 import numpy as np
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import read_dataset
 
 print(" ЗАГРУЗКА МОДЕЛИ ИСКУССТВЕННОГО ИНТЕЛЛЕКТА...")
 
@@ -21,14 +28,14 @@ def check_columns_and_create_features(data):
         features['total_1h'] = data['total_1h'].fillna(0)
         print("    Используем: total_1h")
     else:
-        features['recent_total'] = data.groupby('user_id')['amount'].rolling(5, min_periods=1).sum().reset_index(level=0, drop=True).fillna(0)
+        features['recent_total'] = data.groupby('user_id', observed=True)['amount'].rolling(5, min_periods=1).sum().reset_index(level=0, drop=True).fillna(0)
         print("    Создаем: recent_total")
     
     if 'count_1h' in data.columns:
         features['count_1h'] = data['count_1h'].fillna(0)
         print("    Используем: count_1h")
     else:
-        features['recent_count'] = data.groupby('user_id')['amount'].rolling(5, min_periods=1).count().reset_index(level=0, drop=True).fillna(0)
+        features['recent_count'] = data.groupby('user_id', observed=True)['amount'].rolling(5, min_periods=1).count().reset_index(level=0, drop=True).fillna(0)
         print("    Создаем: recent_count")
     
     if 'timestamp' in data.columns:
@@ -47,7 +54,7 @@ def train_ai_model():
     print(" ОБУЧАЕМ МОДЕЛЬ НА ИСТОРИЧЕСКИХ ДАННЫХ...")
     
     try:
-        data = pd.read_csv("prepared_transactions.csv")
+        data = read_dataset("prepared_transactions.csv", columns=['user_id', 'amount', 'total_1h', 'count_1h', 'timestamp'])
         print(f" Используем {len(data):,} транзакций для обучения")
         
         features = check_columns_and_create_features(data)
@@ -78,7 +85,7 @@ def detect_fraud_with_ai():
     
     try:
         model = joblib.load("ai_fraud_model.pkl")
-        data = pd.read_csv("prepared_transactions.csv")
+        data = read_dataset("prepared_transactions.csv")
         print(f" Загружено {len(data):,} транзакций для проверки")
         
     except Exception as e:
@@ -129,7 +136,7 @@ def simple_fraud_detection():
     print(" ЗАПУСК ПРОСТОГО МЕТОДА ОБНАРУЖЕНИЯ...")
     
     try:
-        data = pd.read_csv("prepared_transactions.csv")
+        data = read_dataset("prepared_transactions.csv")
     except:
         print(" Не могу загрузить данные!")
         return
@@ -0,0 +1,125 @@
+"""
+ВЫПОЛНЕНИЕ ИНФЕРЕНСА ВНЕ EVENT LOOP
+Пул потоков или процессов для CPU-нагрузки sklearn/TensorFlow
+"""
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXECUTOR_KINDS = ("inline", "thread", "process")
+
+# Модель, загруженная в процесс-воркер пула
+_worker_ai_system = None
+
+def _init_worker(ai_system):
+    """Инициализатор процесса: сохраняет модель один раз на воркер"""
+    global _worker_ai_system
+    _worker_ai_system = ai_system
+
+def _call_in_worker(method, payload):
+    return getattr(_worker_ai_system, method)(payload)
+
+class InferenceExecutor:
+    """
+    Запускает методы модели (predict_one, predict_records) в пуле:
+    - inline: прямо в event loop (старое поведение)
+    - thread: ThreadPoolExecutor, модель общая для потоков
+    - process: ProcessPoolExecutor, в каждом процессе своя копия модели
+    Одновременно выполняется не больше max_in_flight вызовов,
+    остальные ждут в event loop, не занимая потоки.
+    """
+
+    def __init__(self, kind="thread", max_workers=None, max_in_flight=None):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Неизвестный тип executor: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.max_in_flight = max_in_flight or self.max_workers * 2
+        self._thread_pool = None
+        # Пулы процессов по моделям: id(system) -> ModelPool
+        self._process_pools = {}
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    def _get_thread_pool(self):
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference"
+            )
+        return self._thread_pool
+
+    def _get_process_pool(self, ai_system):
+        """Пул процессов своей модели: запросы на старой и новой версии не мешают друг другу"""
+        model_pool = self._process_pools.get(id(ai_system))
+        if model_pool is None:
+            model_pool = ModelPool(ai_system, ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(ai_system,)
+            ))
+            self._process_pools[id(ai_system)] = model_pool
+        return model_pool
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    async def call(self, ai_system, method, payload):
+        """Выполняет ai_system.<method>(payload) в выбранном пуле"""
+        if self.kind == "inline":
+            return getattr(ai_system, method)(payload)
+
+        async with self._get_semaphore():
+            loop = asyncio.get_running_loop()
+            if self.kind == "thread":
+                return await loop.run_in_executor(
+                    self._get_thread_pool(), getattr(ai_system, method), payload
+                )
+
+            model_pool = self._get_process_pool(ai_system)
+            model_pool.in_flight += 1
+            try:
+                return await loop.run_in_executor(model_pool.pool, _call_in_worker, method, payload)
+            finally:
+                model_pool.in_flight -= 1
+                if model_pool.retired and model_pool.in_flight == 0:
+                    self._close_process_pool(model_pool)
+
+    def retire(self, ai_system):
+        """
+        Модель заменена: ее пул процессов закроется, когда доработают
+        уже начатые на ней вызовы.
+        """
+        model_pool = self._process_pools.get(id(ai_system))
+        if model_pool is None:
+            return
+        model_pool.retired = True
+        if model_pool.in_flight == 0:
+            self._close_process_pool(model_pool)
+
+    def _close_process_pool(self, model_pool, wait=False):
+        if self._process_pools.get(id(model_pool.system)) is model_pool:
+            del self._process_pools[id(model_pool.system)]
+        model_pool.pool.shutdown(wait=wait)
+
+    def shutdown(self, wait=False):
+        """Останавливает все пулы (текущие вызовы доработают)"""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=wait)
+            self._thread_pool = None
+        for model_pool in list(self._process_pools.values()):
+            self._close_process_pool(model_pool, wait=wait)
+
+class ModelPool:
+    """Пул процессов одной модели и число выполняемых на нем вызовов"""
+
+    def __init__(self, system, pool):
+        self.system = system
+        self.pool = pool
+        self.in_flight = 0
+        self.retired = False
@@ -4,6 +4,13 @@ import time
 import threading
 from datetime import datetime
 import logging
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import read_dataset
 
 class FraudMetricsExporter:
     def __init__(self, port=8000):
@@ -55,7 +62,7 @@ class FraudMetricsExporter:
     def update_metrics(self):
         """Обновляет все метрики из данных"""
         try:
-            data = pd.read_csv("prepared_transactions.csv")
+            data = read_dataset("prepared_transactions.csv", columns=['is_fraud', 'amount'])
             
             total_transactions = len(data)
             fraud_count = data['is_fraud'].sum() if 'is_fraud' in data.columns else 0
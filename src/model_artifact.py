@@ -0,0 +1,324 @@
+"""
+ОБЩИЙ АРТЕФАКТ МОДЕЛИ ДЛЯ НЕСКОЛЬКИХ ВОРКЕРОВ
+Деревья лесов и параметры scaler сохраняются в .npy и открываются через mmap,
+поэтому все воркеры uvicorn используют одни и те же физические страницы памяти
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from src.advanced_ai import AdvancedFraudAI
+
+ARTIFACT_VERSION = 1
+TREE_LEAF = -1
+
+def _flatten_trees(trees, tree_features, node_values):
+    """
+    Склеивает деревья в общие массивы узлов.
+    Индексы детей и признаков переводятся в глобальную нумерацию,
+    node_values(tree_idx, tree_) -> значения в узлах (для листьев).
+    """
+    left, right, feature, threshold, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for tree_idx, (tree, features) in enumerate(zip(trees, tree_features)):
+        tree_ = tree.tree_
+        n_nodes = tree_.node_count
+        is_leaf = tree_.children_left == TREE_LEAF
+
+        left.append(np.where(is_leaf, TREE_LEAF, tree_.children_left + offset))
+        right.append(np.where(is_leaf, TREE_LEAF, tree_.children_right + offset))
+        feature.append(np.where(is_leaf, 0, np.asarray(features)[np.maximum(tree_.feature, 0)]))
+        threshold.append(tree_.threshold)
+        values.append(node_values(tree_idx, tree_))
+        roots.append(offset)
+
+        max_depth = max(max_depth, tree_.max_depth)
+        offset += n_nodes
+
+    return {
+        'left': np.concatenate(left).astype(np.int64),
+        'right': np.concatenate(right).astype(np.int64),
+        'feature': np.concatenate(feature).astype(np.int64),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'value': np.concatenate(values).astype(np.float64),
+        'roots': np.asarray(roots, dtype=np.int64)
+    }, max_depth
+
+def _node_depths(tree_):
+    """Глубина каждого узла (корень = 1) по публичным children_left/right"""
+    depths = np.zeros(tree_.node_count, dtype=np.float64)
+    depths[0] = 1.0
+    # Построитель sklearn нумерует детей после родителя, поэтому хватает одного прохода
+    for node in range(tree_.node_count):
+        left = tree_.children_left[node]
+        if left != TREE_LEAF:
+            depths[left] = depths[node] + 1.0
+            depths[tree_.children_right[node]] = depths[node] + 1.0
+    return depths
+
+def _average_path_length(n_samples):
+    """Средняя длина пути неудачного поиска в BST из n_samples элементов"""
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    mask = n_samples > 2
+    result[mask] = (
+        2.0 * (np.log(n_samples[mask] - 1.0) + np.euler_gamma)
+        - 2.0 * (n_samples[mask] - 1.0) / n_samples[mask]
+    )
+    return result
+
+def _check_export(ai_system, mapped_models, n_features):
+    """
+    Сверяет экспортированные деревья с исходными моделями на случайных данных.
+    Экспорт опирается только на публичные поля tree_, но формулы повторяют sklearn:
+    если версия sklearn их поменяет, артефакт не будет опубликован.
+    """
+    X = np.random.default_rng(0).normal(scale=2, size=(512, n_features))
+    for name, mapped in mapped_models.items():
+        original = ai_system.models[name]
+        if not np.array_equal(original.predict(X), mapped.predict(X)):
+            raise ValueError(f"mmap-экспорт {name} расходится с sklearn")
+        if name == 'isolation_forest' and not np.allclose(
+            original.score_samples(X), mapped.score_samples(X), rtol=1e-12, atol=0
+        ):
+            raise ValueError("mmap-экспорт isolation_forest расходится с sklearn")
+
+def export_mapped_model(ai_system, directory):
+    """
+    Сохраняет AdvancedFraudAI в каталог .npy файлов + manifest.json.
+    Файлы пишутся во временный каталог и публикуются одним os.replace;
+    опубликованный каталог не перезаписывается, потому что его могут держать
+    открытым через mmap другие воркеры.
+    """
+    directory = Path(directory)
+    if (directory / 'manifest.json').exists():
+        raise FileExistsError(f"mmap-артефакт уже опубликован: {directory}")
+    directory.parent.mkdir(parents=True, exist_ok=True)
+
+    manifest = {
+        'version': ARTIFACT_VERSION,
+        'feature_names': list(ai_system.feature_names),
+        'models': {}
+    }
+    arrays = {
+        'scaler_mean': np.asarray(ai_system.scaler.mean_, dtype=np.float64),
+        'scaler_scale': np.asarray(ai_system.scaler.scale_, dtype=np.float64)
+    }
+    mapped_models = {}
+
+    iso_forest = ai_system.models.get('isolation_forest')
+    if iso_forest is not None:
+        # Вклад листа в глубину: глубина узла + средняя длина пути по числу образцов - 1
+        def iso_values(tree_idx, tree_):
+            return _node_depths(tree_) + _average_path_length(tree_.n_node_samples) - 1.0
+
+        trees, max_depth = _flatten_trees(
+            iso_forest.estimators_, iso_forest.estimators_features_, iso_values
+        )
+        arrays.update({f'isolation_forest_{k}': v for k, v in trees.items()})
+        average_path_length = float(_average_path_length([iso_forest.max_samples_])[0])
+        params = {
+            'max_depth': max_depth,
+            'offset': float(iso_forest.offset_),
+            'denominator': float(len(iso_forest.estimators_) * average_path_length)
+        }
+        manifest['models']['isolation_forest'] = params
+        mapped_models['isolation_forest'] = MappedIsolationForest(trees, params)
+
+    random_forest = ai_system.models.get('random_forest')
+    if random_forest is not None:
+        n_classes = int(random_forest.n_classes_)
+
+        # Нормированные вероятности листа, как в DecisionTreeClassifier.predict_proba
+        def rf_values(tree_idx, tree_):
+            proba = tree_.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            return proba / normalizer
+
+        all_features = [np.arange(random_forest.n_features_in_)] * len(random_forest.estimators_)
+        trees, max_depth = _flatten_trees(random_forest.estimators_, all_features, rf_values)
+        arrays.update({f'random_forest_{k}': v for k, v in trees.items()})
+        arrays['random_forest_classes'] = np.asarray(random_forest.classes_)
+        params = {'max_depth': max_depth}
+        manifest['models']['random_forest'] = params
+        mapped_models['random_forest'] = MappedRandomForest(
+            trees, params, arrays['random_forest_classes']
+        )
+
+    _check_export(ai_system, mapped_models, len(ai_system.feature_names))
+
+    staging = Path(tempfile.mkdtemp(prefix=f'.{directory.name}.', dir=directory.parent))
+    try:
+        # Нейросеть не раскладывается в массивы: каждый воркер загружает ее сам
+        if 'neural_network' in ai_system.models:
+            joblib.dump(ai_system.models['neural_network'], staging / 'neural_network.pkl')
+            manifest['models']['neural_network'] = {'file': 'neural_network.pkl'}
+
+        for name, array in arrays.items():
+            np.save(staging / f'{name}.npy', np.ascontiguousarray(array))
+
+        with open(staging / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # os.replace не заменяет непустой каталог: если другой процесс успел
+        # опубликовать ту же версию, используем его артефакт
+        try:
+            os.replace(staging, directory)
+        except OSError:
+            if not (directory / 'manifest.json').exists():
+                raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    return directory
+
+def model_file_version(model_path):
+    """Версия .pkl файла: mtime в наносекундах и размер"""
+    stat = Path(model_path).stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def mapped_model_dir(model_path):
+    """Каталог версии mmap-артефакта: <stem>.mmap/<версия .pkl>"""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + '.mmap') / model_file_version(model_path)
+
+def ensure_mapped_model(model_path):
+    """
+    Возвращает каталог mmap-артефакта для текущей версии .pkl, экспортируя его при
+    необходимости. Новая версия .pkl публикуется в новый каталог, старые каталоги
+    остаются нетронутыми, пока их держат открытыми воркеры.
+    """
+    model_path = Path(model_path)
+    directory = mapped_model_dir(model_path)
+
+    if not (directory / 'manifest.json').exists():
+        print(f" Экспортируем mmap-артефакт: {directory.parent.name}/{directory.name}")
+        export_mapped_model(joblib.load(model_path), directory)
+    return directory
+
+class MappedTreeEnsemble:
+    """Обход склеенных деревьев по массивам, открытым только для чтения"""
+
+    def __init__(self, arrays, max_depth):
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = max_depth
+
+    def apply(self, X):
+        """Индексы листьев формы (n_samples, n_trees)"""
+        X = np.asarray(X, dtype=np.float32)
+        nodes = np.repeat(self.roots[np.newaxis, :], X.shape[0], axis=0)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            is_leaf = left == TREE_LEAF
+            if is_leaf.all():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(is_leaf, nodes, np.where(go_left, left, self.right[nodes]))
+        return nodes
+
+class MappedIsolationForest(MappedTreeEnsemble):
+    """predict() как у IsolationForest: -1 для аномалий, 1 для нормы"""
+
+    def __init__(self, arrays, params):
+        super().__init__(arrays, params['max_depth'])
+        self.offset_ = params['offset']
+        self.denominator = params['denominator']
+
+    def score_samples(self, X):
+        leaves = self.apply(X)
+        depths = np.zeros(leaves.shape[0], order="f")
+        for tree_idx in range(leaves.shape[1]):
+            depths += self.value[leaves[:, tree_idx]]
+
+        return -2 ** (-np.divide(
+            depths, self.denominator, out=np.ones_like(depths), where=self.denominator != 0
+        ))
+
+    def predict(self, X):
+        decision = self.score_samples(X) - self.offset_
+        is_inlier = np.ones_like(decision, dtype=int)
+        is_inlier[decision < 0] = -1
+        return is_inlier
+
+class MappedRandomForest(MappedTreeEnsemble):
+    """predict() как у RandomForestClassifier: средняя вероятность по деревьям"""
+
+    def __init__(self, arrays, params, classes):
+        super().__init__(arrays, params['max_depth'])
+        self.classes_ = classes
+
+    def predict(self, X):
+        leaves = self.apply(X)
+        proba = np.zeros((leaves.shape[0], self.value.shape[1]), dtype=np.float64)
+        for tree_idx in range(leaves.shape[1]):
+            proba += self.value[leaves[:, tree_idx]]
+        proba /= leaves.shape[1]
+        return self.classes_.take(np.argmax(proba, axis=1), axis=0)
+
+class MappedFraudAI(AdvancedFraudAI):
+    """
+    AdvancedFraudAI поверх mmap-артефакта: те же predict_one / predict_records /
+    predict_ensemble, но массивы деревьев и scaler разделяются между процессами.
+    При pickle передается только путь к каталогу.
+    """
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = Path(directory)
+
+        with open(self.directory / 'manifest.json', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest['version'] != ARTIFACT_VERSION:
+            raise ValueError(f"Неподдерживаемая версия артефакта: {manifest['version']}")
+
+        self.feature_names = manifest['feature_names']
+        self.scaler = self._load_scaler()
+
+        for name, params in manifest['models'].items():
+            if name == 'isolation_forest':
+                self.models[name] = MappedIsolationForest(self._load_trees(name), params)
+            elif name == 'random_forest':
+                classes = self._load('random_forest_classes')
+                self.models[name] = MappedRandomForest(self._load_trees(name), params, classes)
+            elif name == 'neural_network':
+                self.models[name] = joblib.load(self.directory / params['file'])
+
+    def _load(self, name):
+        return np.load(self.directory / f'{name}.npy', mmap_mode='r')
+
+    def _load_trees(self, prefix):
+        return {
+            key: self._load(f'{prefix}_{key}')
+            for key in ('left', 'right', 'feature', 'threshold', 'value', 'roots')
+        }
+
+    def _load_scaler(self):
+        """StandardScaler с параметрами из mmap (для DataFrame-пути)"""
+        scaler = StandardScaler()
+        scaler.mean_ = self._load('scaler_mean')
+        scaler.scale_ = self._load('scaler_scale')
+        scaler.var_ = np.square(scaler.scale_)
+        scaler.n_features_in_ = len(self.feature_names)
+        scaler.feature_names_in_ = np.asarray(self.feature_names, dtype=object)
+        return scaler
+
+    def __reduce__(self):
+        return (MappedFraudAI, (str(self.directory),))
@@ -0,0 +1,116 @@
+"""
+ПАРАЛЛЕЛЬНЫЙ РАСЧЕТ ПРИЗНАКОВ ПО ПОЛЬЗОВАТЕЛЯМ
+Признаки пользователя (статистики, окна, лаги, user_amount_zscore) не зависят
+от других пользователей, поэтому строки делятся на шарды по хешу user_id
+и считаются в пуле процессов. Колонки шардов и результат лежат в .npy
+в общей памяти (/dev/shm) и открываются через mmap: процессы не копируют
+данные через pickle. Глобальные amount_zscore и is_fraud считаются вторым
+проходом по суммам, собранным из шардов.
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.dataset_features import (
+    LAGS, USER_STAT_COLUMNS, RunningStats, add_amount_zscore, add_fraud_target, add_sequence_features,
+    add_time_features, add_user_amount_zscore, add_user_stats, user_aggregates
+)
+from src.rolling_features import WINDOWS
+
+# Колонки, которые считает шард, в порядке build_features()
+SHARD_COLUMNS = (
+    USER_STAT_COLUMNS
+    + ['hour', 'day_of_week', 'is_weekend', 'month']
+    + [f'{kind}_{window}' for window in WINDOWS for kind in ('total', 'count', 'mean')]
+    + [f'prev_amount_{lag}' for lag in range(1, LAGS + 1)]
+    + ['amount_ratio', 'time_diff_sec', 'user_amount_zscore']
+)
+# tmpfs: файлы шардов - страницы общей памяти, а не диск
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+def user_shards(users, n_shards):
+    """Номер шарда каждой строки: хеш user_id по модулю n_shards, одинаковый между запусками"""
+    codes, uniques = pd.factorize(users)
+    hashes = pd.util.hash_array(np.asarray(uniques, dtype=object))
+    return (hashes % np.uint64(n_shards)).astype(np.int64)[codes], codes
+
+def common_dtypes(shard_dtypes):
+    """
+    Тип каждой колонки для всех шардов сразу: колонка, целая в одном шарде
+    и дробная в другом, в результате дробная, как у build_features() на всем наборе
+    """
+    if not shard_dtypes:
+        return {column: np.dtype(np.float64) for column in SHARD_COLUMNS}
+    return {column: np.result_type(*[dtypes[column] for dtypes in shard_dtypes]) for column in SHARD_COLUMNS}
+
+def _featurize_shard(directory, start, stop):
+    """Признаки строк [start, stop) в общий features.npy; возвращает (суммы шарда, типы колонок)"""
+    directory = Path(directory)
+    shard = pd.DataFrame({
+        'user_id': np.load(directory / 'user_id.npy', mmap_mode='r')[start:stop],
+        'timestamp': np.load(directory / 'timestamp.npy', mmap_mode='r')[start:stop],
+        'amount': np.load(directory / 'amount.npy', mmap_mode='r')[start:stop]
+    })
+    stats = user_aggregates(shard)
+    shard = add_user_stats(shard, stats)
+    shard = add_time_features(shard)
+    shard = add_sequence_features(shard)
+    shard = add_user_amount_zscore(shard, stats)
+
+    features = np.load(directory / 'features.npy', mmap_mode='r+')
+    features[start:stop] = shard[SHARD_COLUMNS].to_numpy(dtype=np.float64)
+    features.flush()
+    totals = RunningStats().update(shard['amount'], pd.Series(0, index=shard.index))
+    return totals.frame, shard[SHARD_COLUMNS].dtypes.to_dict()
+
+def build_features_parallel(transactions, workers=None, shards=None):
+    """
+    То же, что build_features(), в пуле из workers процессов (по умолчанию - по числу ядер).
+    transactions отсортированы по (user_id, timestamp); строки результата в том же порядке.
+    shards - число шардов (по умолчанию workers): результат от него не зависит.
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers
+    transactions = transactions.reset_index(drop=True)
+    shard_of_row, codes = user_shards(transactions['user_id'], shards)
+    # Строки шарда подряд, внутри шарда - прежний порядок (user_id, timestamp)
+    order = np.argsort(shard_of_row, kind='stable')
+    bounds = np.searchsorted(shard_of_row[order], np.arange(shards + 1))
+
+    with tempfile.TemporaryDirectory(prefix='features-', dir=SHARED_DIR) as directory:
+        directory = Path(directory)
+        np.save(directory / 'user_id.npy', codes[order].astype(np.int64))
+        np.save(directory / 'timestamp.npy', transactions['timestamp'].to_numpy(dtype='datetime64[ns]')[order])
+        np.save(directory / 'amount.npy', transactions['amount'].to_numpy()[order])
+        shared = np.lib.format.open_memmap(
+            directory / 'features.npy', mode='w+', dtype=np.float64, shape=(len(transactions), len(SHARD_COLUMNS))
+        )
+        del shared
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_featurize_shard, str(directory), bounds[i], bounds[i + 1])
+                for i in range(shards) if bounds[i + 1] > bounds[i]
+            ]
+            # В порядке шардов: сумма и типы не зависят от того, какой процесс закончил раньше
+            results = [future.result() for future in futures]
+
+        values = np.empty((len(transactions), len(SHARD_COLUMNS)), dtype=np.float64)
+        values[order] = np.load(directory / 'features.npy', mmap_mode='r')
+
+    # Проход 2: среднее и std суммы по всем операциям из сумм шардов
+    overall = RunningStats()
+    for totals, _ in results:
+        overall.merge(totals)
+    dtypes = common_dtypes([shard_dtypes for _, shard_dtypes in results])
+    for i, column in enumerate(SHARD_COLUMNS):
+        transactions[column] = values[:, i].astype(dtypes[column])
+    user_zscore = transactions.pop('user_amount_zscore')
+    transactions = add_amount_zscore(transactions, overall.mean().get(0, np.nan), overall.std().get(0, np.nan))
+    transactions['user_amount_zscore'] = user_zscore
+    return add_fraud_target(transactions)
@@ -0,0 +1,317 @@
+"""
+СЕКЦИИ ТАБЛИЦЫ TRANSACTIONS
+Таблица transactions секционирована по времени (init.sql). PartitionManager заранее
+создает секции за день или месяц, а секции старше срока хранения потоково выгружает
+в Parquet и удаляет из БД, чтобы рабочий набор оставался небольшим.
+"""
+
+import json
+import logging
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.parquet as pq
+from psycopg2 import sql
+
+from src.config import PARTITION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'transactions'
+DEFAULT_PARTITION = 'transactions_default'
+
+# Колонки архива в порядке SELECT и их типы NumPy в прежнем формате .npz,
+# где NULL отмечался маской <колонка>__null
+ARCHIVE_COLUMNS = (
+    ('id', np.int64),
+    ('user_id', str),
+    ('amount', np.float64),
+    ('merchant', str),
+    ('timestamp', 'datetime64[us]'),
+    ('is_fraud', np.bool_),
+    ('fraud_score', np.float64),
+    ('risk_level', str),
+)
+# Схема Parquet-архива: строки - со словарем, время - родным типом, NULL - как есть
+_TEXT = pa.dictionary(pa.int32(), pa.string())
+ARCHIVE_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('user_id', _TEXT),
+    ('amount', pa.float64()),
+    ('merchant', _TEXT),
+    ('timestamp', pa.timestamp('us')),
+    ('is_fraud', pa.bool_()),
+    ('fraud_score', pa.float64()),
+    ('risk_level', _TEXT),
+])
+_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+def period_start(moment, interval):
+    """Начало дня или месяца, в который попадает moment"""
+    if interval == 'day':
+        return datetime(moment.year, moment.month, moment.day)
+    if interval == 'month':
+        return datetime(moment.year, moment.month, 1)
+    raise ValueError(f"Неизвестный интервал секций: {interval}")
+
+def next_period(start, interval):
+    if interval == 'day':
+        return start + timedelta(days=1)
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+def partition_name(start, interval):
+    return f"{TABLE}_p{start.strftime('%Y%m%d' if interval == 'day' else '%Y%m')}"
+
+def rows_to_table(rows):
+    """Строки в порядке ARCHIVE_COLUMNS -> pa.Table со схемой ARCHIVE_SCHEMA"""
+    arrays = []
+    for i, field in enumerate(ARCHIVE_SCHEMA):
+        values = [row[i] for row in rows]
+        if pa.types.is_floating(field.type):
+            # DECIMAL приходит как Decimal, который pyarrow не приводит к double
+            values = [None if value is None else float(value) for value in values]
+        if pa.types.is_dictionary(field.type):
+            arrays.append(pa.array(values, type=field.type.value_type).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=ARCHIVE_SCHEMA)
+
+def write_archive(target, batches):
+    """
+    Атомарно пишет порции строк (итератор списков) в Parquet: в памяти только одна
+    порция, файл появляется под именем target только целиком. Возвращает число строк.
+    """
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f'.{target.stem}-', suffix='.parquet', dir=target.parent)
+    rows = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            with pq.ParquetWriter(f, ARCHIVE_SCHEMA, compression='zstd') as writer:
+                for batch in batches:
+                    writer.write_table(rows_to_table(batch))
+                    rows += len(batch)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return rows
+
+def read_archive(path, columns=None):
+    """DataFrame из архива секции (.parquet или прежний .npz); columns - только нужные колонки"""
+    if Path(path).suffix == '.parquet':
+        return pd.read_parquet(path, columns=list(columns) if columns else None)
+    with np.load(path) as archive:
+        names = columns or [column for column, _ in ARCHIVE_COLUMNS]
+        data = {}
+        for column in names:
+            values = archive[column]
+            if f'{column}__null' in archive.files:
+                values = pd.Series(values).mask(archive[f'{column}__null'])
+            data[column] = values
+    return pd.DataFrame(data)
+
+class PartitionManager:
+    """
+    Секции transactions. interval - day или month; premake - сколько будущих
+    секций держать созданными; retention_days - сколько дней хранить в БД (0 - все).
+    Счетчики пользователей и сводки (init.sql) после архивации по-прежнему включают
+    архивные строки; backfill_transaction_aggregates() пересчитывает их только по БД.
+    """
+
+    def __init__(self, pool, interval='month', premake=2, retention_days=0,
+                 archive_dir=None, counter_retention_days=2, archive_batch_rows=50000):
+        period_start(datetime(2000, 1, 1), interval)
+        self.pool = pool
+        self.interval = interval
+        self.premake = premake
+        self.retention_days = retention_days
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.counter_retention_days = counter_retention_days
+        self.archive_batch_rows = archive_batch_rows
+
+    @staticmethod
+    def _now(cur):
+        # Время сервера БД: timestamp в transactions записывается по нему
+        cur.execute("SELECT LOCALTIMESTAMP")
+        return cur.fetchone()[0]
+
+    @staticmethod
+    def _partitions(cur):
+        cur.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            ORDER BY c.relname
+        """, (TABLE,))
+        partitions = []
+        for name, bound, rows in cur.fetchall():
+            match = _BOUNDS.search(bound)
+            partitions.append({
+                'name': name,
+                'start': datetime.fromisoformat(match.group(1)) if match else None,
+                'end': datetime.fromisoformat(match.group(2)) if match else None,
+                # Оценка из статистики планировщика (-1 или 0, пока не было ANALYZE)
+                'rows': max(rows, 0)
+            })
+        return partitions
+
+    def is_partitioned(self):
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (TABLE,))
+                row = cur.fetchone()
+        return row is not None and row[0] == 'p'
+
+    def list_partitions(self):
+        """Секции с границами [start, end) и оценкой числа строк; у секции по умолчанию границ нет"""
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                return self._partitions(cur)
+
+    def ensure_partitions(self, now=None):
+        """Создает секции от текущего периода на premake периодов вперед; возвращает имена новых"""
+        created = []
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                now = now or self._now(cur)
+                existing = [p for p in self._partitions(cur) if p['start'] is not None]
+                start = period_start(now, self.interval)
+                for _ in range(self.premake + 1):
+                    end = next_period(start, self.interval)
+                    # Период уже покрыт (в том числе секцией с другим интервалом)
+                    if not any(p['start'] < end and start < p['end'] for p in existing):
+                        created.append(self._create_partition(cur, start, end))
+                        conn.commit()
+                    start = end
+        if created:
+            logger.info(f"Created partitions: {', '.join(created)}")
+        return created
+
+    def _create_partition(self, cur, start, end):
+        name = partition_name(start, self.interval)
+        table, partition = sql.Identifier(TABLE), sql.Identifier(name)
+        check = sql.Identifier(f'{name}_bounds')
+        bounds = (start, end)
+        cur.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(partition, table))
+        # С CHECK по границам ATTACH не сканирует новую таблицу
+        cur.execute(
+            sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} CHECK (timestamp >= %s AND timestamp < %s)").format(partition, check),
+            bounds
+        )
+        # Строки периода, уже попавшие в секцию по умолчанию, переезжают в новую секцию.
+        # Триггеры transactions при этом не срабатывают: строки уже учтены в счетчиках.
+        cur.execute(
+            sql.SQL("""
+                WITH moved AS (
+                    DELETE FROM {} WHERE timestamp >= %s AND timestamp < %s RETURNING *
+                )
+                INSERT INTO {} SELECT * FROM moved
+            """).format(sql.Identifier(DEFAULT_PARTITION), partition),
+            bounds
+        )
+        cur.execute(
+            sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(table, partition),
+            bounds
+        )
+        cur.execute(sql.SQL("ALTER TABLE {} DROP CONSTRAINT {}").format(partition, check))
+        return name
+
+    def apply_retention(self, now=None):
+        """
+        Архивирует и удаляет секции, которые целиком старше retention_days,
+        и удаляет устаревшие минутные счетчики. Возвращает пути архивов.
+        """
+        archived = []
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                now = now or self._now(cur)
+                partitions = self._partitions(cur)
+                if self.counter_retention_days:
+                    cur.execute(
+                        "DELETE FROM user_minute_counters WHERE minute < %s",
+                        (now - timedelta(days=self.counter_retention_days),)
+                    )
+                    conn.commit()
+            if not self.retention_days:
+                return archived
+            if self.archive_dir is None:
+                raise ValueError("Для архивации секций нужен archive_dir")
+
+            cutoff = now - timedelta(days=self.retention_days)
+            for partition in partitions:
+                if partition['end'] is None or partition['end'] > cutoff:
+                    continue
+                try:
+                    archived.append(self._archive_partition(conn, partition))
+                    conn.commit()
+                except (psycopg2.Error, OSError) as e:
+                    conn.rollback()
+                    logger.error(f"Error archiving partition {partition['name']}: {e}")
+        return archived
+
+    def _archive_partition(self, conn, partition):
+        """Потоково выгружает секцию в <archive_dir>/<имя>.parquet, отсоединяет и удаляет ее"""
+        name = partition['name']
+        columns = [column for column, _ in ARCHIVE_COLUMNS]
+        with conn.cursor() as cur:
+            # Опоздавшие вставки в эту секцию ждут до конца транзакции, остальные не блокируются
+            cur.execute(sql.SQL("LOCK TABLE {} IN SHARE MODE").format(sql.Identifier(name)))
+
+        target = self.archive_dir / f'{name}.parquet'
+        with conn.cursor(name=f'archive_{name}') as cur:
+            cur.execute(sql.SQL("SELECT {} FROM {} ORDER BY timestamp, id").format(
+                sql.SQL(', ').join(map(sql.Identifier, columns)), sql.Identifier(name)
+            ))
+            # Серверный курсор: в памяти не больше archive_batch_rows строк
+            rows = write_archive(target, iter(lambda: cur.fetchmany(self.archive_batch_rows), []))
+        manifest = {
+            'table': TABLE,
+            'partition': name,
+            'start': partition['start'].isoformat(),
+            'end': partition['end'].isoformat(),
+            'rows': rows,
+            'columns': columns,
+            'archived_at': datetime.now().isoformat()
+        }
+        (self.archive_dir / f'{name}.json').write_text(json.dumps(manifest, indent=2), encoding='utf-8')
+
+        # Если транзакция не зафиксируется, секция останется в БД и будет выгружена повторно
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                sql.Identifier(TABLE), sql.Identifier(name)
+            ))
+            cur.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(name)))
+        logger.info(f"Archived partition {name}: {rows} rows -> {target}")
+        return target
+
+    def maintain(self, now=None):
+        """Плановое обслуживание: будущие секции и архивация старых"""
+        return {
+            'created': self.ensure_partitions(now),
+            'archived': [str(path) for path in self.apply_retention(now)]
+        }
+
+def make_partition_manager(pool):
+    """PartitionManager с настройками из PARTITION_CONFIG"""
+    return PartitionManager(
+        pool,
+        interval=PARTITION_CONFIG['interval'],
+        premake=PARTITION_CONFIG['premake'],
+        retention_days=PARTITION_CONFIG['retention_days'],
+        archive_dir=PARTITION_CONFIG['archive_dir'] or None,
+        counter_retention_days=PARTITION_CONFIG['counter_retention_days'],
+        archive_batch_rows=PARTITION_CONFIG['archive_batch_rows']
+    )
@@ -0,0 +1,135 @@
+"""
+КЭШ ПАТТЕРНОВ МОШЕННИЧЕСТВА
+Таблица fraud_patterns меняется редко: паттерны читаются один раз и
+перечитываются по TTL или после NOTIFY fraud_patterns_changed из триггера в init.sql
+"""
+
+import asyncio
+import logging
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+from src.db_pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'fraud_patterns_changed'
+
+class FraudPatternCache:
+    """
+    loader() -> список паттернов. Кэш перечитывает их, когда истек ttl
+    или вызван invalidate(). Если перечитать не удалось, отдаются прежние паттерны.
+    """
+
+    def __init__(self, loader, ttl=300.0):
+        self.loader = loader
+        self.ttl = ttl
+        self._patterns = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+        # asyncio.Lock создается в первом get_async(): он привязан к циклу событий
+        self._async_lock = None
+        self._async_lock_loop = None
+        self._listener = None
+        self._stop = threading.Event()
+
+    def _fresh(self):
+        return not self._stale and time.monotonic() - self._loaded_at < self.ttl
+
+    def _store(self, patterns):
+        self._patterns = list(patterns)
+        self._loaded_at = time.monotonic()
+        return self._patterns
+
+    def _failed(self, error):
+        logger.error(f"Error loading fraud patterns: {error}")
+        self._stale = True
+        return self._patterns if self._patterns is not None else []
+
+    def get(self):
+        """Паттерны из кэша; обращение к БД только при первом вызове, по TTL или после invalidate"""
+        with self._lock:
+            if self._fresh():
+                return self._patterns
+            # Сбрасываем флаг до загрузки: invalidate во время чтения вызовет повторное чтение
+            self._stale = False
+            try:
+                return self._store(self.loader())
+            except Exception as e:
+                return self._failed(e)
+
+    def _get_async_lock(self):
+        loop = asyncio.get_running_loop()
+        if self._async_lock is None or self._async_lock_loop is not loop:
+            self._async_lock = asyncio.Lock()
+            self._async_lock_loop = loop
+        return self._async_lock
+
+    async def get_async(self, loader):
+        """Как get(), но loader - корутина (AsyncDatabaseManager); одновременные вызовы ждут одну загрузку"""
+        if self._fresh():
+            return self._patterns
+        async with self._get_async_lock():
+            if self._fresh():
+                return self._patterns
+            self._stale = False
+            try:
+                patterns = await loader()
+            except Exception as e:
+                with self._lock:
+                    return self._failed(e)
+            with self._lock:
+                return self._store(patterns)
+
+    def invalidate(self):
+        """Следующий get() перечитает паттерны"""
+        self._stale = True
+
+    def start_listener(self, connect, channel=NOTIFY_CHANNEL, reconnect_delay=5.0):
+        """
+        Слушает NOTIFY в отдельном потоке и сбрасывает кэш при изменении таблицы.
+        connect() -> новое соединение psycopg2, которое поток держит открытым.
+        """
+        if self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(
+            target=self._listen, args=(connect, channel, reconnect_delay),
+            name='fraud-patterns-listener', daemon=True
+        )
+        self._listener.start()
+
+    def stop_listener(self, timeout=5.0):
+        if self._listener is not None:
+            self._stop.set()
+            self._listener.join(timeout)
+            self._listener = None
+
+    def _listen(self, connect, channel, reconnect_delay):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = connect()
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {channel}")
+                # Пока соединения не было, уведомления могли потеряться
+                self.invalidate()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        conn.notifies.clear()
+                        self.invalidate()
+            except (PoolError, psycopg2.Error) as e:
+                logger.warning(f"fraud patterns listener: {e}")
+                self._stop.wait(reconnect_delay)
+            finally:
+                if conn is not None:
+                    conn.close()
@@ -4,22 +4,198 @@
 Обновленная версия с созданием всех необходимых колонок
 """
 
+import argparse
+import shutil
+import sys
 import pandas as pd
-import numpy as np
 from pathlib import Path
 
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.dataset_features import FeatureState, build_features, build_features_chunked
+from src.datasets import (
+    DatasetWriter, dataset_exists, dataset_rows, find_dataset, iter_dataset, read_dataset, write_dataset
+)
+from src.parallel_features import build_features_parallel
+
 print(" ПОДГОТАВЛИВАЕМ ДАННЫЕ ДЛЯ ПРОДВИНУТОГО AI...")
 
-def prepare_dataset():
-    """Основная функция подготовки данных"""
+DB_COLUMNS = ['user_id', 'amount', 'merchant', 'timestamp']
+# Порции новых строк в инкрементальном режиме, если --chunk-size не задан
+INCREMENTAL_CHUNK_SIZE = 100_000
+
+def training_export():
+    """Дочитывает из БД новые транзакции (src/db_export.py)"""
+    from src.db_export import make_training_export
+    from src.db_router import get_router
+
+    # Выгрузка читает реплику, если она настроена и не отстает
+    export = make_training_export(get_router().route('export', replica=True))
+    new_chunks = export.export()
+    print(f" Новых порций из БД: {len(new_chunks)}")
+    return export
+
+def load_transactions_from_db():
+    """Вся выгрузка транзакций из БД одним DataFrame"""
+    return training_export().load(columns=DB_COLUMNS)
+
+def print_summary(rows, fraud_count, columns, output_path):
+    fraud_percent = (fraud_count / rows) * 100 if rows else 0.0
+    
+    print(f"\n✅ ДАННЫЕ ПОДГОТОВЛЕНЫ!")
+    print(f"📊 СТАТИСТИКА БЕЗОПАСНОСТИ:")
+    print(f"   • Всего транзакций: {rows:,} шт.")
+    print(f"   • Выявлено подозрительных: {fraud_count:,} шт.") 
+    print(f"   • Уровень риска: {fraud_percent:.1f}%")
+    print(f"   • Создано признаков: {len(columns)}")
+    
+    print(f"\n📋 СОЗДАННЫЕ КОЛОНКИ:")
+    for i, col in enumerate(columns, 1):
+        print(f"   {i:2d}. {col}")
+    
+    print(f"\n💾 Файл сохранен: {output_path}")
+
+def prepare_dataset_chunked(read_chunks, output_path, on_chunk=None):
+    """
+    Порционный режим для входа больше памяти: read_chunks() отдает порции,
+    упорядоченные по времени. Результат записывается по порциям (src/datasets.py)
+    и появляется под именем output_path только целиком; строки в нем идут по времени.
+    Возвращает (строки, мошеннических, колонки, путь файла).
+    """
+    writer = DatasetWriter(output_path)
+    summary = {'fraud_count': 0, 'columns': []}
     
-    if not Path("dummy_transactions.csv").exists():
-        print(" Файл dummy_transactions.csv не найден!")
+    def write_chunk(features):
+        writer.write(features)
+        summary['fraud_count'] += int(features["is_fraud"].sum())
+        summary['columns'] = list(features.columns)
+        if on_chunk:
+            on_chunk(len(features))
+    
+    try:
+        rows = build_features_chunked(read_chunks, write_chunk)
+        if not rows:
+            raise ValueError("Нет транзакций для подготовки")
+    except BaseException:
+        writer.abort()
+        raise
+    return rows, summary['fraud_count'], summary['columns'], writer.close()
+
+def incremental_state_path(output_path):
+    """Каталог состояния инкрементального режима рядом с результатом: prepared_transactions.state"""
+    return Path(output_path).with_suffix('.state')
+
+def drop_incremental_state(output_path):
+    """Полная пересборка заменила результат: прежнее состояние к нему больше не относится"""
+    shutil.rmtree(incremental_state_path(output_path), ignore_errors=True)
+
+def prepare_dataset_incremental(read_new, output_path, on_chunk=None):
+    """
+    Инкрементальный режим: признаки считаются только для новых транзакций
+    и дописываются в конец output_path (новой частью, без перезаписи прежних строк), а статистики пользователей, хвосты окон
+    и лаги берутся из состояния прошлого запуска (FeatureState) и обновляются.
+    Новые строки получают те же значения, что при пересборке всей истории;
+    у уже записанных строк признаки остаются на момент их подготовки.
+    read_new(meta) получает позицию источника прошлого запуска ({} при первом)
+    и возвращает (read_chunks, position): порции новых строк по времени
+    и позицию после них для следующего запуска.
+    Возвращает (новых строк, мошеннических среди них, колонки, путь файла или каталога частей).
+    """
+    state_path = incremental_state_path(output_path)
+    state, meta = FeatureState.load(state_path)
+    if state is not None:
+        # Первый запуск пишет файл, следующие - части в каталоге prepared_transactions/
+        source = find_dataset(output_path)
+        if source is None or source.name != meta['output'] or dataset_rows(output_path) != meta['rows']:
+            raise ValueError(f"{source or output_path} не совпадает с состоянием {state_path}: "
+                             f"удалите оба для полной пересборки")
+    else:
+        state, meta = FeatureState(), {'rows': 0, 'position': {}}
+    writer = DatasetWriter(output_path, append=meta['rows'] > 0)
+    read_chunks, position = read_new(meta['position'])
+    summary = {'fraud_count': 0, 'columns': []}
+    
+    def write_chunk(features):
+        writer.write(features)
+        summary['fraud_count'] += int(features["is_fraud"].sum())
+        summary['columns'] = list(features.columns)
+        if on_chunk:
+            on_chunk(len(features))
+    
+    try:
+        rows = build_features_chunked(read_chunks, write_chunk, state)
+        if not rows and not meta['rows']:
+            raise ValueError("Нет транзакций для подготовки")
+    except BaseException:
+        writer.abort()
+        raise
+    saved = writer.close()
+    if rows:
+        # Сначала результат, потом состояние: после сбоя между ними число строк не совпадет
+        state.save(state_path, {'output': saved.name, 'rows': meta['rows'] + rows, 'position': position})
+    return rows, summary['fraud_count'], summary['columns'], saved
+
+def prepare_dataset(from_db=False, chunk_size=None, incremental=False, workers=None):
+    """
+    Основная функция подготовки данных; chunk_size - порционный режим,
+    incremental - только новые строки, workers - пул процессов по пользователям
+    """
+    
+    if not from_db and not dataset_exists("dummy_transactions.csv"):
+        print(" Набор dummy_transactions (.parquet или .csv) не найден!")
         print(" Сначала запустите: python dummy_data_gen.py")
         return False
     
+    output_path = "prepared_transactions.csv"
     try:
-        transactions = pd.read_csv("dummy_transactions.csv")
+        if incremental:
+            print(" ДОПИСЫВАЕМ ПРИЗНАКИ НОВЫХ ТРАНЗАКЦИЙ...")
+            chunk_size = chunk_size or INCREMENTAL_CHUNK_SIZE
+            if from_db:
+                export = training_export()
+                
+                def read_new(position):
+                    paths = export.chunk_paths()[position.get('db_chunks', 0):]
+                    read_chunks = lambda: export.iter_chunks(columns=DB_COLUMNS, paths=paths)
+                    return read_chunks, {'db_chunks': position.get('db_chunks', 0) + len(paths)}
+            else:
+                def read_new(position):
+                    # dummy_transactions только дописывается: новые строки - после прочитанных
+                    start = position.get('input_rows', 0)
+                    read_chunks = lambda: iter_dataset("dummy_transactions.csv", chunk_size, start=start)
+                    return read_chunks, {'input_rows': dataset_rows("dummy_transactions.csv")}
+            
+            rows, fraud_count, columns, saved = prepare_dataset_incremental(read_new, output_path)
+            if not rows:
+                print(" Новых транзакций нет")
+                return True
+            print(f" Дописано {rows:,} новых транзакций")
+            print_summary(rows, fraud_count, columns, saved)
+            return True
+        
+        if chunk_size:
+            print(" СОЗДАЕМ ПРИЗНАКИ ПОРЦИЯМИ...")
+            if from_db:
+                export = training_export()
+                read_chunks = lambda: export.iter_chunks(columns=DB_COLUMNS)
+            else:
+                read_chunks = lambda: iter_dataset("dummy_transactions.csv", chunk_size)
+            processed = {'rows': 0}
+            
+            def progress(rows):
+                processed['rows'] += rows
+                print(f"   • обработано {processed['rows']:,} транзакций")
+            
+            rows, fraud_count, columns, saved = prepare_dataset_chunked(read_chunks, output_path, progress)
+            drop_incremental_state(output_path)
+            print_summary(rows, fraud_count, columns, saved)
+            return True
+        
+        if from_db:
+            transactions = load_transactions_from_db()
+        else:
+            transactions = read_dataset("dummy_transactions.csv")
         print(f" Загружено {len(transactions):,} транзакций")
         
         if 'user_id' not in transactions.columns:
@@ -33,84 +209,16 @@ def prepare_dataset():
             print("  Колонка timestamp не найдена, создаем фиктивные даты...")
             transactions["timestamp"] = pd.date_range(start='2024-01-01', periods=len(transactions), freq='H')
         
-        print(" СОЗДАЕМ ПРИЗНАКИ ДЛЯ AI...")
-        
-        print("1. Базовые статистики по пользователям...")
-        user_stats = transactions.groupby('user_id').agg({
-            'amount': ['mean', 'std', 'min', 'max', 'count']
-        }).round(2)
-        user_stats.columns = ['user_mean', 'user_std', 'user_min', 'user_max', 'user_count']
-        transactions = transactions.merge(user_stats, on='user_id', how='left')
-        
-        print("2. Временные особенности...")
-        transactions["hour"] = transactions["timestamp"].dt.hour
-        transactions["day_of_week"] = transactions["timestamp"].dt.dayofweek
-        transactions["is_weekend"] = transactions["day_of_week"].isin([5, 6]).astype(int)
-        transactions["month"] = transactions["timestamp"].dt.month
-        
-        print("3. Поведенческие паттерны...")
-        
-        transactions["total_1h"] = (
-            transactions.groupby("user_id", group_keys=False)
-            .apply(lambda g: g.rolling("1h", on="timestamp")["amount"].sum())
-        ).fillna(0)
-        
-        transactions["count_1h"] = (
-            transactions.groupby("user_id", group_keys=False)
-            .apply(lambda g: g.rolling("1h", on="timestamp")["amount"].count())
-        ).fillna(0)
-        
-        for lag in range(1, 4):
-            transactions[f"prev_amount_{lag}"] = (
-                transactions.groupby("user_id")["amount"].shift(lag).fillna(0)
-            )
-        
-        transactions["amount_ratio"] = (
-            transactions["amount"] / transactions.groupby("user_id")["amount"].shift(1)
-        ).replace([np.inf, -np.inf], 1).fillna(1)
-        
-        transactions["time_diff_sec"] = (
-            transactions.groupby("user_id")["timestamp"].diff().dt.total_seconds().fillna(0)
-        )
-        
-        print("4. Статистические аномалии...")
-        transactions["amount_zscore"] = np.abs(
-            (transactions["amount"] - transactions["amount"].mean()) / transactions["amount"].std()
-        ).fillna(0)
-        
-        transactions["user_amount_zscore"] = transactions.groupby("user_id")["amount"].transform(
-            lambda x: np.abs((x - x.mean()) / x.std()) if x.std() > 0 else 0
-        ).fillna(0)
-        
-        print("5. Определяем целевые переменные...")
-        
-        transactions["is_fraud"] = (
-            (transactions["amount"] > 10_000_000) |                           # Очень крупные суммы
-            (transactions["amount"] < 1000) |                                # Очень мелкие суммы
-            (transactions["count_1h"] > 8) |                                 # Слишком много операций в час
-            (transactions["total_1h"] > 15_000_000) |                        # Большие суммы за час
-            (transactions["time_diff_sec"] < 60) |                           # Операции менее чем за минуту
-            (transactions["amount_zscore"] > 3)                              # Статистические аномалии
-        ).astype(int)
-        
-        output_path = "prepared_transactions.csv"
-        transactions.to_csv(output_path, index=False)
-        
-        fraud_count = transactions["is_fraud"].sum()
-        fraud_percent = (fraud_count / len(transactions)) * 100
-        
-        print(f"\n✅ ДАННЫЕ ПОДГОТОВЛЕНЫ!")
-        print(f"📊 СТАТИСТИКА БЕЗОПАСНОСТИ:")
-        print(f"   • Всего транзакций: {len(transactions):,} шт.")
-        print(f"   • Выявлено подозрительных: {fraud_count:,} шт.") 
-        print(f"   • Уровень риска: {fraud_percent:.1f}%")
-        print(f"   • Создано признаков: {len(transactions.columns)}")
-        
-        print(f"\n📋 СОЗДАННЫЕ КОЛОНКИ:")
-        for i, col in enumerate(transactions.columns, 1):
-            print(f"   {i:2d}. {col}")
+        print(" СОЗДАЕМ ПРИЗНАКИ ДЛЯ AI (статистики пользователей, время, окна и лаги, аномалии, цель)...")
+        if workers and workers > 1:
+            print(f" Шарды по user_id в {workers} процессах")
+            transactions = build_features_parallel(transactions, workers)
+        else:
+            transactions = build_features(transactions)
+        saved = write_dataset(transactions, output_path)
+        drop_incremental_state(output_path)
         
-        print(f"\n💾 Файл сохранен: {output_path}")
+        print_summary(len(transactions), int(transactions["is_fraud"].sum()), list(transactions.columns), saved)
         return True
         
     except Exception as e:
@@ -118,7 +226,19 @@ def prepare_dataset():
         return False
 
 if __name__ == "__main__":
-    success = prepare_dataset()
+    parser = argparse.ArgumentParser(description="Подготовка данных для AI")
+    parser.add_argument("--from-db", action="store_true",
+                        help="транзакции из таблицы transactions вместо dummy_transactions.csv")
+    parser.add_argument("--chunk-size", type=int,
+                        help="порционный режим для входа, упорядоченного по времени (больше памяти)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="дописать признаки только новых транзакций (состояние в prepared_transactions.state)")
+    parser.add_argument("--workers", type=int,
+                        help="считать признаки в N процессах, шарды по хешу user_id (расчет в памяти); "
+                             "выигрыш только при N не больше числа ядер")
+    args = parser.parse_args()
+    success = prepare_dataset(from_db=args.from_db, chunk_size=args.chunk_size,
+                              incremental=args.incremental, workers=args.workers)
     
     if success:
         print("\n🎯 ДЛЯ ПРОДОЛЖЕНИЯ ЗАПУСТИТЕ:")
@@ -0,0 +1,102 @@
+"""
+МИКРОБАТЧИНГ ЗАПРОСОВ
+Собирает одновременные запросы в один пакет для одного вызова ансамбля
+"""
+
+import asyncio
+import inspect
+import time
+
+from prometheus_client import Histogram
+
+COALESCER_BATCH_SIZE = Histogram(
+    'fraud_coalescer_batch_size',
+    'Number of requests scored in one coalesced batch',
+    buckets=[1, 2, 4, 8, 16, 32, 64, 128, 256]
+)
+COALESCER_QUEUE_WAIT = Histogram(
+    'fraud_coalescer_queue_wait_seconds',
+    'Time a request waits in the coalescer before its batch is scored',
+    buckets=[0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1]
+)
+
+class RequestCoalescer:
+    """
+    Копит запросы, пришедшие в течение max_wait_ms (или до max_batch штук),
+    и оценивает их одним вызовом score_batch(items) -> list результатов
+    (score_batch может быть обычной функцией или корутиной).
+    Каждый вызывающий получает свой результат через future.
+    """
+
+    def __init__(self, score_batch, max_batch=64, max_wait_ms=2.0):
+        self.score_batch = score_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._timer = None
+        # asyncio хранит задачи только по слабой ссылке - держим их сами
+        self._tasks = set()
+
+    async def submit(self, item):
+        """Ставит запрос в очередь и ждет его результат"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Забирает накопленные запросы и запускает их оценку"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """
+        Остановка: оценивает накопленные запросы и ждет запущенные пакеты.
+        Если пакет не успел завершиться, его запросы получают ошибку.
+        """
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run_batch(self, batch):
+        started = time.perf_counter()
+        COALESCER_BATCH_SIZE.observe(len(batch))
+        for _, _, enqueued in batch:
+            COALESCER_QUEUE_WAIT.observe(started - enqueued)
+
+        try:
+            results = self.score_batch([item for item, _, _ in batch])
+            if inspect.isawaitable(results):
+                results = await results
+        except BaseException as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e if isinstance(e, Exception) else RuntimeError("Пакет прерван"))
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        results = list(results)
+        if len(results) != len(batch):
+            error = RuntimeError(f"Пакетная функция вернула {len(results)} результатов на {len(batch)} запросов")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
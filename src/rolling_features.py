@@ -0,0 +1,127 @@
+"""
+СКОЛЬЗЯЩИЕ ОКНА ПО ПОЛЬЗОВАТЕЛЯМ
+Сумма, число и среднее операций пользователя за несколько окон (5m, 1h, 24h, 7d)
+за один проход по массивам, отсортированным по (user_id, timestamp):
+накопленные суммы плюс np.searchsorted для начала каждого окна, без цикла по пользователям.
+Окно то же, что у rolling("1h", on="timestamp") в pandas: (t - окно, t], строки
+с тем же временем после текущей в окно не входят.
+"""
+
+import numpy as np
+import pandas as pd
+
+WINDOWS = {
+    '5m': pd.Timedelta(minutes=5),
+    '1h': pd.Timedelta(hours=1),
+    '24h': pd.Timedelta(hours=24),
+    '7d': pd.Timedelta(days=7),
+}
+
+# Ключи (пользователь, время) сводятся к одному int64; запас от переполнения
+_MAX_KEY = 2 ** 62
+# Целые суммы до 2**53 складываются в float64 без ошибок округления
+_EXACT_INT = 2 ** 53
+
+def _group_bounds(users):
+    """Номера групп и индексы начала групп для отсортированных users"""
+    users = np.asarray(users)
+    if len(users) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    starts = np.flatnonzero(np.concatenate(([True], users[1:] != users[:-1])))
+    groups = np.zeros(len(users), dtype=np.int64)
+    groups[starts[1:]] = 1
+    return np.cumsum(groups), starts
+
+def window_starts(groups, group_starts, times, widths):
+    """
+    Для каждой ширины окна - индекс первой строки окна (t - ширина, t] той же группы.
+    groups, times (int64, нс) отсортированы по (группа, время).
+    """
+    if len(times) == 0:
+        return [np.zeros(0, dtype=np.int64) for _ in widths]
+    origin = times.min()
+    offsets = times - origin
+    # Общий шаг времени: для данных с точностью до секунды ключи в 10**9 раз меньше
+    step = int(np.gcd.reduce(np.concatenate((offsets, np.asarray(widths, dtype=np.int64)))))
+    step = step or 1
+    offsets //= step
+    steps = [width // step for width in widths]
+    stride = int(offsets.max()) + max(steps) + 1
+
+    # Группы берутся пачками, чтобы группа * stride + время поместилось в int64
+    per_batch = max(_MAX_KEY // stride, 1)
+    starts = [np.empty(len(times), dtype=np.int64) for _ in widths]
+    n_groups = len(group_starts)
+    for first in range(0, n_groups, per_batch):
+        last = min(first + per_batch, n_groups)
+        lo = group_starts[first]
+        hi = group_starts[last] if last < n_groups else len(times)
+        keys = (groups[lo:hi] - first) * stride + offsets[lo:hi]
+        for out, width in zip(starts, steps):
+            # Окно строки не заходит в предыдущую группу: между группами зазор больше ширины
+            out[lo:hi] = lo + np.searchsorted(keys, keys - width, side='right')
+    return starts
+
+def _prefix_sums(amounts):
+    """Накопленные суммы с нулем в начале; для целых сумм - точные (int64)"""
+    finite = amounts[~np.isnan(amounts)]
+    if np.array_equal(finite, np.round(finite)) and np.abs(finite).sum() < _EXACT_INT:
+        values = np.nan_to_num(amounts).astype(np.int64)
+    else:
+        values = np.nan_to_num(amounts).astype(np.longdouble)
+    return np.concatenate(([0], np.cumsum(values)))
+
+def _is_grouped(users, groups, times):
+    """Строки пользователя идут подряд и по возрастанию времени"""
+    if len(times) and groups[-1] + 1 != len(pd.unique(users)):
+        return False
+    same_user = groups[1:] == groups[:-1]
+    return bool(np.all(times[1:][same_user] >= times[:-1][same_user]))
+
+def rolling_window_features(users, timestamps, amounts, windows=None):
+    """
+    Признаки total_<окно>, count_<окно>, mean_<окно>. Быстрее всего для строк,
+    отсортированных по (users, timestamps); иначе строки сортируются внутри
+    (устойчиво, как groupby в pandas). NaN в amounts не учитывается, как в pandas rolling.
+    Возвращает словарь массивов float64 в порядке исходных строк.
+    """
+    windows = WINDOWS if windows is None else windows
+    users = np.asarray(users)
+    amounts = np.asarray(amounts, dtype=np.float64)
+    times = np.asarray(pd.to_datetime(timestamps), dtype='datetime64[ns]').view(np.int64)
+    groups, group_starts = _group_bounds(users)
+    if not _is_grouped(users, groups, times):
+        order = np.lexsort((times, pd.factorize(users)[0]))
+        features = rolling_window_features(users[order], times[order].view('datetime64[ns]'), amounts[order], windows)
+        restored = {}
+        for name, values in features.items():
+            restored[name] = np.empty_like(values)
+            restored[name][order] = values
+        return restored
+
+    widths = [pd.Timedelta(width).value for width in windows.values()]
+    starts = window_starts(groups, group_starts, times, widths)
+
+    sums = _prefix_sums(amounts)
+    counts = np.concatenate(([0], np.cumsum(~np.isnan(amounts), dtype=np.int64)))
+    ends = np.arange(1, len(amounts) + 1)
+    features = {}
+    for name, start in zip(windows, starts):
+        count = (counts[ends] - counts[start]).astype(np.float64)
+        total = (sums[ends] - sums[start]).astype(np.float64)
+        features[f'total_{name}'] = total
+        features[f'count_{name}'] = count
+        features[f'mean_{name}'] = np.divide(total, count, out=np.zeros_like(total), where=count > 0)
+    return features
+
+def add_rolling_features(transactions, windows=None):
+    """Добавляет в DataFrame колонки total_/count_/mean_ для каждого окна"""
+    features = rolling_window_features(
+        transactions['user_id'].to_numpy(),
+        transactions['timestamp'],
+        transactions['amount'].to_numpy(),
+        windows
+    )
+    for name, values in features.items():
+        transactions[name] = values
+    return transactions
@@ -4,11 +4,22 @@ import psycopg2
 from datetime import datetime
 import uvicorn
 import os
+import sys
+from pathlib import Path
 from prometheus_client import Counter, Histogram, generate_latest, REGISTRY
 from prometheus_client import CONTENT_TYPE_LATEST
 
 print(" ЗАПУСК API С МЕТРИКАМИ...")
 
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.config import WRITE_BEHIND_CONFIG
+from src.db_pool import PoolError, get_pool
+from src.db_router import get_router
+from src.partitions import make_partition_manager
+from src.write_behind import make_writer
+
 app = FastAPI(
     title="Fraud Detection API",
     description="API для обнаружения мошенничества с метриками Prometheus",
@@ -30,20 +41,34 @@ class FraudResponse(BaseModel):
     message: str
     timestamp: str
 
-def get_db_connection():
-    """Подключение к базе данных"""
+db_pool = get_pool()
+# Записи - в основную БД, /stats - в реплику, если она настроена (DB_REPLICA_CONFIG)
+db_router = get_router()
+
+# Результаты проверок пишутся в БД пачками в фоне, /check не ждет INSERT
+transaction_writer = None
+if WRITE_BEHIND_CONFIG["enabled"]:
+    transaction_writer = make_writer(
+        db_pool, "transactions", ("user_id", "amount", "is_fraud", "fraud_score", "risk_level", "timestamp")
+    )
+
+@app.on_event("startup")
+def startup_event():
+    """Открывает min_size соединений пулов заранее, создает секции transactions и запускает фоновую запись"""
+    db_router.open()
     try:
-        conn = psycopg2.connect(
-            dbname="fraud_db",
-            user="admin",
-            password="password",
-            host="db",
-            port="5432"
-        )
-        return conn
-    except Exception as e:
-        print(f" Ошибка подключения к БД: {e}")
-        return None
+        make_partition_manager(db_pool).ensure_partitions()
+    except (PoolError, psycopg2.Error) as e:
+        print(f" Секции transactions не созданы: {e}")
+    if transaction_writer:
+        transaction_writer.start()
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Дописывает очередь до закрытия пула"""
+    if transaction_writer:
+        transaction_writer.close()
+    db_router.close()
 
 @app.get("/metrics")
 def metrics():
@@ -64,11 +89,20 @@ def root():
 def health_check():
     REQUEST_COUNT.labels(method='GET', endpoint='/health', status_code='200').inc()
     
-    db_status = "connected" if get_db_connection() else "disconnected"
+    try:
+        with db_router.connection('health') as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        db_status = "connected"
+    except (PoolError, psycopg2.Error) as e:
+        print(f" Ошибка подключения к БД: {e}")
+        db_status = "disconnected"
     
     return {
         "status": "healthy",
         "database": db_status,
+        "db_pool": db_pool.stats(),
+        "db_routing": db_router.stats(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -76,30 +110,28 @@ def health_check():
 def get_stats():
     REQUEST_COUNT.labels(method='GET', endpoint='/stats', status_code='200').inc()
     
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Database not available"}
-    
     try:
-        with conn.cursor() as cur:
-            cur.execute("""
-                SELECT 
-                    COUNT(*) as total_transactions,
-                    SUM(CASE WHEN is_fraud THEN 1 ELSE 0 END) as fraud_count,
-                    AVG(amount) as avg_amount
-                FROM transactions
-            """)
-            result = cur.fetchone()
-            
-            return {
-                "total_transactions": result[0],
-                "fraud_count": result[1],
-                "avg_amount": float(result[2]) if result[2] else 0
-            }
+        with db_router.connection('stats', replica=True) as conn:
+            with conn.cursor() as cur:
+                # Сводка по уровням риска, которую поддерживает триггер (init.sql)
+                cur.execute("""
+                    SELECT 
+                        COALESCE(SUM(tx_count), 0)::bigint as total_transactions,
+                        SUM(fraud_count)::bigint as fraud_count,
+                        SUM(amount_sum) / NULLIF(SUM(tx_count), 0) as avg_amount
+                    FROM rollup_risk_level
+                """)
+                result = cur.fetchone()
+    except PoolError:
+        return {"error": "Database not available"}
     except Exception as e:
         return {"error": str(e)}
-    finally:
-        conn.close()
+    
+    return {
+        "total_transactions": result[0],
+        "fraud_count": result[1],
+        "avg_amount": float(result[2]) if result[2] else 0
+    }
 
 @app.post("/check", response_model=FraudResponse)
 def check_transaction(transaction: TransactionRequest):
@@ -135,28 +167,31 @@ def check_transaction(transaction: TransactionRequest):
         
         FRAUD_TRANSACTIONS.labels(risk_level=risk_level).inc()
         
-        conn = get_db_connection()
-        if conn:
+        # Время проверки, а не записи: при отложенной записи строка попадает в БД позже
+        checked_at = datetime.now()
+        row = (transaction.user_id, transaction.amount, is_suspicious, risk_score, risk_level, checked_at)
+        if transaction_writer:
+            transaction_writer.submit(row)
+        else:
             try:
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO transactions 
-                        (user_id, amount, is_fraud, fraud_score, risk_level) 
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (transaction.user_id, transaction.amount, is_suspicious, risk_score, risk_level))
+                with db_router.connection('check_insert') as conn:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            INSERT INTO transactions 
+                            (user_id, amount, is_fraud, fraud_score, risk_level, timestamp) 
+                            VALUES (%s, %s, %s, %s, %s, %s)
+                        """, row)
                     conn.commit()
                     print(" Данные сохранены в БД")
             except Exception as e:
                 print(f" Ошибка сохранения в БД: {e}")
-            finally:
-                conn.close()
         
         response = FraudResponse(
             is_suspicious=is_suspicious,
             risk_score=round(risk_score, 3),
             risk_level=risk_level,
             message=message,
-            timestamp=datetime.now().isoformat()
+            timestamp=checked_at.isoformat()
         )
         
         print(f" Результат: {risk_level} риск (score: {risk_score:.3f})")
@@ -0,0 +1,151 @@
+"""
+СНИМКИ СОСТОЯНИЯ ОБСЛУЖИВАНИЯ
+Хранилище признаков и счетчики API периодически сохраняются в каталог снимка:
+массивы .npy (открываются через mmap), идентификаторы пользователей одним блоком
+и index.json с водяным знаком. После перезапуска снимок загружается за доли секунды,
+а транзакции новее водяного знака дочитываются из БД.
+"""
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from src.feature_store import OnlineFeatureStore
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+CURRENT_FILE = 'CURRENT'
+USER_SEPARATOR = '\x00'
+
+def _fsync_dir(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write_synced(path, write):
+    with open(path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+def save_snapshot(root, store, counters=None, keep=2):
+    """
+    Пишет снимок в новый каталог root/snapshot-<время> и переключает на него
+    файл CURRENT атомарной заменой. Снимок, на который указывает CURRENT,
+    всегда полный: прерванная запись оставляет только временный каталог.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    users, state, clock = store.export_state()
+    user_ids = [str(user) for user in users]
+    if any(USER_SEPARATOR in user for user in user_ids):
+        raise ValueError("Идентификатор пользователя содержит \\x00")
+
+    created_at = time.time()
+    index = {
+        'version': SNAPSHOT_VERSION,
+        'created_at': created_at,
+        'users': len(user_ids),
+        'history': store.history,
+        'window_sec': store.window_sec,
+        # Водяной знак: все события не позже него уже учтены в снимке
+        'watermark': {'event_time': clock, 'wall_time': created_at},
+        'counters': dict(counters or {})
+    }
+
+    staging = Path(tempfile.mkdtemp(prefix='.snapshot-', dir=root))
+    try:
+        for name, array in state.items():
+            _write_synced(staging / f'{name}.npy', lambda f, a=array: np.save(f, np.ascontiguousarray(a)))
+        _write_synced(staging / 'users.bin', lambda f: f.write(USER_SEPARATOR.join(user_ids).encode('utf-8')))
+        _write_synced(staging / 'index.json', lambda f: f.write(json.dumps(index, indent=2).encode('utf-8')))
+
+        name = f"snapshot-{datetime.fromtimestamp(created_at).strftime('%Y%m%d%H%M%S%f')}"
+        os.replace(staging, root / name)
+        _fsync_dir(root)
+
+        current_tmp = root / f'.{CURRENT_FILE}.tmp'
+        _write_synced(current_tmp, lambda f: f.write(name.encode('utf-8')))
+        os.replace(current_tmp, root / CURRENT_FILE)
+        _fsync_dir(root)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    _prune(root, name, keep)
+    return root / name
+
+def _prune(root, current, keep):
+    """Удаляет старые снимки, оставляя keep последних (включая текущий)"""
+    snapshots = sorted(p for p in root.glob('snapshot-*') if p.is_dir())
+    for path in snapshots[:-keep] if keep else []:
+        if path.name != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+def load_snapshot(root, **store_params):
+    """
+    Загружает снимок, на который указывает CURRENT.
+    Возвращает (OnlineFeatureStore, index) или None, если снимка нет.
+    """
+    root = Path(root)
+    current = root / CURRENT_FILE
+    if not current.exists():
+        return None
+    directory = root / current.read_text(encoding='utf-8').strip()
+
+    with open(directory / 'index.json', encoding='utf-8') as f:
+        index = json.load(f)
+    if index['version'] != SNAPSHOT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия снимка: {index['version']}")
+
+    state = {
+        name.lstrip('_'): np.load(directory / f"{name.lstrip('_')}.npy", mmap_mode='r')
+        for name in OnlineFeatureStore.STATE_ARRAYS
+    }
+    blob = (directory / 'users.bin').read_bytes().decode('utf-8')
+    # Ключи из снимка уникальны, интернирование только замедлило бы загрузку
+    users = blob.split(USER_SEPARATOR) if blob else []
+    if len(users) != index['users']:
+        raise ValueError("Снимок поврежден: число пользователей не совпадает с index.json")
+
+    store_params.setdefault('history', index['history'])
+    store_params.setdefault('window_sec', index['window_sec'])
+    store = OnlineFeatureStore.from_state(users, state, index['watermark']['event_time'], **store_params)
+    return store, index
+
+def replay_transactions(store, rows):
+    """Дописывает в хранилище транзакции (user_id, amount, timestamp) в порядке времени"""
+    count = 0
+    for user_id, amount, timestamp in rows:
+        store.update(user_id, amount, timestamp)
+        count += 1
+    return count
+
+def fetch_transactions_since(pool, since, batch_size=10000):
+    """
+    Транзакции из БД новее водяного знака since (секунды Unix, время сервера БД).
+    Читаются порциями через серверный курсор, чтобы не держать все строки в памяти.
+    """
+    with pool.connection() as conn:
+        with conn.cursor(name='serving_snapshot_replay') as cur:
+            cur.itersize = batch_size
+            cur.execute(
+                """
+                SELECT user_id, amount, timestamp
+                FROM transactions
+                WHERE timestamp > %s
+                ORDER BY timestamp, id
+                """,
+                (datetime.fromtimestamp(since),)
+            )
+            for user_id, amount, timestamp in cur:
+                yield user_id, float(amount), timestamp
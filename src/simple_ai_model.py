@@ -9,13 +9,17 @@ import sys
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
+from src.datasets import read_dataset
+
 print(" СОЗДАЕМ УНИВЕРСАЛЬНУЮ AI МОДЕЛЬ...")
 
 def create_universal_model():
     """Создает простую и надежную модель"""
     
     try:
-        data = pd.read_csv("prepared_transactions.csv")
+        data = read_dataset("prepared_transactions.csv", columns=[
+            'amount', 'total_1h', 'count_1h', 'time_diff_sec', 'hour', 'day_of_week', 'is_fraud'
+        ])
         print(f" Загружено {len(data):,} транзакций")
         
         features = data[['amount']].copy()
@@ -5,10 +5,16 @@ import joblib
 import numpy as np
 from datetime import datetime
 import uvicorn
+import sys
 from pathlib import Path
 
 print(" ЗАПУСК ПРОСТОГО API...")
 
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.feature_store import make_feature_store
+
 app = FastAPI(
     title="Simple Fraud API",
     description="Простой и надежный API для обнаружения мошенничества",
@@ -19,6 +25,8 @@ app = FastAPI(
 
 ai_model = None
 model_loaded = False
+# Скользящие признаки пользователя вместо констант total_1h=0, count_1h=1
+feature_store = make_feature_store()
 
 class TransactionRequest(BaseModel):
     amount: float
@@ -95,12 +103,16 @@ def check_transaction(transaction: TransactionRequest):
         try:
             tx_data = {
                 'amount': transaction.amount,
-                'total_1h': 0,  # дефолтные значения
+                'total_1h': 0,  # дефолтные значения без хранилища признаков
                 'count_1h': 1,
                 'time_diff_sec': 3600,
                 'hour': datetime.now().hour,
                 'day_of_week': datetime.now().weekday()
             }
+            if feature_store is not None:
+                velocity = feature_store.update(transaction.user_id, transaction.amount, transaction.timestamp)
+                for name in ('total_1h', 'count_1h', 'time_diff_sec'):
+                    tx_data[name] = velocity[name]
             
             from simple_ai_model import predict_fraud
             ai_score, ai_fraud = predict_fraud(ai_model, tx_data)
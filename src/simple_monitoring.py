@@ -3,6 +3,13 @@ import pandas as pd
 import time
 import threading
 import webbrowser
+from pathlib import Path
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import read_dataset
 
 class SimpleMonitor:
     def __init__(self, port=8000):
@@ -39,7 +46,7 @@ class SimpleMonitor:
     def update_metrics(self):
         """Обновляет метрики из данных"""
         try:
-            data = pd.read_csv("prepared_transactions.csv")
+            data = read_dataset("prepared_transactions.csv", columns=['is_fraud', 'amount'])
             
             total = len(data)
             fraud = data['is_fraud'].sum() if 'is_fraud' in data.columns else 0
@@ -4,6 +4,11 @@ import numpy as np
 from pathlib import Path
 import sys
 
+PROJECT_ROOT = Path(__file__).parent.parent
+sys.path.append(str(PROJECT_ROOT))
+
+from src.datasets import find_dataset, read_dataset
+
 plt.rcParams['font.size'] = 10
 plt.rcParams['figure.figsize'] = (11, 9)
 
@@ -22,8 +27,10 @@ class SimpleFraudAnalyzer:
         
         all_ok = True
         for file, description in files.items():
-            if Path(file).exists():
-                size = Path(file).stat().st_size
+            # .parquet или .csv - какой свежее (src/datasets.py)
+            path = find_dataset(file)
+            if path is not None:
+                size = path.stat().st_size
                 if size > 100:  # файл не пустой
                     print(f"    {description} - ГОТОВ")
                 else:
@@ -47,7 +54,7 @@ class SimpleFraudAnalyzer:
         print("\n ЗАГРУЗКА ДАННЫХ...")
         
         try:
-            self.df = pd.read_csv("prepared_transactions.csv")
+            self.df = read_dataset("prepared_transactions.csv")
             print(f" Загружено {len(self.df):,} транзакций")
             return True
         except:
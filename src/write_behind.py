@@ -0,0 +1,242 @@
+"""
+ОТЛОЖЕННАЯ ЗАПИСЬ В POSTGRESQL (WRITE-BEHIND)
+Запрос кладет строку в ограниченную очередь и сразу отвечает,
+фоновый поток пишет накопленные строки одним многострочным INSERT.
+Если БД недоступна, строки сохраняются в локальный JSONL файл и дописываются позже.
+"""
+
+import json
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+
+import psycopg2
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.config import WRITE_BEHIND_CONFIG
+from src.db_pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+WRITER_QUEUE_DEPTH = Gauge('write_behind_queue_depth', 'Rows waiting in the write-behind queue', ['writer'])
+WRITER_FLUSH_SECONDS = Histogram(
+    'write_behind_flush_seconds', 'Duration of one write-behind flush', ['writer'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+)
+WRITER_BATCH_SIZE = Histogram(
+    'write_behind_batch_size', 'Rows per write-behind flush', ['writer'],
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 5000)
+)
+WRITER_ROWS = Counter(
+    'write_behind_rows_total', 'Rows handled by the write-behind writer', ['writer', 'outcome']
+)
+
+_STOP = object()
+
+class WriteBehindWriter:
+    """
+    Пакетная запись строк в одну таблицу.
+    Сброс происходит по batch_size строк или через flush_interval секунд после первой строки.
+    Переполненная очередь и неудачный сброс уходят в spill_path (если задан), иначе строки теряются
+    и учитываются в write_behind_rows_total{outcome="dropped"}.
+    """
+
+    def __init__(self, pool, table, columns, name=None, max_queue=10000, batch_size=500,
+                 flush_interval=1.0, spill_path=None):
+        self.pool = pool
+        self.table = table
+        self.columns = tuple(columns)
+        self.name = name or table
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = Path(spill_path) if spill_path else None
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Запускает фоновый поток (повторный вызов ничего не делает)"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"write-behind-{self.name}", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def submit(self, row):
+        """Ставит строку в очередь, не дожидаясь записи. False, если строка не принята в очередь"""
+        if len(row) != len(self.columns):
+            raise ValueError(f"Ожидалось {len(self.columns)} значений, получено {len(row)}")
+        try:
+            self._queue.put_nowait(tuple(row))
+        except queue.Full:
+            self._spill([tuple(row)], reason='queue_full')
+            return False
+        WRITER_QUEUE_DEPTH.labels(writer=self.name).set(self._queue.qsize())
+        return True
+
+    def close(self, timeout=10.0):
+        """
+        Дописывает все, что осталось в очереди, и останавливает поток.
+        Если поток не успевает (очередь полна, БД не отвечает), остаток очереди
+        уходит в spill-файл, чтобы остановка не зависла.
+        """
+        if self._thread is None:
+            self._drain_without_thread()
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            logger.error(f"write-behind {self.name}: очередь не освободилась за {timeout} с")
+            self._spill_queued()
+            return
+        self._thread.join(max(deadline - time.monotonic(), 0))
+        if self._thread.is_alive():
+            logger.error(f"write-behind {self.name}: поток не завершился за {timeout} с")
+            self._spill_queued()
+
+    def _spill_queued(self):
+        """Забирает из очереди все строки и сохраняет их в spill-файл"""
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rows.append(item)
+        if rows:
+            self._spill(rows, reason='shutdown')
+
+    def _drain_without_thread(self):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rows.append(item)
+        for start in range(0, len(rows), self.batch_size):
+            self._flush(rows[start:start + self.batch_size])
+
+    def _run(self):
+        self._replay_spill()
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            if self._flush(batch):
+                self._replay_spill()
+
+        # После _STOP в очереди могут остаться строки, принятые до остановки
+        self._drain_without_thread()
+
+    def _insert(self, rows):
+        placeholders = '(' + ', '.join(['%s'] * len(self.columns)) + ')'
+        query = (
+            f"INSERT INTO {self.table} ({', '.join(self.columns)}) VALUES "
+            + ', '.join([placeholders] * len(rows))
+        )
+        params = [value for row in rows for value in row]
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+            conn.commit()
+
+    def _flush(self, rows):
+        """Пишет пачку одним INSERT; при ошибке пачка уходит в spill-файл"""
+        WRITER_QUEUE_DEPTH.labels(writer=self.name).set(self._queue.qsize())
+        started = time.perf_counter()
+        try:
+            self._insert(rows)
+        except (PoolError, psycopg2.Error) as e:
+            logger.warning(f"write-behind {self.name}: запись {len(rows)} строк не удалась: {e}")
+            self._spill(rows, reason='db_error')
+            return False
+        WRITER_FLUSH_SECONDS.labels(writer=self.name).observe(time.perf_counter() - started)
+        WRITER_BATCH_SIZE.labels(writer=self.name).observe(len(rows))
+        WRITER_ROWS.labels(writer=self.name, outcome='written').inc(len(rows))
+        return True
+
+    def _spill(self, rows, reason):
+        if self.spill_path is None:
+            WRITER_ROWS.labels(writer=self.name, outcome='dropped').inc(len(rows))
+            logger.error(f"write-behind {self.name}: потеряно {len(rows)} строк ({reason})")
+            return
+        with self._spill_lock:
+            self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for row in rows:
+                    f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+        WRITER_ROWS.labels(writer=self.name, outcome='spilled').inc(len(rows))
+
+    def _replay_spill(self):
+        """
+        Дописывает в БД строки из spill-файла; недописанный остаток возвращается в файл.
+        Доставка не чаще одного раза не гарантируется: после падения посреди повтора
+        уже записанные пачки будут записаны снова.
+        """
+        if self.spill_path is None:
+            return
+        replay_path = self.spill_path.with_name(self.spill_path.name + '.replay')
+        with self._spill_lock:
+            if self.spill_path.exists():
+                if replay_path.exists():
+                    # Остаток повтора, прерванного падением процесса
+                    with open(replay_path, 'a', encoding='utf-8') as f:
+                        f.write(self.spill_path.read_text(encoding='utf-8'))
+                    self.spill_path.unlink()
+                else:
+                    self.spill_path.replace(replay_path)
+            if not replay_path.exists():
+                return
+
+        with open(replay_path, encoding='utf-8') as f:
+            rows = [tuple(json.loads(line)) for line in f if line.strip()]
+
+        for start in range(0, len(rows), self.batch_size):
+            chunk = rows[start:start + self.batch_size]
+            try:
+                self._insert(chunk)
+            except (PoolError, psycopg2.Error) as e:
+                logger.warning(f"write-behind {self.name}: повтор spill-файла прерван: {e}")
+                with self._spill_lock:
+                    with open(self.spill_path, 'a', encoding='utf-8') as f:
+                        for row in rows[start:]:
+                            f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+                break
+            WRITER_ROWS.labels(writer=self.name, outcome='replayed').inc(len(chunk))
+        replay_path.unlink()
+
+def make_writer(pool, table, columns, name=None):
+    """Writer с настройками из WRITE_BEHIND_CONFIG; spill-файл <spill_dir>/<name>.jsonl"""
+    name = name or table
+    spill_dir = WRITE_BEHIND_CONFIG['spill_dir']
+    return WriteBehindWriter(
+        pool, table, columns, name=name,
+        max_queue=WRITE_BEHIND_CONFIG['max_queue'],
+        batch_size=WRITE_BEHIND_CONFIG['batch_size'],
+        flush_interval=WRITE_BEHIND_CONFIG['flush_interval'],
+        spill_path=Path(spill_dir) / f'{name}.jsonl' if spill_dir else None
+    )
@@ -13,4 +13,36 @@ def sample_transaction():
     return {
         "amount": 50000,
         "user_id": "test_user_123"
-    }
\ No newline at end of file
+    }
+
+def make_training_data(n=400, seed=42):
+    """Небольшой размеченный набор в формате prepared_transactions.csv"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    amount = rng.integers(50_000, 2_000_000, n).astype(float)
+    fraud_idx = rng.choice(n, n // 10, replace=False)
+    amount[fraud_idx] = rng.choice([500.0, 25_000_000.0], len(fraud_idx))
+    data = pd.DataFrame({
+        'user_id': [f'user_{i % 20 + 1:03d}' for i in range(n)],
+        'amount': amount,
+        'timestamp': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 30 * 24 * 60, n), unit='min'),
+        'total_1h': amount * rng.integers(1, 3, n),
+        'count_1h': rng.integers(1, 4, n),
+        'time_diff_sec': rng.integers(0, 86_400, n),
+        'user_mean': 1_000_000.0,
+        'user_std': 500_000.0,
+    })
+    data['is_fraud'] = ((amount > 10_000_000) | (amount < 1000)).astype(int)
+    return data
+
+
+@pytest.fixture(scope="session")
+def trained_ai_system():
+    """Обученный AdvancedFraudAI (только sklearn модели)"""
+    from src.advanced_ai import AdvancedFraudAI
+
+    ai_system = AdvancedFraudAI()
+    ai_system.train_models(make_training_data())
+    return ai_system
@@ -0,0 +1,106 @@
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import asyncio
+
+from src.async_database import AsyncDatabaseManager
+from src.config import PATTERN_CACHE_CONFIG
+
+PATTERNS = [
+    {"pattern_name": "large_amount", "sql_condition": "amount > 10000000"},
+    {"pattern_name": "multiple_transactions", "sql_condition": "count_1h > 5"},
+]
+
+
+class FakeAsyncCursor:
+    def __init__(self, pool):
+        self.pool = pool
+        self.query = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, query, params=None):
+        self.query = query
+        self.pool.queries.append(query)
+        # Имитация сетевой задержки: одновременные запросы перекрываются
+        await asyncio.sleep(0.01)
+
+    async def fetchone(self):
+        if "recent_count" in self.query:
+            return {"recent_count": 7}
+        return {"total_transactions": 3}
+
+    async def fetchall(self):
+        return PATTERNS if "fraud_patterns" in self.query else []
+
+
+class FakeAsyncConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, row_factory=None):
+        return FakeAsyncCursor(self.pool)
+
+
+class FakeAsyncPool:
+    def __init__(self):
+        self.queries = []
+        self.in_use = 0
+        self.max_in_use = 0
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @asynccontextmanager
+    async def connection(self):
+        self.in_use += 1
+        self.max_in_use = max(self.max_in_use, self.in_use)
+        try:
+            yield FakeAsyncConnection(self)
+        finally:
+            self.in_use -= 1
+
+
+def test_user_context_queries_run_concurrently(monkeypatch):
+    """Статистика пользователя и паттерны запрашиваются параллельно на разных соединениях"""
+    monkeypatch.setitem(PATTERN_CACHE_CONFIG, "listen", False)
+    pool = FakeAsyncPool()
+    db = AsyncDatabaseManager(pool)
+
+    async def run():
+        context = await db.get_user_context("user_1", 20000000)
+        # Паттерны уже в кэше: повторно читается только подсчет операций
+        reasons = await db.detect_sql_pattern_fraud("user_1", 50000)
+        await db.close()
+        return context, reasons
+
+    context, reasons = asyncio.run(run())
+    assert context == {
+        "user_stats": {"total_transactions": 3},
+        "fraud_reasons": ["large_amount", "multiple_transactions"]
+    }
+    assert reasons == ["multiple_transactions"]
+    assert pool.max_in_use == 2
+    assert sum("fraud_patterns" in query for query in pool.queries) == 1
+
+
+def test_async_dashboard_reads_rollups(monkeypatch):
+    """Запросы дашборда выполняются одновременно и не сканируют transactions"""
+    monkeypatch.setitem(PATTERN_CACHE_CONFIG, "listen", False)
+    pool = FakeAsyncPool()
+    data = asyncio.run(AsyncDatabaseManager(pool).get_dashboard_data())
+
+    assert set(data) == {"overall", "hourly", "risk_levels", "merchants"}
+    assert pool.max_in_use == 4
+    assert not any("FROM transactions" in query for query in pool.queries)
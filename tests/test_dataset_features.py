@@ -0,0 +1,111 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.dataset_features import RunningStats, build_features, build_features_chunked
+
+
+def raw_transactions(n=3000, users=60, seed=21):
+    """Транзакции в порядке времени, как в dummy_transactions.csv и выгрузке из БД"""
+    rng = np.random.default_rng(seed)
+    transactions = pd.DataFrame({
+        "user_id": [f"user_{i:03d}" for i in rng.integers(0, users, n)],
+        "amount": rng.choice([500, 50_000, 700_000, 2_000_000, 20_000_000], n).astype(float),
+        "merchant": rng.choice(["Makro", "Artel", "DOK"], n),
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 20 * 24 * 3600, n), unit="s"),
+    })
+    return transactions.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+def in_memory(transactions):
+    transactions = transactions.sort_values(["user_id", "timestamp"]).reset_index(drop=True)
+    return build_features(transactions)
+
+
+def chunked(transactions, chunk_size):
+    parts = []
+    rows = build_features_chunked(
+        lambda: (transactions.iloc[i:i + chunk_size] for i in range(0, len(transactions), chunk_size)),
+        parts.append
+    )
+    assert rows == len(transactions) and max(len(part) for part in parts) <= chunk_size
+    result = pd.concat(parts, ignore_index=True)
+    return result.sort_values(["user_id", "timestamp"], kind="stable").reset_index(drop=True)
+
+
+@pytest.mark.parametrize("chunk_size", [17, 97, 1000])
+def test_chunked_matches_in_memory(chunk_size):
+    """Порционный расчет дает те же строки и значения, что расчет в памяти"""
+    transactions = raw_transactions()
+    pd.testing.assert_frame_equal(chunked(transactions, chunk_size), in_memory(transactions), rtol=1e-9)
+
+
+def test_chunked_requires_time_order():
+    transactions = raw_transactions(n=200).sort_values("user_id", kind="stable")
+    with pytest.raises(ValueError):
+        chunked(transactions, 50)
+
+
+def test_running_stats_merges_chunks():
+    """Объединение порций по формуле Чана совпадает с расчетом по всем значениям сразу"""
+    rng = np.random.default_rng(0)
+    amounts = pd.Series(rng.normal(1000, 300, 500))
+    keys = pd.Series(rng.integers(0, 7, 500))
+    running = RunningStats()
+    for start in range(0, 500, 64):
+        running.update(amounts[start:start + 64], keys[start:start + 64])
+    grouped = amounts.groupby(keys)
+    assert np.allclose(running.mean().sort_index(), grouped.mean())
+    assert np.allclose(running.std().sort_index(), grouped.std())
+    assert (running.frame["count"].sort_index() == grouped.count()).all()
+
+
+def test_incremental_appends_rows_equal_to_full_rebuild(tmp_path):
+    """Дописанные строки совпадают с пересборкой всей истории; прежние строки не меняются"""
+    from src.datasets import read_dataset
+    from src.prepare_dataset import incremental_state_path, prepare_dataset_incremental
+
+    transactions = raw_transactions(n=2000)
+    output = tmp_path / "prepared_transactions.csv"
+    positions = []
+
+    def read_until(end):
+        def read_new(position):
+            positions.append(position)
+            start = position.get("input_rows", 0)
+            read = lambda: (transactions.iloc[i:min(i + 150, end)] for i in range(start, end, 150))
+            return read, {"input_rows": end}
+        return read_new
+
+    assert prepare_dataset_incremental(read_until(1200), output)[0] == 1200
+    before = read_dataset(output)
+    first_file = output.with_suffix(".parquet")
+    first_inode = first_file.stat().st_ino
+    assert prepare_dataset_incremental(read_until(1700), output)[0] == 500
+    assert prepare_dataset_incremental(read_until(2000), output)[0] == 300
+    assert prepare_dataset_incremental(read_until(2000), output)[0] == 0
+    # Дозапись - новые части в каталоге; прежние строки не переписываются
+    parts = sorted(p.name for p in output.with_suffix("").iterdir())
+    assert parts == ["part-000000.parquet", "part-000001.parquet", "part-000002.parquet"]
+    assert (output.with_suffix("") / "part-000000.parquet").stat().st_ino == first_inode
+    assert not first_file.exists()
+    assert positions == [{}, {"input_rows": 1200}, {"input_rows": 1700}, {"input_rows": 2000}]
+    assert (incremental_state_path(output) / "state.json").exists()
+
+    result = read_dataset(output)
+    pd.testing.assert_frame_equal(result.iloc[:1200], before)
+    parts = []
+    build_features_chunked(lambda: iter([transactions]), parts.append)
+    rebuild = parts[0]
+    pd.testing.assert_frame_equal(result.iloc[1700:].reset_index(drop=True), rebuild.iloc[1700:].reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False, rtol=1e-9)
+    # Окна и лаги не зависят от будущих строк и совпадают для всех строк
+    sequence = [column for column in rebuild.columns
+                if column.startswith(("total_", "count_", "mean_", "prev_amount_", "amount_ratio", "time_diff_sec"))]
+    pd.testing.assert_frame_equal(result[sequence], rebuild[sequence], check_dtype=False, rtol=1e-9)
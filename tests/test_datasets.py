@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+
+from src.datasets import (
+    DatasetWriter, dataset_rows, find_dataset, iter_dataset, read_dataset, to_typed, write_dataset
+)
+
+
+def prepared(n=500, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "user_id": [f"user_{i:03d}" for i in rng.integers(0, 40, n)],
+        "amount": rng.integers(100, 50_000_000, n).astype(float),
+        "merchant": rng.choice(["Makro", "Artel", "DOK"], n),
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 10**7, n)), unit="s"),
+        "count_1h": rng.integers(1, 9, n).astype(float),
+        "amount_zscore": rng.random(n),
+        "is_fraud": rng.integers(0, 2, n),
+    })
+
+
+def test_parquet_roundtrip_keeps_values_with_compact_types(tmp_path):
+    frame = prepared()
+    path = write_dataset(frame, tmp_path / "prepared_transactions.csv", fmt="parquet")
+    assert path.suffix == ".parquet"
+
+    loaded = read_dataset(tmp_path / "prepared_transactions.csv")
+    assert isinstance(loaded["user_id"].dtype, pd.CategoricalDtype)
+    assert isinstance(loaded["merchant"].dtype, pd.CategoricalDtype)
+    assert loaded["timestamp"].dtype == "datetime64[ns]"
+    assert loaded["amount"].dtype == np.int32 and loaded["count_1h"].dtype == np.int8
+    assert loaded["amount_zscore"].dtype == np.float64  # float32 потерял бы знаки
+    pd.testing.assert_frame_equal(loaded, frame, check_dtype=False, check_categorical=False)
+    assert loaded.memory_usage(deep=True).sum() < frame.memory_usage(deep=True).sum() / 3
+
+    # Проекция: только запрошенные колонки, отсутствующие пропускаются
+    projected = read_dataset(tmp_path / "prepared_transactions.csv", columns=["is_fraud", "amount", "missing"])
+    assert list(projected.columns) == ["is_fraud", "amount"]
+
+
+def test_newest_format_wins_and_csv_still_readable(tmp_path):
+    frame = prepared(50)
+    write_dataset(frame, tmp_path / "data.csv", fmt="parquet")
+    csv_path = write_dataset(frame.assign(amount=1.0), tmp_path / "data.csv", fmt="csv")
+    future = time.time() + 10
+    os.utime(csv_path, (future, future))
+
+    assert find_dataset(tmp_path / "data.csv") == csv_path
+    loaded = read_dataset(tmp_path / "data.csv", columns=["amount", "timestamp"])
+    assert (loaded["amount"] == 1.0).all() and loaded["timestamp"].dtype == "datetime64[ns]"
+
+
+def test_writer_unifies_chunk_types(tmp_path):
+    frame = prepared(300)
+    # В первой порции суммы помещаются в int16, во второй - только в float64
+    frame.loc[:99, "amount"] = 5000
+    frame.loc[200:, "amount"] = frame.loc[200:, "amount"] + 0.25
+    writer = DatasetWriter(tmp_path / "out.csv", fmt="parquet")
+    for start in range(0, len(frame), 100):
+        writer.write(frame.iloc[start:start + 100])
+    path = writer.close()
+
+    assert [p.name for p in tmp_path.iterdir()] == [path.name]
+    loaded = read_dataset(path)
+    assert loaded["amount"].dtype == np.float64
+    pd.testing.assert_frame_equal(loaded, frame, check_dtype=False, check_categorical=False)
+    chunks = list(iter_dataset(path, 120, columns=["user_id", "amount"]))
+    assert max(len(chunk) for chunk in chunks) <= 120
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), to_typed(frame)[["user_id", "amount"]],
+                                  check_dtype=False, check_categorical=False)
+
+
+def test_append_adds_parts_read_as_one_dataset(tmp_path):
+    """Дозапись добавляет часть в каталог; части с разными типами читаются с общими типами"""
+    frame = prepared(300)
+    frame.loc[:149, "amount"] = 5000
+    frame.loc[150:, "amount"] = frame.loc[150:, "amount"] + 0.25
+    path = tmp_path / "prepared_transactions.csv"
+    first = write_dataset(frame.iloc[:100], path, fmt="parquet")
+
+    for start in (100, 150):
+        writer = DatasetWriter(path, fmt="parquet", append=True)
+        writer.write(frame.iloc[start:start + 25])
+        writer.write(frame.iloc[start + 25:start + 50])
+        assert writer.close() == tmp_path / "prepared_transactions"
+
+    assert not first.exists()
+    assert find_dataset(path) == tmp_path / "prepared_transactions"
+    assert sorted(p.name for p in (tmp_path / "prepared_transactions").iterdir()) == [
+        "part-000000.parquet", "part-000001.parquet", "part-000002.parquet"
+    ]
+    assert dataset_rows(path) == 200
+
+    loaded = read_dataset(path)
+    assert loaded["amount"].dtype == np.float64
+    assert isinstance(loaded["user_id"].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(loaded, frame.iloc[:200], check_dtype=False, check_categorical=False)
+
+    # start пропускает первую часть и начало второй
+    chunks = list(iter_dataset(path, 30, columns=["user_id", "amount"], start=120))
+    assert {str(chunk["amount"].dtype) for chunk in chunks} == {"float64"}
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True),
+                                  frame.iloc[120:200][["user_id", "amount"]].reset_index(drop=True),
+                                  check_dtype=False, check_categorical=False)
+
+    # Полная перезапись одним файлом убирает каталог частей
+    write_dataset(frame, path, fmt="parquet")
+    assert find_dataset(path) == first and not (tmp_path / "prepared_transactions").exists()
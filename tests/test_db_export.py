@@ -0,0 +1,121 @@
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.db_export import TrainingExport
+from src.partitions import read_archive
+
+
+class FakeNamedCursor:
+    """Серверный курсор: отдает строки transactions новее водяного знака"""
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = []
+        self.fetched = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params):
+        since = (params["since_ts"], params["since_id"])
+        self.rows = sorted(
+            (row for row in self.table if params["since_ts"] is None or (row[4], row[0]) > since),
+            key=lambda row: (row[4], row[0])
+        )
+
+    def fetchmany(self, size):
+        chunk, self.rows = self.rows[:size], self.rows[size:]
+        self.fetched.append(len(chunk))
+        return chunk
+
+
+class FakePool:
+    def __init__(self, table):
+        self.table = table
+        self.cursors = []
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Conn:
+            def cursor(self, name=None):
+                cursor = FakeNamedCursor(pool.table)
+                pool.cursors.append(cursor)
+                return cursor
+
+        yield Conn()
+
+
+def make_rows(start_id, count, start):
+    return [
+        (i, f"user_{i % 3}", Decimal("1000.50") + i, None if i % 2 else "Makro",
+         start + timedelta(minutes=i), i % 5 == 0, Decimal("0.1000"), "LOW")
+        for i in range(start_id, start_id + count)
+    ]
+
+
+def test_export_streams_typed_chunks_and_resumes_from_watermark(tmp_path):
+    """Порции не больше chunk_size, типы колонок сохраняются, повторная выгрузка берет только новые строки"""
+    start = datetime(2024, 5, 1)
+    table = make_rows(1, 5, start)
+    pool = FakePool(table)
+    export = TrainingExport(pool, tmp_path, chunk_size=2, settle_sec=0)
+
+    assert len(export.export()) == 3
+    assert max(pool.cursors[-1].fetched) == 2
+    assert export.watermark()["id"] == 5 and export.watermark()["rows"] == 5
+
+    table.extend(make_rows(6, 3, start))
+    new_chunks = export.export()
+    assert [p.name for p in new_chunks] == ["chunk-000004.parquet", "chunk-000005.parquet"]
+    assert len(export.load(new_chunks)) == 3
+
+    # Порция - типизированный Parquet: user_id со словарем, время родным типом
+    schema = pq.read_schema(new_chunks[0])
+    assert pa.types.is_dictionary(schema.field("user_id").type)
+    assert pa.types.is_timestamp(schema.field("timestamp").type)
+
+    frame = export.load()
+    assert frame["id"].tolist() == list(range(1, 9))
+    assert isinstance(frame["user_id"].dtype, pd.CategoricalDtype)
+    assert frame["amount"].iloc[0] == 1001.5 and frame["amount"].tolist()[-1] == 1008.5
+    assert str(frame["timestamp"].dtype).startswith("datetime64")
+    assert frame["merchant"].isna().tolist() == [bool(i % 2) for i in range(1, 9)]
+    assert export.load(columns=["user_id", "amount"]).columns.tolist() == ["user_id", "amount"]
+
+
+def test_old_npz_chunks_are_still_loaded(tmp_path):
+    """Порции .npz прежних выгрузок читаются вместе с новыми, нумерация сквозная"""
+    start = datetime(2024, 5, 1)
+    table = make_rows(1, 4, start)
+    export = TrainingExport(FakePool(table), tmp_path, chunk_size=2, settle_sec=0)
+    export.export()
+    # Первая порция - в прежнем формате
+    first = read_archive(tmp_path / "chunk-000001.parquet")
+    np.savez_compressed(
+        tmp_path / "chunk-000001.npz",
+        id=first["id"].to_numpy(dtype=np.int64),
+        user_id=first["user_id"].astype(str).to_numpy(dtype=str),
+        amount=first["amount"].to_numpy(dtype=np.float64),
+    )
+    (tmp_path / "chunk-000001.parquet").unlink()
+
+    assert [p.name for p in export.chunk_paths()] == ["chunk-000001.npz", "chunk-000002.parquet"]
+    frame = export.load(columns=["id", "user_id", "amount"])
+    assert frame["id"].tolist() == [1, 2, 3, 4]
+    assert frame["user_id"].astype(str).tolist() == [f"user_{i % 3}" for i in range(1, 5)]
@@ -0,0 +1,210 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import psycopg2
+import pytest
+from psycopg2 import extensions
+
+from src import db_pool
+from src.database import DatabaseManager
+from src.db_pool import ConnectionPool, PoolError, PoolTimeout
+from src.db_router import DatabaseRouter
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+        self.conn.queries.append(query)
+        self.conn.status = extensions.TRANSACTION_STATUS_INTRANS
+
+    def fetchone(self):
+        return {"id": 1}
+
+    def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.queries = []
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def commit(self):
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Подменяет psycopg2.connect и возвращает список созданных соединений"""
+    created = []
+
+    def fake_connect(*args, **kwargs):
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+
+    monkeypatch.setattr(db_pool.psycopg2, "connect", fake_connect)
+    return created
+
+
+def test_pool_reuses_connections(connections):
+    """Соединение переиспользуется, незавершенная транзакция откатывается"""
+    pool = ConnectionPool("postgresql://test", name="test_reuse", min_size=1, max_size=2)
+    assert pool.open() == 1
+
+    for _ in range(5):
+        with pool.connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+
+    assert len(connections) == 1
+    assert connections[0].rollbacks == 5
+    assert pool.stats() == {"size": 1, "idle": 1, "in_use": 0, "min_size": 1, "max_size": 2}
+
+
+def test_pool_checkout_timeout(connections):
+    """Пул не открывает больше max_size соединений и ждет не дольше checkout_timeout"""
+    pool = ConnectionPool("postgresql://test", name="test_timeout", min_size=0, max_size=1,
+                          checkout_timeout=0.05)
+
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+
+    with pool.connection():
+        assert pool.stats()["in_use"] == 1
+    assert len(connections) == 1
+
+
+def test_pool_discards_broken_and_stale_connections(connections):
+    """Разорванное соединение закрывается, устаревшее проверяется перед выдачей"""
+    pool = ConnectionPool("postgresql://test", name="test_broken", min_size=0, max_size=2,
+                          validate_after=0)
+
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection() as conn:
+            conn.broken = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+    assert connections[0].closed
+    assert pool.stats()["size"] == 0
+
+    with pool.connection() as conn:
+        pass
+    conn.broken = True
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert conn.closed
+
+
+def test_pool_backs_off_after_connect_error(monkeypatch):
+    """После ошибки подключения пул сразу отвечает ошибкой, не подключаясь снова"""
+    attempts = []
+
+    def failing_connect(*args, **kwargs):
+        attempts.append(1)
+        raise psycopg2.OperationalError("could not connect")
+
+    monkeypatch.setattr(db_pool.psycopg2, "connect", failing_connect)
+    pool = ConnectionPool("postgresql://test", name="test_backoff", min_size=0, max_size=2,
+                          connect_backoff=60)
+
+    for _ in range(3):
+        with pytest.raises(PoolError):
+            with pool.connection():
+                pass
+    assert len(attempts) == 1
+    assert pool.stats()["size"] == 0
+
+
+def test_database_manager_uses_pool(connections):
+    """DatabaseManager берет соединения из переданного пула"""
+    pool = ConnectionPool("postgresql://test", name="test_manager", min_size=0, max_size=1)
+    manager = DatabaseManager(pool)
+
+    assert manager.log_transaction("user_1", 100.0, False, 0.1, "LOW") == 1
+    assert manager.log_transaction("user_2", 200.0, False, 0.1, "LOW") == 1
+    assert len(connections) == 1
+    assert "INSERT INTO transactions" in connections[0].queries[0]
+
+
+def test_dashboard_reads_rollups_only(connections):
+    """Дашборд и статистика пользователя не сканируют transactions"""
+    pool = ConnectionPool("postgresql://test", name="test_rollups", min_size=0, max_size=1)
+    manager = DatabaseManager(pool)
+
+    assert set(manager.get_dashboard_data()) == {"overall", "hourly", "risk_levels", "merchants"}
+    assert manager.get_user_transaction_stats("user_1") is not None
+    queries = connections[0].queries
+    assert len(queries) == 5
+    assert not any("FROM transactions" in query for query in queries)
+
+
+def test_router_sends_dashboard_to_replica_and_writes_to_primary(connections, monkeypatch):
+    """Дашборд читает реплику, запись и статистика для проверки - основную БД; отстающая реплика подменяется"""
+    primary = ConnectionPool("postgresql://primary", name="test_router_primary", min_size=0, max_size=1)
+    replica = ConnectionPool("postgresql://replica", name="test_router_replica", min_size=0, max_size=1)
+    manager = DatabaseManager(primary, replica)
+    lag = {"value": 0.0}
+    monkeypatch.setattr(manager.router, "replica_lag", lambda: lag["value"])
+
+    manager.get_dashboard_data()
+    manager.log_transaction("user_1", 100.0, False, 0.1, "LOW")
+    manager.get_user_transaction_stats("user_1")
+    replica_conn, primary_conn = connections
+    assert len(replica_conn.queries) == 4
+    assert "INSERT INTO transactions" in primary_conn.queries[0] and len(primary_conn.queries) == 2
+
+    lag["value"] = manager.router.max_lag_sec + 1
+    manager.get_dashboard_data()
+    assert len(replica_conn.queries) == 4 and len(primary_conn.queries) == 6
+
+
+def test_router_falls_back_when_replica_is_down(connections, monkeypatch):
+    """Недоступная реплика: чтение идет в основную БД, ошибка не доходит до вызывающего"""
+    primary = ConnectionPool("postgresql://primary", name="test_down_primary", min_size=0, max_size=1)
+    replica = ConnectionPool("postgresql://replica", name="test_down_replica", min_size=0, max_size=1)
+    fake_connect = db_pool.psycopg2.connect
+
+    def connect(dsn, **kwargs):
+        if dsn == "postgresql://replica":
+            raise psycopg2.OperationalError("replica is down")
+        return fake_connect(dsn, **kwargs)
+
+    monkeypatch.setattr(db_pool.psycopg2, "connect", connect)
+    router = DatabaseRouter(primary, replica, lag_check_interval=60)
+
+    with router.connection("dashboard", replica=True) as conn:
+        assert conn is connections[0]
+    assert router.replica_lag() is None
+    assert router.stats()["replica"] == "unavailable"
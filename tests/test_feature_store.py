@@ -0,0 +1,80 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_store import FEATURE_NAMES, OnlineFeatureStore
+
+
+def offline_features(transactions):
+    """Те же выражения, что в prepare_dataset.py"""
+    transactions = transactions.sort_values(["user_id", "timestamp"]).reset_index(drop=True)
+    transactions["total_1h"] = (
+        transactions.groupby("user_id", group_keys=False)
+        .apply(lambda g: g.rolling("1h", on="timestamp")["amount"].sum())
+    ).fillna(0)
+    transactions["count_1h"] = (
+        transactions.groupby("user_id", group_keys=False)
+        .apply(lambda g: g.rolling("1h", on="timestamp")["amount"].count())
+    ).fillna(0)
+    for lag in range(1, 4):
+        transactions[f"prev_amount_{lag}"] = transactions.groupby("user_id")["amount"].shift(lag).fillna(0)
+    transactions["amount_ratio"] = (
+        transactions["amount"] / transactions.groupby("user_id")["amount"].shift(1)
+    ).replace([np.inf, -np.inf], 1).fillna(1)
+    transactions["time_diff_sec"] = (
+        transactions.groupby("user_id")["timestamp"].diff().dt.total_seconds().fillna(0)
+    )
+    return transactions
+
+
+def test_online_features_match_prepare_dataset():
+    """Признаки, посчитанные по одному событию, совпадают с офлайн-расчетом"""
+    rng = np.random.default_rng(7)
+    n = 3000
+    transactions = pd.DataFrame({
+        "user_id": [f"user_{i:02d}" for i in rng.integers(0, 30, n)],
+        "amount": rng.choice([0.0, 500.0, 50000.0, 1500000.0, 25000000.0], n),
+        # Уникальные секунды в пределах двух суток: плотные часы и длинные паузы
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(
+            rng.choice(2 * 24 * 3600, n, replace=False), unit="s"
+        ),
+    })
+    expected = offline_features(transactions)
+
+    store = OnlineFeatureStore(history=64, initial_users=4)
+    events = transactions.sort_values("timestamp")
+    online = {}
+    for row in events.itertuples():
+        online[(row.user_id, row.timestamp)] = store.update(row.user_id, row.amount, row.timestamp)
+
+    assert expected["count_1h"].max() < 64
+    for row in expected.itertuples():
+        features = online[(row.user_id, row.timestamp)]
+        for name in FEATURE_NAMES:
+            assert features[name] == pytest.approx(getattr(row, name)), name
+
+
+def test_history_bounds_memory_and_idle_users_are_evicted():
+    """Буфер пользователя ограничен history, неактивные пользователи вытесняются"""
+    store = OnlineFeatureStore(history=4, max_users=2, idle_ttl_sec=1800, initial_users=1)
+    store.update("idle", 50.0, 1_000_000)
+    for second in range(10):
+        features = store.update("busy", 100.0, 1_003_000 + second)
+    assert features["count_1h"] == 4
+    assert features["total_1h"] == 400.0
+    assert features["prev_amount_3"] == 100.0
+
+    # Места нет: вытесняется пользователь, не проявлявшийся дольше idle_ttl_sec
+    store.update("new", 10.0, 1_003_600)
+    assert len(store) == 2
+    assert store.peek("idle", 50.0, 1_003_600)["count_1h"] == 1
+    assert store.peek("busy", 100.0, 1_003_600)["count_1h"] == 4
+
+    assert store.evict_idle(now=1_005_399) == 1
+    assert len(store) == 1
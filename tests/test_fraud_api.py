@@ -0,0 +1,371 @@
+# tests/test_fraud_api.py
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import pandas as pd
+from fastapi.testclient import TestClient
+from src import fraud_api
+
+client = TestClient(fraud_api.app)
+
+BATCH = [
+    {"user_id": "user_101", "amount": 100000, "merchant": "Shop1", "timestamp": "2024-01-06T03:00:00"},
+    {"user_id": "user_102", "amount": 25000000, "merchant": "Luxury", "timestamp": "2024-01-02T14:30:00"},
+    {"user_id": "user_103", "amount": 1500000, "timestamp": "2024-01-03T23:10:00"},
+    {"user_id": "user_104", "amount": 800, "merchant": "Online"},
+    {"user_id": "user_105", "amount": 5000000, "merchant": "Travel", "timestamp": "not a date"},
+]
+
+
+@pytest.fixture
+def loaded_model(trained_ai_system, monkeypatch):
+    state = fraud_api.make_model_state(trained_ai_system, "test-model", "fixture")
+    monkeypatch.setattr(fraud_api, "active_model", state)
+    # Без хранилища признаков ответы не зависят от предыдущих проверок
+    monkeypatch.setattr(fraud_api, "feature_store", None)
+    return trained_ai_system
+
+
+def test_predict_records_matches_dataframe_path(trained_ai_system):
+    """Пакетный путь совпадает с построчным predict_ensemble"""
+    records = [dict(tx, timestamp=tx.get("timestamp", "2024-01-01T12:00:00")) for tx in BATCH]
+    scores, predictions = trained_ai_system.predict_records(records)
+
+    for record, score, prediction in zip(records, scores, predictions):
+        result = trained_ai_system.predict_ensemble(pd.DataFrame([record]))
+        assert score == pytest.approx(float(result.iloc[0]["ai_fraud_score"]))
+        assert prediction == int(result.iloc[0]["ai_fraud_prediction"])
+
+
+def test_predict_one_identical_to_dataframe_path(trained_ai_system):
+    """Быстрый путь без pandas дает те же результаты, что и DataFrame"""
+    for tx in BATCH:
+        record = dict(tx, timestamp=tx.get("timestamp", "2024-01-01T12:00:00"), city="unknown")
+        result = trained_ai_system.predict_ensemble(pd.DataFrame([record]))
+        expected = (float(result.iloc[0]["ai_fraud_score"]), int(result.iloc[0]["ai_fraud_prediction"]))
+
+        assert trained_ai_system.predict_one(record) == expected
+        as_tuple = (record["user_id"], record["amount"], record["timestamp"])
+        assert trained_ai_system.predict_one(as_tuple) == expected
+
+
+def test_transaction_row_is_reused(trained_ai_system):
+    """Строка признаков предвыделена и имеет порядок feature_names"""
+    row = trained_ai_system.transaction_to_row({"amount": 100000, "timestamp": "2024-01-06T03:00:00"})
+    again = trained_ai_system.transaction_to_row({"amount": 200000})
+    assert row is again
+    assert row.dtype.name == "float32"
+    assert row.shape == (1, len(trained_ai_system.feature_names))
+
+
+def test_batch_check_matches_single_checks(loaded_model):
+    """Ответы пакета совпадают с /check и идут в исходном порядке"""
+    batch = client.post("/batch-check", json=BATCH)
+    assert batch.status_code == 200
+    data = batch.json()
+    assert data["checked_count"] == len(BATCH)
+
+    for tx, result in zip(BATCH, data["results"]):
+        single = client.post("/check", json=tx).json()
+        assert result["model_used"] == single["model_used"] == "advanced_ai"
+        assert result["risk_score"] == pytest.approx(single["risk_score"])
+        assert result["risk_level"] == single["risk_level"]
+        assert result["reasons"] == single["reasons"]
+
+    ids = [int(r["transaction_id"][3:]) for r in data["results"]]
+    assert ids == list(range(ids[0], ids[0] + len(BATCH)))
+
+
+def test_batch_check_without_model(monkeypatch):
+    """Без модели пакет проверяется базовыми правилами"""
+    monkeypatch.setattr(fraud_api, "active_model", None)
+    response = client.post("/batch-check", json=BATCH)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["model_used"] for r in results] == ["basic_rules"] * len(BATCH)
+    assert results[1]["is_suspicious"] is True
+
+
+def test_coalescer_groups_concurrent_requests():
+    """Одновременные запросы оцениваются пакетами, результаты не перепутаны"""
+    import asyncio
+    from src.request_coalescer import RequestCoalescer
+
+    batches = []
+
+    def score(items):
+        batches.append(len(items))
+        return [item * 10 for item in items]
+
+    async def run():
+        coalescer = RequestCoalescer(score, max_batch=4, max_wait_ms=50)
+        return await asyncio.gather(*(coalescer.submit(i) for i in range(10)))
+
+    assert asyncio.run(run()) == [i * 10 for i in range(10)]
+    assert batches == [4, 4, 2]
+
+
+def test_coalescer_fails_all_on_short_batch_result():
+    """Пакет вернул меньше результатов, чем запросов: все запросы получают ошибку, а не висят"""
+    import asyncio
+    from src.request_coalescer import RequestCoalescer
+
+    async def run():
+        coalescer = RequestCoalescer(lambda items: items[:-1], max_batch=3, max_wait_ms=50)
+        return await asyncio.wait_for(
+            asyncio.gather(*(coalescer.submit(i) for i in range(3)), return_exceptions=True), 1
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_check_through_coalescer(loaded_model, monkeypatch):
+    """/check с микробатчингом дает те же ответы, что и без него"""
+    import asyncio
+    from src.request_coalescer import RequestCoalescer
+
+    requests = [fraud_api.TransactionRequest(**tx) for tx in BATCH]
+
+    async def run():
+        return await asyncio.gather(*(fraud_api.check_transaction(tx) for tx in requests))
+
+    expected = asyncio.run(run())
+    monkeypatch.setattr(fraud_api, "coalescer", RequestCoalescer(fraud_api.score_batch, max_wait_ms=5))
+    coalesced = asyncio.run(run())
+
+    for plain, batched in zip(expected, coalesced):
+        assert batched.risk_score == pytest.approx(plain.risk_score)
+        assert batched.model_used == plain.model_used
+    assert len({r.transaction_id for r in coalesced}) == len(BATCH)
+    assert "fraud_coalescer_batch_size" in client.get("/metrics").text
+
+
+@pytest.mark.parametrize("kind", ["inline", "thread", "process"])
+def test_inference_executor_kinds(trained_ai_system, kind):
+    """Все типы executor дают одинаковые предсказания"""
+    import asyncio
+    from src.inference_executor import InferenceExecutor
+
+    executor = InferenceExecutor(kind, max_workers=2, max_in_flight=2)
+    record = dict(BATCH[1], city="unknown")
+
+    async def run():
+        return await asyncio.gather(*(
+            executor.call(trained_ai_system, "predict_one", record) for _ in range(5)
+        ))
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        executor.shutdown(wait=True)
+
+    assert results == [trained_ai_system.predict_one(record)] * 5
+
+
+def test_reload_model_swaps_version(loaded_model, tmp_path, monkeypatch):
+    """Перезагрузка проверяет новую модель и атомарно меняет версию"""
+    import joblib
+
+    model_path = tmp_path / "advanced_ai_system.pkl"
+    joblib.dump(loaded_model, model_path)
+    monkeypatch.setattr(fraud_api, "MODEL_PATHS", [model_path])
+
+    assert client.get("/health").json()["model_version"] == "test-model"
+    response = client.post("/reload-model").json()
+
+    assert response["success"] is True
+    assert response["model_version"].startswith("advanced_ai_system-")
+    assert client.get("/health").json()["model_version"] == response["model_version"]
+    assert client.post("/check", json=BATCH[0]).json()["model_version"] == response["model_version"]
+
+
+def test_reload_rejects_invalid_artifact(loaded_model, tmp_path, monkeypatch):
+    """Артефакт, не прошедший пробное предсказание, не заменяет текущую модель"""
+    import joblib
+
+    model_path = tmp_path / "advanced_ai_system.pkl"
+    joblib.dump({"not": "a model"}, model_path)
+    monkeypatch.setattr(fraud_api, "MODEL_PATHS", [model_path])
+
+    response = client.post("/reload-model").json()
+    assert response["success"] is False
+    assert response["model_version"] == "test-model"
+    assert client.post("/check", json=BATCH[0]).json()["model_used"] == "advanced_ai"
+
+
+def test_batch_check_stream_matches_batch(loaded_model):
+    """NDJSON-поток дает те же результаты, что и /batch-check, даже если строки разрезаны"""
+    import json
+
+    body = "".join(json.dumps(tx) + "\n" for tx in BATCH).encode()
+    # Тело отправляется кусками по 7 байт: строки режутся посередине
+    parts = iter([body[i:i + 7] for i in range(0, len(body), 7)])
+    response = client.post("/batch-check/stream?chunk_size=2", content=parts)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    streamed = [json.loads(line) for line in response.text.splitlines()]
+    batch = client.post("/batch-check", json=BATCH).json()["results"]
+    assert len(streamed) == len(BATCH)
+    for s, b in zip(streamed, batch):
+        assert s["risk_score"] == pytest.approx(b["risk_score"])
+        assert s["reasons"] == b["reasons"]
+
+
+def test_batch_check_stream_reports_bad_lines(loaded_model):
+    """Некорректные строки не прерывают поток и возвращаются на своем месте"""
+    import json
+
+    body = json.dumps(BATCH[0]) + "\n{broken json\n\n" + json.dumps({"user_id": "x"}) + "\n" + json.dumps(BATCH[1])
+    lines = client.post("/batch-check/stream", content=body.encode()).text.splitlines()
+    results = [json.loads(line) for line in lines]
+
+    assert len(results) == 4
+    assert "risk_score" in results[0] and "risk_score" in results[3]
+    assert results[1]["line"] == 2 and "error" in results[1]
+    assert results[2]["line"] == 4 and "error" in results[2]
+
+
+def test_batch_check_stream_rejects_long_lines(loaded_model, monkeypatch):
+    """Слишком длинная строка не копится в памяти и отклоняется, поток продолжается"""
+    import json
+
+    monkeypatch.setitem(fraud_api.SERVING_CONFIG, "stream_max_line_bytes", 100)
+    long_line = b'{"user_id": "' + b"x" * 500 + b'", "amount": 1}'
+    body = long_line + b"\n" + json.dumps(BATCH[0]).encode() + b"\n" + long_line
+    parts = iter([body[i:i + 30] for i in range(0, len(body), 30)])
+
+    results = [json.loads(line) for line in client.post("/batch-check/stream", content=parts).text.splitlines()]
+    assert [r.get("line") for r in results] == [1, None, 3]
+    assert "exceeds" in results[0]["error"] and "risk_score" in results[1]
+
+
+def test_coalescer_close_flushes_pending():
+    """close() оценивает накопленные запросы, не дожидаясь окна"""
+    import asyncio
+    from src.request_coalescer import RequestCoalescer
+
+    async def run():
+        coalescer = RequestCoalescer(lambda items: [i + 1 for i in items], max_wait_ms=60_000)
+        waiting = [asyncio.ensure_future(coalescer.submit(i)) for i in range(3)]
+        await asyncio.sleep(0)
+        await coalescer.close()
+        return await asyncio.wait_for(asyncio.gather(*waiting), timeout=1)
+
+    assert asyncio.run(run()) == [1, 2, 3]
+
+
+def test_process_pools_are_per_model(trained_ai_system):
+    """Чередование старой и новой модели не пересоздает пулы; старый закрывается после retire"""
+    import asyncio
+    import copy
+    from src.inference_executor import InferenceExecutor
+
+    executor = InferenceExecutor("process", max_workers=1)
+    old_model, new_model = trained_ai_system, copy.deepcopy(trained_ai_system)
+    record = dict(BATCH[0], city="unknown")
+
+    async def run():
+        for system in (old_model, new_model, old_model, new_model):
+            await executor.call(system, "predict_one", record)
+        pools = dict(executor._process_pools)
+        executor.retire(old_model)
+        return pools
+
+    try:
+        pools = asyncio.run(run())
+        assert set(pools) == {id(old_model), id(new_model)}
+        assert set(executor._process_pools) == {id(new_model)}
+    finally:
+        executor.shutdown(wait=True)
+
+
+def test_check_uses_online_features(loaded_model, monkeypatch):
+    """С хранилищем признаков /check видит предыдущие транзакции пользователя"""
+    from src.feature_store import OnlineFeatureStore
+
+    store = OnlineFeatureStore()
+    monkeypatch.setattr(fraud_api, "feature_store", store)
+    for minute in range(3):
+        tx = {"user_id": "velocity_user", "amount": 200000, "timestamp": f"2024-01-02T10:0{minute}:00"}
+        assert client.post("/check", json=tx).status_code == 200
+
+    record = fraud_api.transaction_record(fraud_api.TransactionRequest(
+        user_id="velocity_user", amount=400000, timestamp="2024-01-02T10:05:00"
+    ))
+    assert record["count_1h"] == 4
+    assert record["total_1h"] == 1000000
+    assert record["time_diff_sec"] == 180
+    assert record["amount_ratio"] == 2
+
+
+def test_batch_fetches_user_stats_in_one_query(loaded_model, monkeypatch):
+    """Пакет из 1000 транзакций 300 пользователей - один запрос к user_stats"""
+    from src.async_database import AsyncDatabaseManager
+    from src.config import PATTERN_CACHE_CONFIG
+    from tests.test_async_database import FakeAsyncPool
+
+    pool = FakeAsyncPool()
+    row = {"total_transactions": 2, "amount_sum": 300000, "amount_sq_sum": 5e10,
+           "min_amount": 100000, "max_amount": 200000}
+
+    async def fetch(query, params=None, one=False):
+        pool.queries.append(query)
+        return [dict(row, user_id=user_id) for user_id in params["user_ids"] if user_id != "user_0"]
+
+    monkeypatch.setitem(PATTERN_CACHE_CONFIG, "listen", False)
+    user_db = AsyncDatabaseManager(pool)
+    monkeypatch.setattr(user_db, "_fetch", fetch)
+    monkeypatch.setattr(fraud_api, "user_db", user_db)
+
+    batch = [{"user_id": f"user_{i % 300}", "amount": 50000.0 + i} for i in range(1000)]
+    response = client.post("/batch-check", json=batch)
+
+    assert response.status_code == 200
+    assert response.json()["checked_count"] == 1000
+    assert len(pool.queries) == 1 and "ANY" in pool.queries[0]
+
+    # Признаки совпадают с pandas-статистикой по всем операциям пользователя вместе с текущей
+    features = fraud_api.user_stats_features(row, 120000.0)
+    amounts = pd.Series([100000.0, 200000.0, 120000.0])
+    assert features["user_mean"] == pytest.approx(amounts.mean())
+    assert features["user_std"] == pytest.approx(amounts.std())
+    assert (features["user_min"], features["user_max"], features["user_count"]) == (100000.0, 200000.0, 3)
+    assert fraud_api.user_stats_features(None, 500.0)["user_std"] == 0.0
+
+
+def test_batch_scores_with_model_when_user_stats_db_fails(loaded_model, monkeypatch):
+    """Ошибка БД статистики - пакет все равно оценивает модель, признаки user_* не подменяются"""
+    import psycopg
+    from src.async_database import AsyncDatabaseManager
+    from src.config import PATTERN_CACHE_CONFIG
+    from tests.test_async_database import FakeAsyncPool
+
+    async def fetch(query, params=None, one=False):
+        raise psycopg.OperationalError("connection refused")
+
+    monkeypatch.setitem(PATTERN_CACHE_CONFIG, "listen", False)
+    user_db = AsyncDatabaseManager(FakeAsyncPool())
+    monkeypatch.setattr(user_db, "_fetch", fetch)
+    monkeypatch.setattr(fraud_api, "user_db", user_db)
+
+    batch = [{"user_id": f"user_{i % 3}", "amount": 50000.0 + i} for i in range(10)]
+    response = client.post("/batch-check", json=batch)
+
+    assert response.status_code == 200
+    assert {result["model_used"] for result in response.json()["results"]} == {"advanced_ai"}
+
+    records = [{"user_id": "user_1", "amount": 100.0, "user_count": 7}]
+    assert asyncio.run(fraud_api.add_user_stats(records)) == records
+
+    async def broken(user_ids):
+        raise RuntimeError("pool is not open")
+
+    monkeypatch.setattr(user_db, "get_users_transaction_stats", broken)
+    assert asyncio.run(fraud_api.add_user_stats(records)) == records
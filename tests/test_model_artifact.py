@@ -0,0 +1,76 @@
+# tests/test_model_artifact.py
+import os
+import pickle
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import joblib
+import numpy as np
+import pytest
+
+from src.model_artifact import MappedFraudAI, ensure_mapped_model, export_mapped_model
+
+
+@pytest.fixture(scope="module")
+def mapped_ai_system(trained_ai_system, tmp_path_factory):
+    directory = tmp_path_factory.mktemp("model") / "advanced_ai_system.mmap"
+    export_mapped_model(trained_ai_system, directory)
+    return MappedFraudAI(directory)
+
+
+def test_mapped_models_match_sklearn(trained_ai_system, mapped_ai_system):
+    """Деревья из mmap дают те же предсказания, что и sklearn"""
+    rng = np.random.default_rng(0)
+    X = rng.normal(scale=2, size=(5000, len(trained_ai_system.feature_names)))
+
+    for name, model in trained_ai_system.models.items():
+        assert np.array_equal(model.predict(X), mapped_ai_system.models[name].predict(X))
+
+
+def test_mapped_arrays_are_readonly_mmaps(mapped_ai_system):
+    """Массивы открыты через mmap только для чтения"""
+    forest = mapped_ai_system.models["random_forest"]
+    assert isinstance(forest.threshold, np.memmap)
+    assert not forest.threshold.flags.writeable
+    assert isinstance(mapped_ai_system.scaler.mean_, np.memmap)
+
+
+def test_mapped_system_scores_like_original(trained_ai_system, mapped_ai_system):
+    """predict_one и predict_records совпадают с исходной системой, pickle хранит только путь"""
+    records = [
+        {"user_id": "u1", "amount": 100000.0, "timestamp": "2024-01-06T03:00:00"},
+        {"user_id": "u2", "amount": 25000000.0, "timestamp": "2024-01-02T14:30:00"},
+        {"user_id": "u3", "amount": 700.0, "timestamp": "2024-01-03T23:10:00"},
+    ]
+    expected = trained_ai_system.predict_records(records)
+    actual = mapped_ai_system.predict_records(records)
+    assert np.array_equal(expected[0], actual[0])
+
+    restored = pickle.loads(pickle.dumps(mapped_ai_system))
+    assert len(pickle.dumps(mapped_ai_system)) < 1000
+    assert [restored.predict_one(r) for r in records] == [trained_ai_system.predict_one(r) for r in records]
+
+
+def test_reexport_does_not_touch_published_artifact(trained_ai_system, tmp_path):
+    """Новая версия .pkl публикуется в новый каталог, открытый артефакт не меняется"""
+    model_path = tmp_path / "advanced_ai_system.pkl"
+    joblib.dump(trained_ai_system, model_path)
+    first = ensure_mapped_model(model_path)
+    opened = MappedFraudAI(first)
+    threshold_before = np.array(opened.models["random_forest"].threshold)
+
+    assert ensure_mapped_model(model_path) == first
+    with pytest.raises(FileExistsError):
+        export_mapped_model(trained_ai_system, first)
+
+    stat = model_path.stat()
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    second = ensure_mapped_model(model_path)
+
+    assert second != first
+    assert (first / "manifest.json").exists()
+    assert np.array_equal(opened.models["random_forest"].threshold, threshold_before)
+    assert not [p for p in first.parent.iterdir() if p.name.startswith(".")]
@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+
+from src.dataset_features import build_features
+from src.parallel_features import SHARD_COLUMNS, build_features_parallel, common_dtypes, user_shards
+
+
+def transactions(n=3000, users=80, seed=25):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        "user_id": [f"user_{i:03d}" for i in rng.integers(0, users, n)],
+        "amount": rng.choice([500, 50_000, 700_000, 2_000_000, 20_000_000], n).astype(float),
+        "merchant": rng.choice(["Makro", "Artel", "DOK"], n),
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 20 * 24 * 3600, n), unit="s"),
+    })
+    return frame.sort_values(["user_id", "timestamp"]).reset_index(drop=True)
+
+
+def test_parallel_matches_serial_for_any_shard_count():
+    data = transactions()
+    expected = build_features(data.copy())
+    for workers, shards in [(2, 2), (2, 7)]:
+        result = build_features_parallel(data.copy(), workers=workers, shards=shards)
+        pd.testing.assert_frame_equal(result, expected, rtol=1e-9)
+
+
+def test_user_shards_are_stable():
+    users = pd.Series(["user_001", "user_002", "user_001", "user_777"])
+    shards, _ = user_shards(users, 5)
+    assert shards[0] == shards[2]
+    assert (shards == user_shards(users.astype("category"), 5)[0]).all()
+    assert shards.min() >= 0 and shards.max() < 5
+
+
+def test_column_types_unified_across_shards():
+    """Колонка целая в одном шарде и дробная в другом - в результате дробная, независимо от порядка шардов"""
+    integer = {column: np.dtype(np.int64) for column in SHARD_COLUMNS}
+    fractional = dict(integer, user_min=np.dtype(np.float64), is_weekend=np.dtype(np.int32))
+    for shards in ([integer, fractional], [fractional, integer]):
+        dtypes = common_dtypes(shards)
+        assert dtypes["user_min"] == np.float64 and dtypes["user_max"] == np.int64
+        assert dtypes["is_weekend"] == np.int64
+    assert set(common_dtypes([]).values()) == {np.dtype(np.float64)}
+
+    # Целые суммы: user_min/user_max остаются целыми, как в build_features()
+    data = transactions(n=600)
+    data["amount"] = data["amount"].astype(np.int64)
+    pd.testing.assert_frame_equal(build_features_parallel(data.copy(), workers=2, shards=3),
+                                  build_features(data.copy()), rtol=1e-9)
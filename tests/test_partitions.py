@@ -0,0 +1,170 @@
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import psycopg2
+import pytest
+
+from src.partitions import PartitionManager, next_period, partition_name, period_start, read_archive
+
+
+class FakeCursor:
+    """Курсор psycopg2: список секций из pg_inherits и строки секций для серверного курсора"""
+
+    def __init__(self, db, name=None):
+        self.db = db
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        text = query if isinstance(query, str) else repr(query)
+        self.db.queries.append(text)
+        if self.name is not None:
+            partition = self.name.removeprefix("archive_")
+            if partition in self.db.broken:
+                raise psycopg2.OperationalError("could not read block")
+            self.rows = list(self.db.rows.get(partition, []))
+
+    def fetchall(self):
+        return [(name, bound, 0) for name, bound in self.db.partitions]
+
+    def fetchmany(self, size):
+        batch, self.rows = self.rows[:size], self.rows[size:]
+        self.db.fetches.append(len(batch))
+        return batch
+
+
+class FakeDB:
+    def __init__(self, partitions, rows=None, broken=()):
+        self.partitions = partitions
+        self.rows = rows or {}
+        self.broken = set(broken)
+        self.queries = []
+        self.fetches = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    @contextmanager
+    def connection(self):
+        yield self
+
+    def cursor(self, name=None):
+        return FakeCursor(self, name)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def bound(start, end):
+    return f"FOR VALUES FROM ('{start}') TO ('{end}')"
+
+
+def test_partition_periods():
+    """Границы и имена секций за день и месяц, переход через год"""
+    moment = datetime(2024, 12, 31, 23, 59)
+    assert period_start(moment, "day") == datetime(2024, 12, 31)
+    assert next_period(period_start(moment, "day"), "day") == datetime(2025, 1, 1)
+    assert next_period(period_start(moment, "month"), "month") == datetime(2025, 1, 1)
+    assert next_period(datetime(2024, 1, 1), "month") == datetime(2024, 2, 1)
+    assert partition_name(datetime(2024, 12, 1), "month") == "transactions_p202412"
+    assert partition_name(datetime(2024, 12, 31), "day") == "transactions_p20241231"
+    with pytest.raises(ValueError):
+        period_start(moment, "week")
+
+
+def test_read_archive_restores_nulls(tmp_path):
+    """NULL из маски <колонка>__null читается как пропуск, остальные колонки - как есть"""
+    path = tmp_path / "transactions_p202401.npz"
+    np.savez_compressed(
+        path,
+        id=np.array([1, 2]),
+        amount=np.array([100.0, 250.5]),
+        merchant=np.array(["Makro", ""]),
+        merchant__null=np.array([False, True]),
+    )
+    frame = read_archive(path, columns=["id", "amount", "merchant"])
+    assert frame["amount"].tolist() == [100.0, 250.5]
+    assert frame["merchant"].iloc[0] == "Makro" and frame["merchant"].isna().iloc[1]
+
+
+def test_ensure_partitions_creates_missing_periods():
+    """Создаются только непокрытые периоды; секция с другим интервалом тоже считается покрытием"""
+    db = FakeDB([
+        ("transactions_default", "DEFAULT"),
+        ("transactions_p202401", bound("2024-01-01 00:00:00", "2024-02-01 00:00:00")),
+        ("transactions_p20240315", bound("2024-03-15 00:00:00", "2024-03-16 00:00:00")),
+    ])
+    manager = PartitionManager(db, interval="month", premake=3)
+
+    created = manager.ensure_partitions(now=datetime(2024, 1, 20))
+
+    assert created == ["transactions_p202402", "transactions_p202404"]
+    assert db.commits == 2
+    attach = [q for q in db.queries if "ATTACH PARTITION" in q]
+    assert len(attach) == 2 and "transactions_p202402" in attach[0]
+    # Строки периода переезжают из секции по умолчанию
+    assert sum("transactions_default" in q and "DELETE" in q for q in db.queries) == 2
+
+
+def test_apply_retention_streams_old_partitions_to_parquet(tmp_path):
+    """Старая секция выгружается порциями fetchmany в Parquet и удаляется, свежая остается"""
+    rows = [
+        (i, f"user_{i % 3}", Decimal(f"{i}.50"), None if i % 4 == 0 else "Makro",
+         datetime(2024, 1, 1, i % 24), bool(i % 5 == 0), None if i % 2 else Decimal("0.1250"), "LOW")
+        for i in range(1, 26)
+    ]
+    db = FakeDB([
+        ("transactions_default", "DEFAULT"),
+        ("transactions_p202401", bound("2024-01-01 00:00:00", "2024-02-01 00:00:00")),
+        ("transactions_p202405", bound("2024-05-01 00:00:00", "2024-06-01 00:00:00")),
+    ], rows={"transactions_p202401": rows})
+    manager = PartitionManager(db, retention_days=30, archive_dir=tmp_path, archive_batch_rows=10)
+
+    archived = manager.apply_retention(now=datetime(2024, 6, 1))
+
+    assert archived == [tmp_path / "transactions_p202401.parquet"]
+    # Не больше archive_batch_rows строк за раз, последняя пустая порция завершает чтение
+    assert db.fetches == [10, 10, 5, 0]
+    assert any("user_minute_counters" in q for q in db.queries)
+    dropped = [q for q in db.queries if "DROP TABLE" in q]
+    assert len(dropped) == 1 and "transactions_p202401" in dropped[0]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["transactions_p202401.json", "transactions_p202401.parquet"]
+
+    frame = read_archive(archived[0])
+    assert frame["id"].tolist() == list(range(1, 26))
+    assert frame["amount"].tolist() == [i + 0.5 for i in range(1, 26)]
+    assert frame["merchant"].isna().sum() == 6 and frame["fraud_score"].isna().sum() == 13
+    assert frame["timestamp"].iloc[2] == datetime(2024, 1, 1, 3)
+    assert read_archive(archived[0], columns=["user_id"])["user_id"].nunique() == 3
+
+
+def test_apply_retention_rolls_back_failed_partition(tmp_path):
+    """Ошибка чтения секции - откат и никаких файлов; следующая секция все равно архивируется"""
+    db = FakeDB([
+        ("transactions_p202401", bound("2024-01-01 00:00:00", "2024-02-01 00:00:00")),
+        ("transactions_p202402", bound("2024-02-01 00:00:00", "2024-03-01 00:00:00")),
+    ], broken=["transactions_p202401"])
+    manager = PartitionManager(db, retention_days=30, archive_dir=tmp_path)
+
+    archived = manager.apply_retention(now=datetime(2024, 6, 1))
+
+    assert archived == [tmp_path / "transactions_p202402.parquet"]
+    assert db.rollbacks == 1
+    assert not any("transactions_p202401" in q for q in db.queries if "DROP TABLE" in q)
+    assert not list(tmp_path.glob("transactions_p202401*"))
+    assert read_archive(archived[0]).empty
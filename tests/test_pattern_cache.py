@@ -0,0 +1,88 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.config import PATTERN_CACHE_CONFIG
+from src.database import DatabaseManager
+from src.pattern_cache import FraudPatternCache
+
+PATTERNS = [
+    {"pattern_name": "large_amount", "sql_condition": "amount > 10000000"},
+    {"pattern_name": "small_amount", "sql_condition": "amount < 1000"},
+]
+
+
+def test_cache_reads_patterns_once_until_invalidated():
+    """Паттерны читаются один раз, повторно - только после invalidate или TTL"""
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return PATTERNS
+
+    cache = FraudPatternCache(loader, ttl=300)
+    for _ in range(100):
+        assert cache.get() == PATTERNS
+    assert len(calls) == 1
+
+    cache.invalidate()
+    cache.get()
+    assert len(calls) == 2
+
+    cache.ttl = 0
+    cache.get()
+    assert len(calls) == 3
+
+
+def test_cache_keeps_previous_patterns_when_reload_fails():
+    """Ошибка перечитывания не обнуляет кэш"""
+    state = {"fail": False}
+
+    def loader():
+        if state["fail"]:
+            raise RuntimeError("db down")
+        return PATTERNS
+
+    cache = FraudPatternCache(loader)
+    assert cache.get() == PATTERNS
+    state["fail"] = True
+    cache.invalidate()
+    assert cache.get() == PATTERNS
+    assert FraudPatternCache(loader).get() == []
+
+
+def test_async_get_works_across_event_loops():
+    """Кэш создан вне цикла событий и используется из нескольких asyncio.run()"""
+    import asyncio
+
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        return PATTERNS
+
+    async def load_concurrently(cache):
+        return await asyncio.gather(*(cache.get_async(loader) for _ in range(5)))
+
+    cache = FraudPatternCache(lambda: PATTERNS, ttl=300)
+    assert asyncio.run(load_concurrently(cache)) == [PATTERNS] * 5
+    cache.invalidate()
+    assert asyncio.run(load_concurrently(cache)) == [PATTERNS] * 5
+    assert len(calls) == 2
+
+
+def test_detect_sql_pattern_fraud_without_db_round_trips(monkeypatch):
+    """Статические паттерны проверяются без обращений к БД"""
+    class NoDatabasePool:
+        def connection(self):
+            raise AssertionError("БД не должна использоваться")
+
+    monkeypatch.setitem(PATTERN_CACHE_CONFIG, "listen", False)
+    manager = DatabaseManager(NoDatabasePool())
+    manager.patterns.loader = lambda: PATTERNS
+
+    assert manager.detect_sql_pattern_fraud("user_1", 20000000) == ["large_amount"]
+    assert manager.detect_sql_pattern_fraud("user_1", 500) == ["small_amount"]
+    assert manager.detect_sql_pattern_fraud("user_1", 50000) == []
@@ -0,0 +1,57 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+import pandas as pd
+
+from src.rolling_features import WINDOWS, add_rolling_features, rolling_window_features
+
+
+def legacy_rolling(transactions, window, how):
+    """Прежний расчет prepare_dataset.py: groupby().apply(rolling)"""
+    return (
+        transactions.groupby("user_id", group_keys=False)
+        .apply(lambda g: getattr(g.rolling(window, on="timestamp")["amount"], how)())
+    ).fillna(0)
+
+
+def make_transactions(n=4000, seed=11):
+    rng = np.random.default_rng(seed)
+    transactions = pd.DataFrame({
+        "user_id": [f"user_{i:03d}" for i in rng.integers(0, 80, n)],
+        "amount": rng.integers(100, 50_000_000, n).astype(float),
+        # Совпадающие секунды у одного пользователя: окно не включает следующие строки
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 10 * 24 * 3600, n), unit="s"),
+    })
+    transactions.loc[::53, "amount"] = np.nan
+    return transactions.sort_values(["user_id", "timestamp"]).reset_index(drop=True)
+
+
+def test_windows_match_pandas_rolling():
+    """1h совпадает с прежним расчетом точно, остальные окна - тоже"""
+    transactions = add_rolling_features(make_transactions())
+    for name, width in WINDOWS.items():
+        total = legacy_rolling(transactions, width, "sum")
+        count = legacy_rolling(transactions, width, "count")
+        assert np.array_equal(transactions[f"total_{name}"].to_numpy(), total.to_numpy()), name
+        assert np.array_equal(transactions[f"count_{name}"].to_numpy(), count.to_numpy()), name
+    mean = transactions["total_1h"] / transactions["count_1h"].where(transactions["count_1h"] > 0)
+    assert np.allclose(transactions["mean_1h"], mean.fillna(0))
+
+
+def test_unsorted_input_keeps_row_order():
+    """Строки не по порядку: признаки возвращаются для исходных строк"""
+    transactions = make_transactions(n=1500, seed=5)
+    expected = rolling_window_features(
+        transactions["user_id"].to_numpy(), transactions["timestamp"], transactions["amount"].to_numpy()
+    )
+    shuffled = transactions.sample(frac=1, random_state=0)
+    features = rolling_window_features(
+        shuffled["user_id"].to_numpy(), shuffled["timestamp"], shuffled["amount"].to_numpy()
+    )
+    for name, values in expected.items():
+        assert np.array_equal(features[name], values[shuffled.index.to_numpy()]), name
+    assert rolling_window_features(np.array([]), pd.Series([], dtype="datetime64[ns]"), np.array([]))["count_1h"].size == 0
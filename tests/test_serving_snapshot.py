@@ -0,0 +1,75 @@
+import sys
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+
+from src import fraud_api
+from src.config import FEATURE_STORE_CONFIG
+from src.feature_store import OnlineFeatureStore
+from src.serving_snapshot import load_snapshot, replay_transactions, save_snapshot
+
+
+def filled_store(n_users=50, events=400, seed=3):
+    rng = np.random.default_rng(seed)
+    store = OnlineFeatureStore(history=8, initial_users=4)
+    rows = [
+        (f"user_{rng.integers(n_users)}", float(rng.integers(1, 100) * 1000), 1_700_000_000 + i * 30)
+        for i in range(events)
+    ]
+    replay_transactions(store, rows)
+    return store, rows
+
+
+def test_snapshot_roundtrip_restores_features(tmp_path):
+    """Восстановленное хранилище выдает те же признаки и продолжает работу"""
+    store, rows = filled_store()
+    save_snapshot(tmp_path, store, {"total_checks": 400})
+
+    restored, index = load_snapshot(tmp_path)
+    assert index["counters"] == {"total_checks": 400}
+    assert index["watermark"]["event_time"] == rows[-1][2]
+    assert len(restored) == len(store)
+
+    next_time = rows[-1][2] + 10
+    for user in ["user_1", "user_7", "new_user"]:
+        assert restored.update(user, 5000.0, next_time) == store.update(user, 5000.0, next_time)
+
+
+def test_snapshot_publish_is_atomic_and_pruned(tmp_path):
+    """CURRENT указывает на полный снимок; незавершенные и старые снимки не мешают"""
+    store, _ = filled_store()
+    first = save_snapshot(tmp_path, store, keep=2)
+    # Остаток записи, прерванной падением процесса
+    (tmp_path / ".snapshot-crashed").mkdir()
+    (tmp_path / ".snapshot-crashed" / "index.json").write_text("{broken")
+
+    store.update("user_1", 1.0, 1_800_000_000)
+    save_snapshot(tmp_path, store, keep=2)
+    latest = save_snapshot(tmp_path, store, keep=2)
+
+    snapshots = sorted(p.name for p in tmp_path.glob("snapshot-*"))
+    assert len(snapshots) == 2 and first.name not in snapshots
+    assert (tmp_path / "CURRENT").read_text() == latest.name
+    assert load_snapshot(tmp_path)[1]["watermark"]["event_time"] == 1_800_000_000
+    assert load_snapshot(tmp_path / "missing") is None
+
+
+def test_fraud_api_restores_state(tmp_path, monkeypatch):
+    """fraud_api восстанавливает хранилище и total_checks из снимка"""
+    store, _ = filled_store()
+    monkeypatch.setitem(fraud_api.SNAPSHOT_CONFIG, "dir", str(tmp_path))
+    monkeypatch.setitem(FEATURE_STORE_CONFIG, "history", 8)
+    monkeypatch.setattr(fraud_api, "feature_store", store)
+    monkeypatch.setattr(fraud_api, "total_checks", 123)
+    assert fraud_api.save_serving_snapshot() is not None
+
+    monkeypatch.setattr(fraud_api, "feature_store", OnlineFeatureStore(history=8))
+    monkeypatch.setattr(fraud_api, "total_checks", 0)
+    index = fraud_api.restore_serving_state()
+
+    assert index["users"] == len(store)
+    assert fraud_api.total_checks == 123
+    assert len(fraud_api.feature_store) == len(store)
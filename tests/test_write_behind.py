@@ -0,0 +1,151 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import psycopg2
+
+from src.write_behind import WriteBehindWriter
+
+
+class RecordingPool:
+    """Пул-заглушка: запоминает INSERT запросы, может имитировать недоступную БД"""
+
+    def __init__(self):
+        self.inserts = []
+        self.down = False
+
+    @contextmanager
+    def connection(self):
+        if self.down:
+            raise psycopg2.OperationalError("could not connect")
+        pool = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, query, params):
+                pool.inserts.append((query, list(params)))
+
+        class Connection:
+            def cursor(self):
+                return Cursor()
+
+            def commit(self):
+                pass
+
+        yield Connection()
+
+    def rows(self, n_columns=2):
+        rows = []
+        for _, params in self.inserts:
+            rows.extend(tuple(params[i:i + n_columns]) for i in range(0, len(params), n_columns))
+        return rows
+
+
+def test_writer_batches_rows_and_flushes_on_close():
+    """Строки пишутся многострочными INSERT пачками до batch_size, close дописывает остаток"""
+    pool = RecordingPool()
+    writer = WriteBehindWriter(pool, "transactions", ("user_id", "amount"),
+                               batch_size=100, flush_interval=60)
+    writer.start()
+    for i in range(250):
+        assert writer.submit((f"user_{i}", float(i)))
+    writer.close()
+
+    assert pool.rows() == [(f"user_{i}", float(i)) for i in range(250)]
+    assert len(pool.inserts) == 3
+    query = pool.inserts[0][0]
+    assert query.startswith("INSERT INTO transactions (user_id, amount) VALUES (%s, %s), (%s, %s)")
+
+
+def test_writer_spills_when_db_is_down_and_replays(tmp_path):
+    """Недоступная БД и переполненная очередь сохраняются в файл и дописываются позже"""
+    pool = RecordingPool()
+    pool.down = True
+    spill_path = tmp_path / "transactions.jsonl"
+
+    writer = WriteBehindWriter(pool, "transactions", ("user_id", "amount"),
+                               max_queue=2, spill_path=spill_path)
+    assert writer.submit(("user_1", 1.0))
+    assert writer.submit(("user_2", 2.0))
+    assert not writer.submit(("user_3", 3.0))
+    writer.close()
+
+    assert pool.inserts == []
+    assert len(spill_path.read_text().splitlines()) == 3
+
+    pool.down = False
+    writer = WriteBehindWriter(pool, "transactions", ("user_id", "amount"),
+                               flush_interval=60, spill_path=spill_path)
+    writer.start()
+    writer.close()
+
+    assert sorted(pool.rows()) == [("user_1", 1.0), ("user_2", 2.0), ("user_3", 3.0)]
+    assert not spill_path.exists()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spilled_transaction_replays_with_check_time(tmp_path, monkeypatch):
+    """Строка, записанная после сбоя БД, хранит время проверки, а не время повтора"""
+    import src.database as database
+
+    pool = RecordingPool()
+    pool.down = True
+    spill_path = tmp_path / "transactions.jsonl"
+    monkeypatch.setattr(database, "make_writer", lambda pool, table, columns: WriteBehindWriter(
+        pool, table, columns, flush_interval=0.01, spill_path=spill_path))
+
+    manager = database.DatabaseManager(pool=pool)
+    before = datetime.now()
+    manager.queue_transaction("user_1", 5000.0, False, 0.1, "LOW")
+    manager.close()
+    assert pool.inserts == []
+
+    pool.down = False
+    writer = WriteBehindWriter(pool, "transactions", database.TRANSACTION_COLUMNS,
+                               flush_interval=60, spill_path=spill_path)
+    writer.start()
+    writer.close()
+
+    [row] = pool.rows(len(database.TRANSACTION_COLUMNS))
+    assert row[:6] == ("user_1", 5000.0, None, False, 0.1, "LOW")
+    checked_at = datetime.fromisoformat(row[6])
+    assert before <= checked_at <= datetime.now()
+
+
+def test_close_does_not_hang_when_db_is_stuck(tmp_path):
+    """Поток висит на INSERT, очередь полна: close() возвращается, остаток очереди - в spill-файле"""
+    release = threading.Event()
+    inserting = threading.Event()
+
+    class StuckPool:
+        @contextmanager
+        def connection(self):
+            inserting.set()
+            release.wait(10)
+            raise psycopg2.OperationalError("timeout")
+
+    spill_path = tmp_path / "transactions.jsonl"
+    writer = WriteBehindWriter(StuckPool(), "transactions", ("user_id", "amount"),
+                               max_queue=1, flush_interval=0, spill_path=spill_path)
+    writer.start()
+    writer.submit(("user_1", 1.0))
+    assert inserting.wait(5)
+    assert writer.submit(("user_2", 2.0))
+
+    started = time.monotonic()
+    writer.close(timeout=0.2)
+    assert time.monotonic() - started < 2
+    assert [json.loads(line) for line in spill_path.read_text().splitlines()] == [["user_2", 2.0]]
+    release.set()